@@ -0,0 +1,32 @@
+"""Add fund_catalog_version
+
+Revision ID: 6f2c8e1a4d39
+Revises: 4b7d2f9e6c13
+Create Date: 2026-10-19
+
+A single-row counter that fund writes bump in their own transaction. Worker
+fund caches compare it to detect catalog changes made by other workers,
+replacing the (count, max(updated_at)) check, which missed updates whose
+transaction started before the current max(updated_at) but committed after it.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '6f2c8e1a4d39'
+down_revision = '4b7d2f9e6c13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'fund_catalog_version',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('version', sa.Integer(), nullable=False),
+    )
+    op.execute("INSERT INTO fund_catalog_version (id, version) VALUES (1, 0)")
+
+
+def downgrade():
+    op.drop_table('fund_catalog_version')
@@ -0,0 +1,35 @@
+"""Add ix_fund_overlaps_fund2_fund1
+
+Revision ID: 9c3e5a7b1d24
+Revises: 2a8f6c1e9d47
+Create Date: 2026-10-19
+
+The fund screener looks up overlaps with a user's holdings on either side of
+a pair. unique_fund_pair serves the fund_id_1 side; this index serves the
+fund_id_2 side.
+"""
+from alembic import op
+
+
+revision = '9c3e5a7b1d24'
+down_revision = '2a8f6c1e9d47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_fund_overlaps_fund2_fund1',
+            'fund_overlaps',
+            ['fund_id_2', 'fund_id_1'],
+            postgresql_include=['overlap_percentage'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_fund_overlaps_fund2_fund1', table_name='fund_overlaps',
+                      postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,62 @@
+"""Add composite and covering indexes for hot crud queries
+
+Revision ID: 3f1a9c2e7b40
+Revises:
+Create Date: 2026-10-19
+
+* user_investments is always filtered by user_id and joined on fund_id.
+* historical_nav is range-filtered by date alone when sampling chart dates;
+  the existing unique (fund_id, date) constraint only serves the join side.
+* fund_sector_allocations is filtered by fund_id for every sector breakdown.
+
+fund_overlaps needs no new index: both arms of the OR'd pair lookup in
+get_fund_overlap are equality matches on the unique (fund_id_1, fund_id_2)
+constraint.
+"""
+from alembic import op
+
+
+revision = '3f1a9c2e7b40'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CONCURRENTLY keeps the tables writable while the indexes build on
+    # PostgreSQL, which requires running outside the migration transaction.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_investments_user_fund',
+            'user_investments',
+            ['user_id', 'fund_id'],
+            postgresql_include=['units', 'amount', 'nav_at_investment', 'investment_date'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_historical_nav_date_fund',
+            'historical_nav',
+            ['date', 'fund_id'],
+            postgresql_include=['nav'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_fund_sector_allocations_fund_sector',
+            'fund_sector_allocations',
+            ['fund_id', 'sector'],
+            postgresql_include=['percentage'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_fund_sector_allocations_fund_sector', table_name='fund_sector_allocations',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_historical_nav_date_fund', table_name='historical_nav',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_user_investments_user_fund', table_name='user_investments',
+                      postgresql_concurrently=True, if_exists=True)
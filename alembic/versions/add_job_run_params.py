@@ -0,0 +1,25 @@
+"""Add job_runs.params for parameterised jobs
+
+Revision ID: c41e7f0a9d25
+Revises: 8b2d4e6f1a93
+Create Date: 2026-10-19
+
+Background exports are queued as runs of one user_export job; params records
+which user and format each run is for.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'c41e7f0a9d25'
+down_revision = '8b2d4e6f1a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('job_runs', sa.Column('params', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('job_runs', 'params')
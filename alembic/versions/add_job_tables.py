@@ -0,0 +1,48 @@
+"""Add job_locks and job_runs for the background job scheduler
+
+Revision ID: 8b2d4e6f1a93
+Revises: 3f1a9c2e7b40
+Create Date: 2026-10-19
+
+job_locks holds one row per job; a scheduler owns the job while locked_until
+is in the future. job_runs records every queued, running and finished run.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '8b2d4e6f1a93'
+down_revision = '3f1a9c2e7b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'job_locks',
+        sa.Column('name', sa.String(), primary_key=True),
+        sa.Column('owner', sa.String(), nullable=True),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+    )
+    op.create_table(
+        'job_runs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('job_name', sa.String(), nullable=False),
+        sa.Column('trigger', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('progress', sa.Float(), nullable=False),
+        sa.Column('message', sa.Text(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('duration_ms', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index('ix_job_runs_id', 'job_runs', ['id'])
+    op.create_index('ix_job_runs_job_name_id', 'job_runs', ['job_name', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_job_runs_job_name_id', table_name='job_runs')
+    op.drop_index('ix_job_runs_id', table_name='job_runs')
+    op.drop_table('job_runs')
+    op.drop_table('job_locks')
@@ -0,0 +1,42 @@
+"""Add nav_weekly and nav_monthly
+
+Revision ID: 4b7d2f9e6c13
+Revises: 9c3e5a7b1d24
+Create Date: 2026-10-19
+
+Weekly and monthly rollups of historical_nav hold each fund's last NAV per
+period. ingest_navs keeps them current and long-range charts read them
+instead of every daily row. Both are backfilled from historical_nav.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '4b7d2f9e6c13'
+down_revision = '9c3e5a7b1d24'
+branch_labels = None
+depends_on = None
+
+ROLLUPS = {'nav_weekly': 'week', 'nav_monthly': 'month'}
+
+
+def upgrade():
+    for table, interval in ROLLUPS.items():
+        op.create_table(
+            table,
+            sa.Column('fund_id', sa.Integer(), sa.ForeignKey('mutual_funds.id'), primary_key=True),
+            sa.Column('period_start', sa.Date(), primary_key=True),
+            sa.Column('date', sa.Date(), nullable=False),
+            sa.Column('nav', sa.Float(), nullable=False),
+        )
+        op.execute(
+            f"INSERT INTO {table} (fund_id, period_start, date, nav) "
+            f"SELECT DISTINCT ON (fund_id, date_trunc('{interval}', date)::date) "
+            f"fund_id, date_trunc('{interval}', date)::date, date, nav "
+            f"FROM historical_nav ORDER BY fund_id, date_trunc('{interval}', date)::date, date DESC"
+        )
+
+
+def downgrade():
+    for table in ROLLUPS:
+        op.drop_table(table)
@@ -0,0 +1,46 @@
+"""Add sip_plans and user_investments.sip_plan_id
+
+Revision ID: 2a8f6c1e9d47
+Revises: 7e4b1d9c3a62
+Create Date: 2026-10-19
+
+SIP plans are expanded into user_investments lots in bulk; each generated lot
+records the plan it came from.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '2a8f6c1e9d47'
+down_revision = '7e4b1d9c3a62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'sip_plans',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('fund_id', sa.Integer(), sa.ForeignKey('mutual_funds.id'), nullable=False),
+        sa.Column('amount', sa.Float(), nullable=False),
+        sa.Column('frequency', sa.String(), nullable=False),
+        sa.Column('start_date', sa.Date(), nullable=False),
+        sa.Column('end_date', sa.Date(), nullable=True),
+        sa.Column('materialized_through', sa.Date(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index('ix_sip_plans_id', 'sip_plans', ['id'])
+    op.create_index('ix_sip_plans_user_id', 'sip_plans', ['user_id'])
+    op.add_column('user_investments', sa.Column('sip_plan_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('fk_user_investments_sip_plan_id', 'user_investments', 'sip_plans',
+                          ['sip_plan_id'], ['id'])
+
+
+def downgrade():
+    op.drop_constraint('fk_user_investments_sip_plan_id', 'user_investments', type_='foreignkey')
+    op.drop_column('user_investments', 'sip_plan_id')
+    op.drop_index('ix_sip_plans_user_id', table_name='sip_plans')
+    op.drop_index('ix_sip_plans_id', table_name='sip_plans')
+    op.drop_table('sip_plans')
@@ -0,0 +1,50 @@
+"""Add user_portfolio_values and the fund -> holders index
+
+Revision ID: 5d9a3c7e2b18
+Revises: c41e7f0a9d25
+Create Date: 2026-10-19
+
+user_portfolio_values holds each user's current value and cost; NAV changes
+apply units x delta-NAV to the holders of the changed fund, found through
+ix_user_investments_fund_user. The table is backfilled from the current lots.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '5d9a3c7e2b18'
+down_revision = 'c41e7f0a9d25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user_portfolio_values',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('current_value', sa.Float(), nullable=False),
+        sa.Column('cost', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.execute(
+        "INSERT INTO user_portfolio_values (user_id, current_value, cost) "
+        "SELECT ui.user_id, SUM(ui.units * mf.nav), SUM(ui.amount) "
+        "FROM user_investments ui JOIN mutual_funds mf ON mf.id = ui.fund_id "
+        "GROUP BY ui.user_id"
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_investments_fund_user',
+            'user_investments',
+            ['fund_id', 'user_id'],
+            postgresql_include=['units'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_user_investments_fund_user', table_name='user_investments',
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_table('user_portfolio_values')
@@ -0,0 +1,66 @@
+"""Add user_positions
+
+Revision ID: 7e4b1d9c3a62
+Revises: 5d9a3c7e2b18
+Create Date: 2026-10-19
+
+user_positions aggregates each user's lots per fund and is maintained by the
+investment crud writes. It is backfilled from the current lots. Holders of a
+fund are now found through ix_user_positions_fund_user, so the lot-level
+ix_user_investments_fund_user index is dropped.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '7e4b1d9c3a62'
+down_revision = '5d9a3c7e2b18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user_positions',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('fund_id', sa.Integer(), sa.ForeignKey('mutual_funds.id'), primary_key=True),
+        sa.Column('units', sa.Float(), nullable=False),
+        sa.Column('cost', sa.Float(), nullable=False),
+        sa.Column('avg_nav', sa.Float(), nullable=False),
+        sa.Column('min_nav', sa.Float(), nullable=False),
+        sa.Column('max_nav', sa.Float(), nullable=False),
+        sa.Column('first_investment_date', sa.Date(), nullable=False),
+        sa.Column('last_investment_date', sa.Date(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.execute(
+        "INSERT INTO user_positions (user_id, fund_id, units, cost, avg_nav, min_nav, max_nav, "
+        "first_investment_date, last_investment_date) "
+        "SELECT user_id, fund_id, SUM(units), SUM(amount), SUM(amount) / SUM(units), "
+        "MIN(nav_at_investment), MAX(nav_at_investment), MIN(investment_date), MAX(investment_date) "
+        "FROM user_investments GROUP BY user_id, fund_id"
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_positions_fund_user',
+            'user_positions',
+            ['fund_id', 'user_id'],
+            postgresql_include=['units'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index('ix_user_investments_fund_user', table_name='user_investments',
+                      postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_investments_fund_user',
+            'user_investments',
+            ['fund_id', 'user_id'],
+            postgresql_include=['units'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+    op.drop_table('user_positions')
@@ -0,0 +1,158 @@
+import asyncio
+import re
+from collections import deque
+from typing import Deque, Dict, List, Optional, Pattern, Tuple
+
+from sqlalchemy.engine import Engine
+from starlette.responses import JSONResponse
+
+from app.config import settings
+from app.metrics import ADMISSION_QUEUED, ADMISSION_REQUESTS
+
+# First matching pattern decides a request's route class; None exempts it. Live
+# streams are exempt because they hold no pooled connection once subscribed.
+ROUTE_CLASSES: List[Tuple[Pattern, Optional[str]]] = [
+    (re.compile(r"^/api/investments/dashboard/[^/]+/stream$"), None),
+    (re.compile(r"^/api/users/[^/]+/exports?(/|$)"), "exports"),
+    (re.compile(r"^/api/analysis/"), "analytics"),
+    (re.compile(r"^/api/investments/dashboard/"), "analytics"),
+    (re.compile(r"^/api/"), "crud"),
+]
+
+# Classes shed as soon as the pool is under pressure, to keep connections for cheap requests
+POOL_SHED_CLASSES = {"analytics", "exports"}
+
+
+class RouteClassLimiter:
+    """
+    At most `concurrency` requests of one class run at once and at most
+    `max_queue` wait (FIFO) for up to `queue_timeout` seconds; everything else
+    is rejected immediately. Runs entirely on the event loop, so no locking.
+    """
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> Optional[str]:
+        """None once a slot is held, else the reason the request is shed"""
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            ADMISSION_REQUESTS.labels(self.name, "admitted").inc()
+            return None
+        if len(self._waiters) >= self.max_queue:
+            ADMISSION_REQUESTS.labels(self.name, "shed_queue_full").inc()
+            return "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        ADMISSION_QUEUED.labels(self.name).inc()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except BaseException as exc:
+            # Timed out or cancelled (client went away), possibly just after
+            # release() handed over the slot: pass it on rather than leak it
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            if not isinstance(exc, asyncio.TimeoutError):
+                raise
+            ADMISSION_REQUESTS.labels(self.name, "shed_timeout").inc()
+            return "timeout"
+        finally:
+            ADMISSION_QUEUED.labels(self.name).dec()
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        ADMISSION_REQUESTS.labels(self.name, "queued").inc()
+        return None
+
+    def release(self):
+        # Hand the slot straight to the oldest live waiter, so active never dips
+        # and lets a newcomer jump the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+def _build_limiters() -> Dict[str, RouteClassLimiter]:
+    timeout = settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+    return {
+        "crud": RouteClassLimiter("crud", settings.ADMISSION_CRUD_CONCURRENCY,
+                                  settings.ADMISSION_CRUD_QUEUE, timeout),
+        "analytics": RouteClassLimiter("analytics", settings.ADMISSION_ANALYTICS_CONCURRENCY,
+                                       settings.ADMISSION_ANALYTICS_QUEUE, timeout),
+        "exports": RouteClassLimiter("exports", settings.ADMISSION_EXPORTS_CONCURRENCY,
+                                     settings.ADMISSION_EXPORTS_QUEUE, timeout),
+    }
+
+
+limiters = _build_limiters()
+
+
+def route_class(path: str) -> Optional[str]:
+    for pattern, name in ROUTE_CLASSES:
+        if pattern.match(path):
+            return name
+    return None
+
+
+def pool_utilization(engine: Engine) -> Optional[float]:
+    """Checked-out share of the pool's capacity (size plus overflow); None for pools without a limit"""
+    pool = engine.pool
+    size = getattr(pool, "size", None)
+    if not callable(size):
+        return None
+    capacity = size() + max(getattr(pool, "_max_overflow", 0), 0)
+    return pool.checkedout() / capacity if capacity else None
+
+
+class AdmissionControlMiddleware:
+    """
+    ASGI middleware applying the per-class limiters before a request reaches
+    its endpoint, so overload is answered with a fast 503 + Retry-After
+    instead of requests queuing on the connection pool until it times out.
+    Analytics and exports are additionally shed while the primary pool is above
+    ADMISSION_POOL_SHED_RATIO, which keeps cheap CRUD endpoints responsive.
+    """
+
+    def __init__(self, app, engine: Engine):
+        self.app = app
+        self.engine = engine
+
+    async def _reject(self, scope, receive, send, detail: str):
+        response = JSONResponse({"detail": detail}, status_code=503,
+                                headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)})
+        await response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        name = route_class(scope["path"]) if scope["type"] == "http" else None
+        limiter = limiters.get(name) if name and settings.ADMISSION_CONTROL_ENABLED else None
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        if name in POOL_SHED_CLASSES:
+            utilization = pool_utilization(self.engine)
+            if utilization is not None and utilization >= settings.ADMISSION_POOL_SHED_RATIO:
+                ADMISSION_REQUESTS.labels(name, "shed_pool").inc()
+                await self._reject(scope, receive, send, "Database busy, retry shortly")
+                return
+
+        reason = await limiter.acquire()
+        if reason is not None:
+            await self._reject(scope, receive, send, f"Too many {name} requests, retry shortly")
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
@@ -2,21 +2,56 @@ from app.crud.user import get_user, get_user_by_email, get_users, create_user, u
 from app.crud.investment import (
     get_investment,
     get_user_investments,
+    list_user_investments,
+    get_user_investments_by_fund,
     create_investment,
     update_investment,
     delete_investment,
     get_investment_summary,
     get_performance_extremes,
-    get_historical_performance
+    get_historical_performance,
+    simulate_portfolios,
+    iter_investment_lots,
+    iter_portfolio_value_series,
+    refresh_portfolio_value,
+    apply_nav_change,
+    apply_nav_changes,
+    rebuild_portfolio_values,
+    reload_portfolio_values,
+    refresh_position,
+    get_user_positions,
+    rebuild_positions,
+    verify_positions,
+    add_lots_in_bulk,
+    refresh_portfolio_values
 )
 from app.crud.fund import (
     get_fund,
     get_fund_by_isn,
     get_funds,
+    search_funds,
+    screen_funds,
+    get_portfolio_overlaps,
     create_fund,
     update_fund,
     delete_fund,
+    ingest_navs,
+    bump_fund_catalog_version,
+    rebuild_nav_rollups,
+    get_navs_asof,
     get_portfolio_sector_allocation,
     get_fund_overlap,
-    get_all_fund_overlaps
-)
\ No newline at end of file
+    get_all_fund_overlaps,
+    get_co_held_fund_pairs,
+    compute_fund_overlaps,
+    compute_fund_overlap,
+    upsert_fund_overlap,
+    upsert_fund_overlaps
+)
+from app.crud.sip import (
+    get_sip_plan,
+    get_user_sip_plans,
+    create_sip_plan,
+    delete_sip_plan,
+    materialize_sip_plans
+)
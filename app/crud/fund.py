@@ -1,87 +1,300 @@
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_, or_
-from typing import List, Optional, Dict, Any
+from sqlalchemy import func, desc, and_, or_, insert, select, tuple_, update, union_all, Date
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import date
+
+import numpy as np
 
 from app.models.fund import (
     MutualFund,
+    FundCatalogVersion,
     FundSectorAllocation,
     FundStockAllocation,
     FundMarketCapAllocation,
     FundOverlap,
-    FundHolding
+    FundHolding,
+    HistoricalNAV,
+    NAV_ROLLUPS
 )
-from app.models.investment import UserInvestment
-from app.schemas.fund import MutualFundCreate
-
-
+from app.database import date_trunc
+from app.models.investment import UserPosition
+from app.schemas.fund import MutualFundCreate, NavUpdate, NavAsOfQuery, FundScreenRequest
+from app.crud.investment import apply_nav_change, apply_nav_changes
+from app.metrics import observe_crud
+from app.projection import select_columns, table_columns
+from app.services.analytics import overlap_matrix, weighted_sector_allocation
+from app.services.compute import compute_pool
+from app.services.fund_cache import fund_cache
+from app.services.fund_screen import fund_screener
+from app.services.fund_search import fund_search
+from app.services.group_commit import group_commit
+from app.services.live import dashboard_hub
+from app.services.nav_asof import nav_asof
+
+# Columns clients may request through fields=
+FUND_COLUMNS = table_columns(MutualFund, ("id", "name", "fund_type", "isn", "nav", "created_at", "updated_at"))
+
+
+@observe_crud
 def get_fund(db: Session, fund_id: int) -> Optional[MutualFund]:
     return db.query(MutualFund).filter(MutualFund.id == fund_id).first()
 
 
+@observe_crud
 def get_fund_by_isn(db: Session, isn: str) -> Optional[MutualFund]:
     return db.query(MutualFund).filter(MutualFund.isn == isn).first()
 
 
-def get_funds(db: Session, skip: int = 0, limit: int = 100) -> List[MutualFund]:
-    return db.query(MutualFund).offset(skip).limit(limit).all()
+@observe_crud
+def get_funds(db: Session, skip: int = 0, limit: int = 100, fields: Optional[List[str]] = None) -> List[Row]:
+    """Funds as plain rows of the requested columns (all by default); no ORM instances are built"""
+    return db.execute(select(*select_columns(FUND_COLUMNS, fields)).offset(skip).limit(limit)).all()
+
+
+@observe_crud
+def search_funds(db: Session, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """Typeahead matches on name, ISN and fund type, best first"""
+    return [
+        dict(meta._asdict(), score=score)
+        for meta, score in fund_search.search(db, query, limit=limit)
+    ]
+
+
+@observe_crud
+def get_portfolio_overlaps(db: Session, user_id: int) -> Dict[int, float]:
+    """fund_id -> highest overlap with any fund the user holds; held funds count as 100"""
+    held = [row.fund_id for row in db.query(UserPosition.fund_id).filter(UserPosition.user_id == user_id).all()]
+    if not held:
+        return {}
+    # Both arms are index range scans: unique_fund_pair and ix_fund_overlaps_fund2_fund1
+    rows = db.execute(union_all(
+        select(FundOverlap.fund_id_2, FundOverlap.overlap_percentage).where(FundOverlap.fund_id_1.in_(held)),
+        select(FundOverlap.fund_id_1, FundOverlap.overlap_percentage).where(FundOverlap.fund_id_2.in_(held)),
+    )).all()
+    overlaps: Dict[int, float] = {}
+    for fund_id, percentage in rows:
+        overlaps[fund_id] = max(overlaps.get(fund_id, 0.0), percentage)
+    overlaps.update((fund_id, 100.0) for fund_id in held)
+    return overlaps
+
+
+@observe_crud
+def screen_funds(db: Session, request: FundScreenRequest) -> Dict[str, Any]:
+    """One page of funds passing every filter of the screen, with the cursor of the next page"""
+    overlaps = get_portfolio_overlaps(db, request.overlap_user_id) if request.overlap_user_id is not None else None
+    items, total, next_cursor = fund_screener.screen(db, request, overlaps=overlaps)
+    return {"items": items, "total": total, "next_cursor": next_cursor}
+
+
+@observe_crud
+def bump_fund_catalog_version(db: Session):
+    """
+    Mark the catalog changed for other workers' fund caches; call in the writing
+    transaction. Loaders writing mutual_funds directly, rather than through
+    create_fund / update_fund, must call it too. The caller commits.
+    """
+    db.execute(update(FundCatalogVersion).where(FundCatalogVersion.id == 1).values(
+        version=FundCatalogVersion.version + 1
+    ))
+
+
+def _insert_fund(db: Session, fund: MutualFundCreate) -> Row:
+    db_fund = db.execute(
+        insert(MutualFund).values(**fund.model_dump()).returning(*MutualFund.__table__.columns)
+    ).one()
+    bump_fund_catalog_version(db)
+    return db_fund
 
 
-def create_fund(db: Session, fund: MutualFundCreate) -> MutualFund:
-    db_fund = MutualFund(
-        name=fund.name,
-        fund_type=fund.fund_type,
-        isn=fund.isn,
-        nav=fund.nav
-    )
-    db.add(db_fund)
-    db.commit()
-    db.refresh(db_fund)
+@observe_crud
+def create_fund(db: Session, fund: MutualFundCreate) -> Row:
+    """The new fund's row, read back with RETURNING; committed through group_commit"""
+    db_fund = group_commit.run(db, lambda session: _insert_fund(session, fund))
+    fund_cache.upsert(db_fund)
     return db_fund
 
 
-def update_fund(db: Session, fund_id: int, fund: MutualFundCreate) -> Optional[MutualFund]:
-    db_fund = get_fund(db, fund_id)
-    if not db_fund:
+def _update_fund(db: Session, fund_id: int, fund: MutualFundCreate) -> Optional[Row]:
+    # Locked until commit, so concurrent NAV updates apply their deltas one after the other
+    previous_nav = db.execute(select(MutualFund.nav).where(MutualFund.id == fund_id).with_for_update()).scalar()
+    if previous_nav is None:
         return None
+    db_fund = db.execute(
+        update(MutualFund).where(MutualFund.id == fund_id).values(**fund.model_dump()).returning(
+            *MutualFund.__table__.columns
+        )
+    ).one()
+    if db_fund.nav != previous_nav:
+        apply_nav_change(db, fund_id, db_fund.nav - previous_nav)
+    bump_fund_catalog_version(db)
+    return db_fund
 
-    for field, value in fund.dict().items():
-        setattr(db_fund, field, value)
 
-    db.commit()
-    db.refresh(db_fund)
+@observe_crud
+def update_fund(db: Session, fund_id: int, fund: MutualFundCreate) -> Optional[Row]:
+    db_fund = group_commit.run(db, lambda session: _update_fund(session, fund_id, fund))
+    if db_fund is None:
+        return None
+    fund_cache.upsert(db_fund)
+    dashboard_hub.fund_nav_changed(db_fund.id, db_fund.nav)
     return db_fund
 
 
+@observe_crud
 def delete_fund(db: Session, fund_id: int) -> bool:
     db_fund = get_fund(db, fund_id)
     if not db_fund:
         return False
 
     db.delete(db_fund)
+    bump_fund_catalog_version(db)
     db.commit()
+    fund_cache.remove(fund_id)
+    nav_asof.invalidate([fund_id])
     return True
 
 
+@observe_crud
+def ingest_navs(db: Session, updates: List[NavUpdate]) -> Dict[str, int]:
+    """
+    Load a day's NAVs: record them in historical_nav, move each fund's current
+    NAV to its latest value and apply the changes to holders' portfolio values,
+    all in one transaction.
+    """
+    latest: Dict[int, NavUpdate] = {}
+    for item in updates:
+        if item.fund_id not in latest or item.nav_date >= latest[item.fund_id].nav_date:
+            latest[item.fund_id] = item
+    # Fund rows are locked (in id order, against deadlocks) so each NAV delta is taken from the committed NAV
+    funds = {fund.id: fund for fund in db.query(MutualFund).filter(
+        MutualFund.id.in_(list(latest))
+    ).order_by(MutualFund.id).with_for_update()}
+
+    by_date: Dict[Any, List[NavUpdate]] = {}
+    for item in updates:
+        if item.fund_id in funds:
+            by_date.setdefault(item.nav_date, []).append(item)
+    for nav_date, items in by_date.items():
+        db.query(HistoricalNAV).filter(
+            HistoricalNAV.date == nav_date,
+            HistoricalNAV.fund_id.in_([item.fund_id for item in items])
+        ).delete(synchronize_session=False)
+        db.add_all([HistoricalNAV(fund_id=item.fund_id, date=nav_date, nav=item.nav) for item in items])
+    _update_nav_rollups(db, [item for items in by_date.values() for item in items])
+
+    nav_deltas = {}
+    for fund_id, fund in funds.items():
+        nav = latest[fund_id].nav
+        if nav != fund.nav:
+            nav_deltas[fund_id] = nav - fund.nav
+            fund.nav = nav
+    db.flush()
+    holders = apply_nav_changes(db, nav_deltas)
+    if nav_deltas:
+        bump_fund_catalog_version(db)
+    db.commit()
+
+    nav_asof.invalidate(item.fund_id for items in by_date.values() for item in items)
+    for fund_id in nav_deltas:
+        fund_cache.upsert(funds[fund_id])
+        dashboard_hub.fund_nav_changed(fund_id, funds[fund_id].nav)
+    return {
+        "navs_recorded": sum(len(items) for items in by_date.values()),
+        "funds_updated": len(nav_deltas),
+        "portfolios_updated": holders,
+        "unknown_funds": len(latest) - len(funds)
+    }
+
+
+def _update_nav_rollups(db: Session, updates: List[NavUpdate]):
+    """Fold recorded daily NAVs into the weekly and monthly rollups: a period keeps its latest NAV"""
+    for interval, model in NAV_ROLLUPS.items():
+        latest: Dict[Tuple[int, date], NavUpdate] = {}
+        for item in updates:
+            key = (item.fund_id, date_trunc(interval, item.nav_date))
+            if key not in latest or item.nav_date >= latest[key].nav_date:
+                latest[key] = item
+        if not latest:
+            continue
+        # Primary key lookups; the filter may match a few extra pairs, which are ignored
+        existing = {(row.fund_id, row.period_start): row for row in db.query(model).filter(
+            model.fund_id.in_({fund_id for fund_id, _ in latest}),
+            model.period_start.in_({period_start for _, period_start in latest})
+        )}
+        for (fund_id, period_start), item in latest.items():
+            row = existing.get((fund_id, period_start))
+            if row is None:
+                db.add(model(fund_id=fund_id, period_start=period_start, date=item.nav_date, nav=item.nav))
+            elif item.nav_date >= row.date:
+                row.date, row.nav = item.nav_date, item.nav
+
+
+@observe_crud
+def rebuild_nav_rollups(db: Session) -> Dict[str, int]:
+    """Recompute the NAV rollups from historical_nav, e.g. after NAVs were bulk loaded outside ingest_navs"""
+    counts = {}
+    for interval, model in NAV_ROLLUPS.items():
+        db.query(model).delete(synchronize_session=False)
+        last = select(
+            HistoricalNAV.fund_id,
+            func.date_trunc(interval, HistoricalNAV.date, type_=Date).label("period_start"),
+            func.max(HistoricalNAV.date).label("date")
+        ).group_by(
+            HistoricalNAV.fund_id, "period_start"
+        ).subquery()
+        result = db.execute(
+            model.__table__.insert().from_select(
+                ["fund_id", "period_start", "date", "nav"],
+                select(last.c.fund_id, last.c.period_start, last.c.date, HistoricalNAV.nav).join(
+                    HistoricalNAV, and_(HistoricalNAV.fund_id == last.c.fund_id, HistoricalNAV.date == last.c.date)
+                )
+            )
+        )
+        counts[model.__tablename__] = result.rowcount
+    db.commit()
+    return counts
+
+
+@observe_crud
+def get_navs_asof(db: Session, queries: List[NavAsOfQuery]) -> List[Dict[str, Any]]:
+    """Each fund's NAV on each date, or the last one before it, in request order"""
+    navs, nav_dates = nav_asof.lookup(db, [q.fund_id for q in queries], [q.as_of for q in queries])
+    return [
+        {
+            "fund_id": query.fund_id,
+            "as_of": query.as_of,
+            "nav": None if np.isnan(nav) else float(nav),
+            "nav_date": None if np.isnat(nav_date) else nav_date.item()
+        }
+        for query, nav, nav_date in zip(queries, navs, nav_dates)
+    ]
+
+
+@observe_crud
 def get_portfolio_sector_allocation(db: Session, user_id: int) -> List[Dict[str, Any]]:
     """Get sector allocation for a user's portfolio"""
-    # Get user investments with current values
-    investments = db.query(
-        UserInvestment.fund_id,
-        (UserInvestment.units * MutualFund.nav).label("current_value")
-    ).join(
-        MutualFund, UserInvestment.fund_id == MutualFund.id
+    # Units held per fund; current NAVs come from the fund metadata cache
+    holdings = db.query(
+        UserPosition.fund_id,
+        UserPosition.units
     ).filter(
-        UserInvestment.user_id == user_id
+        UserPosition.user_id == user_id
     ).all()
 
-    if not investments:
+    if not holdings:
         return []
 
-    # Calculate total portfolio value
-    total_value = sum(inv.current_value for inv in investments)
+    funds = fund_cache.get_many(db, [h.fund_id for h in holdings])
+    fund_values = {
+        h.fund_id: h.units * funds[h.fund_id].nav
+        for h in holdings if h.fund_id in funds
+    }
 
-    # Create a dictionary of fund weights in the portfolio
-    fund_weights = {inv.fund_id: inv.current_value / total_value for inv in investments}
+    # Calculate total portfolio value
+    total_value = sum(fund_values.values())
+    if not total_value:
+        return []
 
     # Get sector allocations for all funds in the portfolio
     sector_allocations = db.query(
@@ -89,37 +302,15 @@ def get_portfolio_sector_allocation(db: Session, user_id: int) -> List[Dict[str,
         FundSectorAllocation.sector,
         FundSectorAllocation.percentage
     ).filter(
-        FundSectorAllocation.fund_id.in_([inv.fund_id for inv in investments])
+        FundSectorAllocation.fund_id.in_(list(fund_values))
     ).all()
 
-    # Calculate weighted sector allocations
-    sector_values = {}
-    for alloc in sector_allocations:
-        weight = fund_weights.get(alloc.fund_id, 0)
-        sector = alloc.sector
-        value = weight * (alloc.percentage / 100) * total_value
-
-        if sector in sector_values:
-            sector_values[sector] += value
-        else:
-            sector_values[sector] = value
-
-    # Format result
-    result = []
-    for sector, amount in sector_values.items():
-        percentage = (amount / total_value) * 100
-        result.append({
-            "sector": sector,
-            "amount": round(amount, 2),
-            "percentage": round(percentage, 2)
-        })
-
-    # Sort by amount descending
-    result.sort(key=lambda x: x["amount"], reverse=True)
-
-    return result
+    # Weighting is CPU-bound for large portfolios; big inputs run in the compute pool
+    sector_rows = [tuple(alloc) for alloc in sector_allocations]
+    return compute_pool.run(weighted_sector_allocation, fund_values, sector_rows, rows=len(sector_rows))
 
 
+@observe_crud
 def get_fund_overlap(db: Session, fund1_id: int, fund2_id: int) -> Optional[Dict[str, Any]]:
     """Get overlap details between two funds"""
     overlap = db.query(FundOverlap).filter(
@@ -132,26 +323,23 @@ def get_fund_overlap(db: Session, fund1_id: int, fund2_id: int) -> Optional[Dict
     if not overlap:
         return None
 
-    # Get fund names
-    fund1 = get_fund(db, fund1_id)
-    fund2 = get_fund(db, fund2_id)
-
     return {
         "fund_id_1": overlap.fund_id_1,
         "fund_id_2": overlap.fund_id_2,
-        "fund_name_1": fund1.name if fund1 else "Unknown",
-        "fund_name_2": fund2.name if fund2 else "Unknown",
+        "fund_name_1": fund_cache.name(db, overlap.fund_id_1),
+        "fund_name_2": fund_cache.name(db, overlap.fund_id_2),
         "overlap_percentage": overlap.overlap_percentage,
         "overlapping_stocks": overlap.overlapping_stocks
     }
 
 
+@observe_crud
 def get_all_fund_overlaps(db: Session, user_id: int) -> List[Dict[str, Any]]:
     """Get all fund overlaps for funds in a user's portfolio"""
     # Get funds in user's portfolio
-    user_funds = db.query(UserInvestment.fund_id).filter(
-        UserInvestment.user_id == user_id
-    ).distinct().all()
+    user_funds = db.query(UserPosition.fund_id).filter(
+        UserPosition.user_id == user_id
+    ).all()
 
     user_fund_ids = [f.fund_id for f in user_funds]
 
@@ -167,9 +355,7 @@ def get_all_fund_overlaps(db: Session, user_id: int) -> List[Dict[str, Any]]:
     ).all()
 
     # Get fund names
-    funds = {f.id: f.name for f in db.query(MutualFund.id, MutualFund.name).filter(
-        MutualFund.id.in_(user_fund_ids)
-    ).all()}
+    funds = {fund_id: meta.name for fund_id, meta in fund_cache.get_many(db, user_fund_ids).items()}
 
     # Format result
     result = []
@@ -183,4 +369,73 @@ def get_all_fund_overlaps(db: Session, user_id: int) -> List[Dict[str, Any]]:
             "overlapping_stocks": overlap.overlapping_stocks
         })
 
-    return result
\ No newline at end of file
+    return result
+
+@observe_crud
+def get_co_held_fund_pairs(db: Session) -> List[tuple]:
+    """Distinct (fund_id_1, fund_id_2) pairs, fund_id_1 < fund_id_2, held together by at least one user"""
+    first = UserPosition.__table__.alias("first")
+    second = UserPosition.__table__.alias("second")
+    rows = db.query(first.c.fund_id, second.c.fund_id).join(
+        second,
+        and_(first.c.user_id == second.c.user_id, first.c.fund_id < second.c.fund_id)
+    ).distinct().all()
+    return [(row[0], row[1]) for row in rows]
+
+
+@observe_crud
+def compute_fund_overlaps(db: Session, pairs: List[tuple]) -> List[tuple]:
+    """(fund_id_1, fund_id_2, overlap_percentage, overlapping_stocks) for each pair, from current holdings"""
+    fund_ids = {fund_id for pair in pairs for fund_id in pair}
+    holdings = [tuple(row) for row in db.query(
+        FundHolding.fund_id, FundHolding.stock_id, FundHolding.percentage
+    ).filter(
+        FundHolding.fund_id.in_(list(fund_ids))
+    ).all()]
+    return compute_pool.run(overlap_matrix, holdings, list(pairs), rows=len(holdings))
+
+
+@observe_crud
+def compute_fund_overlap(db: Session, fund1_id: int, fund2_id: int) -> Dict[str, Any]:
+    """Overlap of two funds' stock holdings: sum of the smaller weight of each common stock"""
+    _, _, percentage, stocks = compute_fund_overlaps(db, [(fund1_id, fund2_id)])[0]
+    return {
+        "overlap_percentage": percentage,
+        "overlapping_stocks": stocks
+    }
+
+
+@observe_crud
+def upsert_fund_overlap(
+        db: Session, fund1_id: int, fund2_id: int, overlap_percentage: float, overlapping_stocks: int
+) -> FundOverlap:
+    """Create or update the overlap row for a fund pair, whichever order it was stored in"""
+    return upsert_fund_overlaps(db, [(fund1_id, fund2_id, overlap_percentage, overlapping_stocks)])[0]
+
+
+@observe_crud
+def upsert_fund_overlaps(db: Session, overlaps: List[tuple]) -> List[FundOverlap]:
+    """
+    Batch form of upsert_fund_overlap for (fund1_id, fund2_id, percentage,
+    stocks) tuples: the existing rows of every pair, in either order, are read
+    in one query and all rows are written in one commit.
+    """
+    keys = [(fund1_id, fund2_id) for fund1_id, fund2_id, _, _ in overlaps]
+    existing = {
+        frozenset((row.fund_id_1, row.fund_id_2)): row
+        for row in db.query(FundOverlap).filter(
+            tuple_(FundOverlap.fund_id_1, FundOverlap.fund_id_2).in_(keys + [(b, a) for a, b in keys])
+        )
+    }
+
+    rows = []
+    for fund1_id, fund2_id, overlap_percentage, overlapping_stocks in overlaps:
+        overlap = existing.get(frozenset((fund1_id, fund2_id)))
+        if overlap is None:
+            overlap = existing[frozenset((fund1_id, fund2_id))] = FundOverlap(fund_id_1=fund1_id, fund_id_2=fund2_id)
+            db.add(overlap)
+        overlap.overlap_percentage = overlap_percentage
+        overlap.overlapping_stocks = overlapping_stocks
+        rows.append(overlap)
+    db.commit()
+    return rows
@@ -1,99 +1,686 @@
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_
-from typing import List, Optional, Tuple, Dict, Any
-from datetime import datetime, timedelta
-
-from app.models.investment import UserInvestment
-from app.models.fund import MutualFund, HistoricalNAV
-from app.schemas.investment import InvestmentCreate, FundPerformance
+from sqlalchemy import func, desc, and_, or_, insert, select, update, delete, bindparam, exists, literal, union, union_all
+from typing import Iterator, List, Optional, Tuple, Dict, Any
+from datetime import date, datetime, timedelta
 
+import numpy as np
 
+from app.models.investment import UserInvestment, UserPosition, UserPortfolioValue
+from app.models.fund import MutualFund, HistoricalNAV, NAV_ROLLUPS
+from app.schemas.investment import InvestmentCreate, FundPerformance
+from app.schemas.analysis import SimulationRequest
+from app.database import date_trunc
+from app.metrics import observe_crud
+from app.projection import decode_cursor, encode_cursor, select_columns, table_columns
+from app.services import analytics
+from app.services.compute import compute_pool
+from app.services.fund_cache import fund_cache
+from app.services.group_commit import group_commit
+from app.services.live import dashboard_hub
+from app.services.nav_asof import nav_asof
+
+# Months between rebalances for a simulated target-weight portfolio
+REBALANCE_MONTHS = {"monthly": 1, "quarterly": 3, "yearly": 12}
+
+# Funds whose holders are gathered per round trip in apply_nav_changes
+NAV_BATCH_FUNDS = 500
+
+# Users reconciled per transaction by rebuild_portfolio_values
+PORTFOLIO_BATCH_USERS = 1000
+
+# Chart periods: (days covered, points wanted)
+HISTORY_PERIODS = {"1M": (30, 30), "3M": (90, 45), "6M": (180, 60), "1Y": (365, 52), "3Y": (1095, 78),
+                   "MAX": (3650, 120)}
+# NAV resolutions coarsest first, with their length in days; the last always fits
+HISTORY_RESOLUTIONS = [("month", 30), ("week", 7), ("day", 1)]
+
+# Absolute difference verify_positions tolerates between stored and recomputed sums
+POSITION_TOLERANCE = 1e-6
+
+# Lot columns clients may request through fields=, including the valuation from the fund's current NAV
+_CURRENT_VALUE = UserInvestment.units * MutualFund.nav
+_RETURN_PERCENTAGE = (MutualFund.nav - UserInvestment.nav_at_investment) / UserInvestment.nav_at_investment * 100
+INVESTMENT_COLUMNS = dict(
+    table_columns(UserInvestment, ("id", "user_id", "fund_id", "investment_date", "amount", "nav_at_investment",
+                                   "units", "sip_plan_id", "created_at")),
+    fund_name=MutualFund.name.label("fund_name"),
+    current_value=_CURRENT_VALUE.label("current_value"),
+    return_percentage=_RETURN_PERCENTAGE.label("return_percentage"),
+)
+INVESTMENT_SORTS = {
+    "id": UserInvestment.id,
+    "investment_date": UserInvestment.investment_date,
+    "amount": UserInvestment.amount,
+    "current_value": _CURRENT_VALUE,
+    "return_percentage": _RETURN_PERCENTAGE,
+}
+
+# Per-fund aggregate columns for get_user_investments_by_fund, from user_positions
+_POSITION_VALUE = UserPosition.units * MutualFund.nav
+POSITION_SORTS = {
+    "fund_name": MutualFund.name,
+    "invested": UserPosition.cost,
+    "current_value": _POSITION_VALUE,
+    "return_percentage": (_POSITION_VALUE - UserPosition.cost) / UserPosition.cost * 100,
+}
+
+
+@observe_crud
 def get_investment(db: Session, investment_id: int) -> Optional[UserInvestment]:
     return db.query(UserInvestment).filter(UserInvestment.id == investment_id).first()
 
 
-def get_user_investments(db: Session, user_id: int) -> List[UserInvestment]:
-    return db.query(UserInvestment).filter(UserInvestment.user_id == user_id).all()
+def _user_lots(columns: List, user_id: int):
+    # One join: each lot's fund name and current NAV come from its fund's primary key row
+    return select(*columns).join_from(
+        UserInvestment, MutualFund, MutualFund.id == UserInvestment.fund_id
+    ).where(
+        UserInvestment.user_id == user_id
+    )
+
 
+@observe_crud
+def get_user_investments(db: Session, user_id: int, fields: Optional[List[str]] = None) -> List[Row]:
+    """A user's lots, valued at current NAVs, as plain rows of the requested columns (all by default)"""
+    return db.execute(_user_lots(select_columns(INVESTMENT_COLUMNS, fields), user_id).order_by(
+        UserInvestment.id
+    )).all()
 
-def create_investment(db: Session, investment: InvestmentCreate) -> UserInvestment:
+
+@observe_crud
+def list_user_investments(
+        db: Session, user_id: int, fields: Optional[List[str]] = None, sort_by: str = "id",
+        descending: bool = False, limit: Optional[int] = None, cursor: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of a user's valued lots ordered by sort_by then id, and the
+    keyset cursor of the next page (None on the last page or without limit).
+    ValueError for an unknown sort, field or cursor.
+    """
+    if sort_by not in INVESTMENT_SORTS:
+        raise ValueError(f"sort_by must be one of {', '.join(INVESTMENT_SORTS)}")
+    sort_key = INVESTMENT_SORTS[sort_by]
+    columns = select_columns(INVESTMENT_COLUMNS, fields)
+    # The keyset travels after the requested columns, whether or not they include it
+    query = _user_lots(columns + [sort_key.label("sort_key"), UserInvestment.id.label("lot_id")], user_id)
+
+    if cursor:
+        value, lot_id = decode_cursor(cursor, sort_by, descending)
+        if sort_by == "investment_date":
+            value = date.fromisoformat(value)
+        if descending:
+            query = query.where(or_(sort_key < value, and_(sort_key == value, UserInvestment.id < lot_id)))
+        else:
+            query = query.where(or_(sort_key > value, and_(sort_key == value, UserInvestment.id > lot_id)))
+    if descending:
+        query = query.order_by(sort_key.desc(), UserInvestment.id.desc())
+    else:
+        query = query.order_by(sort_key, UserInvestment.id)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    rows = db.execute(query).all()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort_by, descending, rows[-1].sort_key, rows[-1].lot_id)
+    keys = [column.key for column in columns]
+    return [dict(zip(keys, row)) for row in rows], next_cursor
+
+
+@observe_crud
+def get_user_investments_by_fund(
+        db: Session, user_id: int, sort_by: str = "current_value", descending: bool = True
+) -> List[Dict[str, Any]]:
+    """A user's holdings aggregated per fund, valued at current NAVs, from user_positions"""
+    if sort_by not in POSITION_SORTS:
+        raise ValueError(f"sort_by must be one of {', '.join(POSITION_SORTS)}")
+    sort_key = POSITION_SORTS[sort_by]
+    rows = db.execute(select(
+        UserPosition.fund_id,
+        MutualFund.name.label("fund_name"),
+        MutualFund.fund_type,
+        UserPosition.units,
+        UserPosition.cost.label("invested"),
+        UserPosition.avg_nav,
+        MutualFund.nav.label("current_nav"),
+        _POSITION_VALUE.label("current_value"),
+        POSITION_SORTS["return_percentage"].label("return_percentage"),
+        UserPosition.first_investment_date,
+        UserPosition.last_investment_date,
+    ).join_from(
+        UserPosition, MutualFund, MutualFund.id == UserPosition.fund_id
+    ).where(
+        UserPosition.user_id == user_id
+    ).order_by(
+        sort_key.desc() if descending else sort_key, UserPosition.fund_id
+    )).all()
+    return [row._asdict() for row in rows]
+
+
+def _nav_at_investment(db: Session, investment: InvestmentCreate) -> float:
+    """The NAV the client gave, else the fund's NAV as of the investment date; ValueError if it has none"""
+    if investment.nav_at_investment is not None:
+        return investment.nav_at_investment
+    nav = nav_asof.nav_on(db, investment.fund_id, investment.investment_date)
+    if nav is None:
+        raise ValueError(f"Fund {investment.fund_id} has no NAV on or before {investment.investment_date}")
+    return nav
+
+
+def _insert_investment(db: Session, investment: InvestmentCreate) -> Row:
+    nav_at_investment = _nav_at_investment(db, investment)
     # Calculate units based on amount and NAV
-    units = investment.amount / investment.nav_at_investment
-
-    db_investment = UserInvestment(
-        user_id=investment.user_id,
-        fund_id=investment.fund_id,
-        investment_date=investment.investment_date,
-        amount=investment.amount,
-        nav_at_investment=investment.nav_at_investment,
-        units=units
-    )
-    db.add(db_investment)
-    db.commit()
-    db.refresh(db_investment)
+    units = investment.amount / nav_at_investment
+
+    db_investment = db.execute(
+        insert(UserInvestment).values(
+            user_id=investment.user_id,
+            fund_id=investment.fund_id,
+            investment_date=investment.investment_date,
+            amount=investment.amount,
+            nav_at_investment=nav_at_investment,
+            units=units
+        ).returning(*UserInvestment.__table__.columns)
+    ).one()
+    _add_lot_to_position(db, db_investment)
+    refresh_portfolio_value(db, db_investment.user_id)
     return db_investment
 
 
+@observe_crud
+def create_investment(db: Session, investment: InvestmentCreate) -> Row:
+    """The new lot's row, read back with RETURNING; committed through group_commit"""
+    db_investment = group_commit.run(db, lambda session: _insert_investment(session, investment))
+    dashboard_hub.investments_changed(db, db_investment.user_id)
+    return db_investment
+
+
+@observe_crud
 def update_investment(db: Session, investment_id: int, investment: InvestmentCreate) -> Optional[UserInvestment]:
     db_investment = get_investment(db, investment_id)
     if not db_investment:
         return None
+    previous_user_id, previous_fund_id = db_investment.user_id, db_investment.fund_id
+    nav_at_investment = _nav_at_investment(db, investment)
 
     # Calculate new units if amount or NAV changed
-    if investment.amount != db_investment.amount or investment.nav_at_investment != db_investment.nav_at_investment:
-        units = investment.amount / investment.nav_at_investment
+    if investment.amount != db_investment.amount or nav_at_investment != db_investment.nav_at_investment:
+        units = investment.amount / nav_at_investment
         setattr(db_investment, "units", units)
 
-    for field, value in investment.dict(exclude={"units"}).items():
+    for field, value in investment.model_dump(exclude={"units", "nav_at_investment"}).items():
         setattr(db_investment, field, value)
-
+    db_investment.nav_at_investment = nav_at_investment
+
+    db.flush()
+    refresh_position(db, db_investment.user_id, db_investment.fund_id)
+    if (previous_user_id, previous_fund_id) != (db_investment.user_id, db_investment.fund_id):
+        refresh_position(db, previous_user_id, previous_fund_id)
+    refresh_portfolio_value(db, db_investment.user_id)
+    if previous_user_id != db_investment.user_id:
+        refresh_portfolio_value(db, previous_user_id)
     db.commit()
     db.refresh(db_investment)
+    dashboard_hub.investments_changed(db, db_investment.user_id)
+    if previous_user_id != db_investment.user_id:
+        dashboard_hub.investments_changed(db, previous_user_id)
     return db_investment
 
 
+@observe_crud
 def delete_investment(db: Session, investment_id: int) -> bool:
     db_investment = get_investment(db, investment_id)
     if not db_investment:
         return False
 
+    user_id, fund_id = db_investment.user_id, db_investment.fund_id
     db.delete(db_investment)
+    db.flush()
+    refresh_position(db, user_id, fund_id)
+    refresh_portfolio_value(db, user_id)
     db.commit()
+    dashboard_hub.investments_changed(db, user_id)
     return True
 
 
+@observe_crud
 def get_investment_summary(db: Session, user_id: int) -> Tuple[float, float]:
-    """Calculate current and initial investment value for a user"""
-    result = db.query(
-        func.sum(UserInvestment.units * MutualFund.nav).label("current_value"),
-        func.sum(UserInvestment.amount).label("initial_value")
+    """
+    Current and initial investment value for a user, from the maintained
+    user_portfolio_values row. Users without one yet (lots that predate the
+    table) are totalled from their positions; this read path never writes,
+    the row is created by the next write or rebuild_portfolio_values.
+    """
+    portfolio = db.get(UserPortfolioValue, user_id)
+    if portfolio is None:
+        totals = db.execute(_portfolio_totals().where(UserPosition.user_id == user_id)).first()
+        return (totals.current_value, totals.cost) if totals else (0.0, 0.0)
+
+    return portfolio.current_value or 0.0, portfolio.cost or 0.0
+
+
+def _portfolio_totals():
+    """(user_id, current value, cost) per user, from positions and current NAVs"""
+    return select(
+        UserPosition.user_id,
+        func.sum(UserPosition.units * MutualFund.nav).label("current_value"),
+        func.sum(UserPosition.cost).label("cost")
     ).join(
-        MutualFund, UserInvestment.fund_id == MutualFund.id
-    ).filter(
-        UserInvestment.user_id == user_id
+        MutualFund, MutualFund.id == UserPosition.fund_id
+    ).group_by(
+        UserPosition.user_id
+    )
+
+
+def _position_totals():
+    """Per (user, fund) aggregates of the lots, which user_positions must match"""
+    return select(
+        UserInvestment.user_id,
+        UserInvestment.fund_id,
+        func.sum(UserInvestment.units).label("units"),
+        func.sum(UserInvestment.amount).label("cost"),
+        func.min(UserInvestment.nav_at_investment).label("min_nav"),
+        func.max(UserInvestment.nav_at_investment).label("max_nav"),
+        func.min(UserInvestment.investment_date).label("first_investment_date"),
+        func.max(UserInvestment.investment_date).label("last_investment_date")
+    ).group_by(
+        UserInvestment.user_id, UserInvestment.fund_id
+    )
+
+
+def _fold_into_position(position: UserPosition, units: float, cost: float, min_nav: float, max_nav: float,
+                        first_day: date, last_day: date):
+    position.units += units
+    position.cost += cost
+    position.min_nav = min(position.min_nav, min_nav)
+    position.max_nav = max(position.max_nav, max_nav)
+    position.first_investment_date = min(position.first_investment_date, first_day)
+    position.last_investment_date = max(position.last_investment_date, last_day)
+    position.avg_nav = position.cost / position.units if position.units else 0.0
+
+
+def _add_to_position(db: Session, user_id: int, fund_id: int, units: float, cost: float, min_nav: float,
+                     max_nav: float, first_day: date, last_day: date):
+    """Add lots' sums and bounds to a (user, fund) position, creating it when missing; the caller commits"""
+    key = (user_id, fund_id)
+    position = db.get(UserPosition, key, with_for_update=True)
+    if position is None:
+        # FOR UPDATE locks nothing while the position does not exist, so a
+        # concurrent first lot may insert it first: that insert then fails on the
+        # primary key and the lots are folded into the row it committed
+        try:
+            with db.begin_nested():
+                db.add(UserPosition(
+                    user_id=user_id, fund_id=fund_id, units=units, cost=cost,
+                    avg_nav=cost / units if units else 0.0, min_nav=min_nav, max_nav=max_nav,
+                    first_investment_date=first_day, last_investment_date=last_day
+                ))
+            return
+        except IntegrityError:
+            position = db.get(UserPosition, key, with_for_update=True, populate_existing=True)
+    _fold_into_position(position, units, cost, min_nav, max_nav, first_day, last_day)
+    db.flush()
+
+
+def _add_lot_to_position(db: Session, lot: Row):
+    """Fold a new lot into its position without re-reading the other lots; the caller commits"""
+    _add_to_position(db, lot.user_id, lot.fund_id, lot.units, lot.amount, lot.nav_at_investment,
+                     lot.nav_at_investment, lot.investment_date, lot.investment_date)
+
+
+@observe_crud
+def refresh_position(db: Session, user_id: int, fund_id: int) -> Optional[UserPosition]:
+    """
+    Recompute one position from its lots, removing it when none are left.
+    Used when a lot is changed or deleted; the caller commits.
+    """
+    totals = db.execute(
+        _position_totals().where(UserInvestment.user_id == user_id, UserInvestment.fund_id == fund_id)
     ).first()
+    position = db.get(UserPosition, (user_id, fund_id), with_for_update=True)
+    if totals is None:
+        if position is not None:
+            db.delete(position)
+            db.flush()
+        return None
 
-    return result.current_value or 0.0, result.initial_value or 0.0
+    if position is None:
+        position = UserPosition(user_id=user_id, fund_id=fund_id)
+        db.add(position)
+    for field in ("units", "cost", "min_nav", "max_nav", "first_investment_date", "last_investment_date"):
+        setattr(position, field, getattr(totals, field))
+    position.avg_nav = totals.cost / totals.units if totals.units else 0.0
+    db.flush()
+    return position
 
 
-def get_performance_extremes(db: Session, user_id: int) -> Tuple[FundPerformance, FundPerformance]:
-    """Get best and worst performing funds for a user"""
-    query = db.query(
-        MutualFund.id,
-        MutualFund.name,
-        ((MutualFund.nav - UserInvestment.nav_at_investment) / UserInvestment.nav_at_investment * 100).label(
-            "return_percentage")
-    ).join(
-        UserInvestment, UserInvestment.fund_id == MutualFund.id
-    ).filter(
-        UserInvestment.user_id == user_id
+@observe_crud
+def get_user_positions(db: Session, user_id: int) -> List[UserPosition]:
+    return db.query(UserPosition).filter(UserPosition.user_id == user_id).all()
+
+
+@observe_crud
+def add_lots_in_bulk(db: Session, user_ids: np.ndarray, fund_ids: np.ndarray, dates: np.ndarray,
+                     amounts: np.ndarray, navs: np.ndarray, sip_plan_ids: Optional[np.ndarray] = None) -> int:
+    """
+    Insert many lots with one executemany and fold them into user_positions and
+    user_portfolio_values once per (user, fund) and user rather than once per
+    lot. Inputs are aligned arrays, one entry per lot. The caller commits.
+    """
+    count = len(user_ids)
+    if not count:
+        return 0
+    units = amounts / navs
+    days = np.asarray(dates, dtype="datetime64[D]")
+    plans = sip_plan_ids.tolist() if sip_plan_ids is not None else [None] * count
+    db.execute(UserInvestment.__table__.insert(), [
+        {
+            "user_id": user_id, "fund_id": fund_id, "investment_date": day, "amount": amount,
+            "nav_at_investment": nav, "units": lot_units, "sip_plan_id": plan_id
+        }
+        for user_id, fund_id, day, amount, nav, lot_units, plan_id in zip(
+            user_ids.tolist(), fund_ids.tolist(), days.tolist(), amounts.tolist(), navs.tolist(),
+            units.tolist(), plans
+        )
+    ])
+
+    # Per (user, fund) sums and bounds of the new lots
+    keys, group = np.unique(np.column_stack([user_ids, fund_ids]), axis=0, return_inverse=True)
+    group = group.ravel()
+    order = np.argsort(group, kind="stable")
+    starts = np.r_[0, np.flatnonzero(np.diff(group[order])) + 1]
+    day_numbers = days.astype(np.int64)[order]
+    added = zip(
+        keys.tolist(),
+        np.bincount(group, weights=units).tolist(),
+        np.bincount(group, weights=amounts).tolist(),
+        np.minimum.reduceat(navs[order], starts).tolist(),
+        np.maximum.reduceat(navs[order], starts).tolist(),
+        np.minimum.reduceat(day_numbers, starts).astype("datetime64[D]").tolist(),
+        np.maximum.reduceat(day_numbers, starts).astype("datetime64[D]").tolist()
     )
 
-    # Best performing fund
-    best_fund = query.order_by(desc("return_percentage")).first()
+    positions = {
+        (position.user_id, position.fund_id): position
+        for position in db.query(UserPosition).filter(
+            UserPosition.user_id.in_(np.unique(user_ids).tolist()),
+            UserPosition.fund_id.in_(np.unique(fund_ids).tolist())
+        ).with_for_update()
+    }
+    created = []
+    for (user_id, fund_id), *sums in added:
+        position = positions.get((user_id, fund_id))
+        if position is None:
+            created.append((user_id, fund_id, *sums))
+        else:
+            _fold_into_position(position, *sums)
+    db.flush()
+    if created:
+        try:
+            with db.begin_nested():
+                db.execute(UserPosition.__table__.insert(), [
+                    {
+                        "user_id": user_id, "fund_id": fund_id, "units": add_units, "cost": add_cost,
+                        "avg_nav": add_cost / add_units, "min_nav": min_nav, "max_nav": max_nav,
+                        "first_investment_date": first_day, "last_investment_date": last_day
+                    }
+                    for user_id, fund_id, add_units, add_cost, min_nav, max_nav, first_day, last_day in created
+                ])
+        except IntegrityError:
+            # Concurrent first lots created some of them: fold into those, create the rest
+            for new_position in created:
+                _add_to_position(db, *new_position)
+
+    refresh_portfolio_values(db, np.unique(user_ids).tolist())
+    return count
+
+
+@observe_crud
+def rebuild_positions(db: Session) -> int:
+    """Recompute every position from the lots, e.g. after lots were bulk loaded outside the crud layer"""
+    db.query(UserPosition).delete(synchronize_session=False)
+    totals = _position_totals().subquery()
+    result = db.execute(
+        UserPosition.__table__.insert().from_select(
+            ["user_id", "fund_id", "units", "cost", "avg_nav", "min_nav", "max_nav",
+             "first_investment_date", "last_investment_date"],
+            select(
+                totals.c.user_id, totals.c.fund_id, totals.c.units, totals.c.cost,
+                totals.c.cost / totals.c.units, totals.c.min_nav, totals.c.max_nav,
+                totals.c.first_investment_date, totals.c.last_investment_date
+            )
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+
+@observe_crud
+def verify_positions(db: Session) -> List[Dict[str, Any]]:
+    """
+    (user_id, fund_id, problem) for every position that disagrees with the lots:
+    "missing" (lots without a position), "stale" (sums or bounds differ) or
+    "orphaned" (a position without lots).
+    """
+    totals = _position_totals().subquery()
+    joined = and_(UserPosition.user_id == totals.c.user_id, UserPosition.fund_id == totals.c.fund_id)
+    differs = or_(
+        func.abs(UserPosition.units - totals.c.units) > POSITION_TOLERANCE,
+        func.abs(UserPosition.cost - totals.c.cost) > POSITION_TOLERANCE,
+        UserPosition.min_nav != totals.c.min_nav,
+        UserPosition.max_nav != totals.c.max_nav,
+        UserPosition.first_investment_date != totals.c.first_investment_date,
+        UserPosition.last_investment_date != totals.c.last_investment_date
+    )
+    query = union_all(
+        select(totals.c.user_id, totals.c.fund_id, literal("missing").label("problem")).where(
+            ~exists().where(joined)
+        ),
+        select(totals.c.user_id, totals.c.fund_id, literal("stale").label("problem")).join(
+            UserPosition, joined
+        ).where(differs),
+        select(UserPosition.user_id, UserPosition.fund_id, literal("orphaned").label("problem")).where(
+            ~exists().where(
+                UserInvestment.user_id == UserPosition.user_id, UserInvestment.fund_id == UserPosition.fund_id
+            )
+        )
+    )
+    return [dict(row._mapping) for row in db.execute(query)]
+
+
+def _lock_portfolio_row(db: Session, user_id: int) -> UserPortfolioValue:
+    """The user's portfolio row, locked; inserted as zeros (and so locked too) when missing"""
+    portfolio = db.get(UserPortfolioValue, user_id, with_for_update=True)
+    if portfolio is None:
+        # FOR UPDATE locks nothing while the row does not exist; if a concurrent
+        # write inserts it first, ours fails on the primary key and locks theirs
+        try:
+            with db.begin_nested():
+                portfolio = UserPortfolioValue(user_id=user_id, current_value=0.0, cost=0.0)
+                db.add(portfolio)
+        except IntegrityError:
+            portfolio = db.get(UserPortfolioValue, user_id, with_for_update=True, populate_existing=True)
+    return portfolio
+
+
+@observe_crud
+def refresh_portfolio_value(db: Session, user_id: int) -> UserPortfolioValue:
+    """Recompute one user's portfolio value from their positions; the caller commits"""
+    # Lock the row before reading NAVs: a concurrent NAV change either commits first (and the
+    # totals see its NAV) or waits and applies its delta on top of the recomputed value
+    portfolio = _lock_portfolio_row(db, user_id)
+    totals = db.execute(_portfolio_totals().where(UserPosition.user_id == user_id)).first()
+    portfolio.current_value = totals.current_value if totals else 0.0
+    portfolio.cost = totals.cost if totals else 0.0
+    db.flush()
+    return portfolio
+
+
+@observe_crud
+def refresh_portfolio_values(db: Session, user_ids: List[int]) -> int:
+    """
+    Set-based refresh_portfolio_value for many users at once, updating their
+    rows in place: rows are locked in user_id order (inserted as zeros for users
+    without one) before the totals are read, as in refresh_portfolio_value, and
+    rows of users left without positions are deleted. Returns the number of
+    users with positions; the caller commits.
+    """
+    user_ids = sorted(set(user_ids))
+    table = UserPortfolioValue.__table__
+    existing = set(db.scalars(
+        select(table.c.user_id).where(table.c.user_id.in_(user_ids)).order_by(table.c.user_id).with_for_update()
+    ))
+    missing = [user_id for user_id in user_ids if user_id not in existing]
+    if missing:
+        try:
+            with db.begin_nested():
+                db.execute(table.insert(), [{"user_id": user_id, "current_value": 0.0, "cost": 0.0}
+                                            for user_id in missing])
+        except IntegrityError:
+            # Some were inserted concurrently: take the rest one at a time
+            for user_id in missing:
+                _lock_portfolio_row(db, user_id)
+
+    totals = db.execute(_portfolio_totals().where(UserPosition.user_id.in_(user_ids))).all()
+    if totals:
+        db.execute(
+            update(table).where(table.c.user_id == bindparam("holder_id")).values(
+                current_value=bindparam("value"), cost=bindparam("total_cost")
+            ),
+            [{"holder_id": row.user_id, "value": row.current_value, "total_cost": row.cost} for row in totals]
+        )
+    held = {row.user_id for row in totals}
+    empty = [user_id for user_id in user_ids if user_id not in held]
+    if empty:
+        db.execute(delete(table).where(table.c.user_id.in_(empty)))
+    return len(totals)
 
-    # Worst performing fund
-    worst_fund = query.order_by("return_percentage").first()
+
+@observe_crud
+def apply_nav_change(db: Session, fund_id: int, nav_delta: float):
+    """
+    Add units x nav_delta to the portfolio value of every holder of a fund, in
+    one UPDATE driven by the fund -> (user, units) index. The caller commits.
+    """
+    units = select(UserPosition.units).where(
+        UserPosition.fund_id == fund_id,
+        UserPosition.user_id == UserPortfolioValue.user_id
+    ).scalar_subquery()
+    db.execute(
+        update(UserPortfolioValue).where(
+            UserPortfolioValue.user_id.in_(select(UserPosition.user_id).where(UserPosition.fund_id == fund_id))
+        ).values(
+            current_value=UserPortfolioValue.current_value + nav_delta * units
+        ),
+        execution_options={"synchronize_session": False}
+    )
+
+
+@observe_crud
+def apply_nav_changes(db: Session, nav_deltas: Dict[int, float]) -> int:
+    """
+    Batch form of apply_nav_change for end-of-day NAV loads: holders of
+    NAV_BATCH_FUNDS funds at a time are netted per user and written with one
+    executemany, so only holders are touched and memory is bounded by a batch.
+    Returns the number of portfolio rows updated; the caller commits.
+    """
+    fund_ids = [fund_id for fund_id, delta in nav_deltas.items() if delta]
+    updated = 0
+    for start in range(0, len(fund_ids), NAV_BATCH_FUNDS):
+        batch = fund_ids[start:start + NAV_BATCH_FUNDS]
+        user_deltas: Dict[int, float] = {}
+        for row in db.execute(
+            select(UserPosition.user_id, UserPosition.fund_id, UserPosition.units).where(
+                UserPosition.fund_id.in_(batch)
+            )
+        ):
+            user_deltas[row.user_id] = user_deltas.get(row.user_id, 0.0) + row.units * nav_deltas[row.fund_id]
+        if not user_deltas:
+            continue
+        result = db.execute(
+            update(UserPortfolioValue.__table__).where(
+                UserPortfolioValue.__table__.c.user_id == bindparam("holder_id")
+            ).values(
+                current_value=UserPortfolioValue.__table__.c.current_value + bindparam("delta")
+            ),
+            [{"holder_id": user_id, "delta": delta} for user_id, delta in user_deltas.items()]
+        )
+        updated += result.rowcount
+    return updated
+
+
+@observe_crud
+def rebuild_portfolio_values(db: Session) -> int:
+    """
+    Recompute every user's portfolio value from their positions, correcting any
+    drift. Runs against live traffic: users are reconciled PORTFOLIO_BATCH_USERS
+    at a time with refresh_portfolio_values (rows locked and updated in place,
+    missing rows inserted, rows without positions deleted), one commit per
+    batch. Returns the number of users with positions.
+    """
+    holders = union(select(UserPosition.user_id), select(UserPortfolioValue.user_id)).subquery()
+    rows = 0
+    last_id = 0
+    while True:
+        user_ids = db.scalars(
+            select(holders.c.user_id).where(holders.c.user_id > last_id).order_by(holders.c.user_id)
+            .limit(PORTFOLIO_BATCH_USERS)
+        ).all()
+        if not user_ids:
+            break
+        rows += refresh_portfolio_values(db, user_ids)
+        db.commit()
+        last_id = user_ids[-1]
+    return rows
+
+
+@observe_crud
+def reload_portfolio_values(db: Session) -> int:
+    """
+    Empty user_portfolio_values and reload it from positions in one statement.
+    Rows disappear until the commit, so this is for offline loaders only; a
+    running service uses rebuild_portfolio_values.
+    """
+    db.query(UserPortfolioValue).delete(synchronize_session=False)
+    totals = _portfolio_totals().subquery()
+    result = db.execute(
+        UserPortfolioValue.__table__.insert().from_select(
+            ["user_id", "current_value", "cost"],
+            select(totals.c.user_id, totals.c.current_value, totals.c.cost)
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+
+@observe_crud
+def get_performance_extremes(db: Session, user_id: int) -> Tuple[FundPerformance, FundPerformance]:
+    """Get best and worst performing funds for a user"""
+    # A fund's best lot is the one bought at the lowest NAV and its worst the one
+    # bought at the highest, and positions keep both bounds per fund.
+    lots = db.query(
+        UserPosition.fund_id,
+        UserPosition.min_nav,
+        UserPosition.max_nav
+    ).filter(
+        UserPosition.user_id == user_id
+    ).all()
+
+    funds = fund_cache.get_many(db, [lot.fund_id for lot in lots])
+    best_fund = worst_fund = None
+    for lot in lots:
+        fund = funds.get(lot.fund_id)
+        if fund is None:
+            continue
+        best_return = (fund.nav - lot.min_nav) / lot.min_nav * 100
+        worst_return = (fund.nav - lot.max_nav) / lot.max_nav * 100
+        if best_fund is None or best_return > best_fund[1]:
+            best_fund = (fund, best_return)
+        if worst_fund is None or worst_return < worst_fund[1]:
+            worst_fund = (fund, worst_return)
 
     if not best_fund or not worst_fund:
         # Default values if no funds found
@@ -101,60 +688,40 @@ def get_performance_extremes(db: Session, user_id: int) -> Tuple[FundPerformance
         return empty_fund, empty_fund
 
     best_fund_dict = {
-        "id": best_fund.id,
-        "name": best_fund.name,
-        "return_percentage": round(best_fund.return_percentage, 2)
+        "id": best_fund[0].id,
+        "name": best_fund[0].name,
+        "return_percentage": round(best_fund[1], 2)
     }
 
     worst_fund_dict = {
-        "id": worst_fund.id,
-        "name": worst_fund.name,
-        "return_percentage": round(worst_fund.return_percentage, 2)
+        "id": worst_fund[0].id,
+        "name": worst_fund[0].name,
+        "return_percentage": round(worst_fund[1], 2)
     }
 
     return best_fund_dict, worst_fund_dict
 
 
+@observe_crud
 def get_historical_performance(db: Session, user_id: int, period: str = "1M") -> List[Dict[str, Any]]:
     """
-    Get historical performance data for line chart with optimized query performance.
-    Using a single SQL query with proper joins and sampling for longer periods.
+    Portfolio value series for the line chart. Reads the coarsest NAV
+    resolution giving the period at least its number of points (daily NAVs
+    for short periods, the weekly or monthly rollups for long ones), then
+    keeps every n-th point when that resolution still gives twice as many.
     """
-    # Determine date range based on period
+    days, points = HISTORY_PERIODS.get(period, HISTORY_PERIODS["MAX"])
     today = datetime.now().date()
-    if period == "1M":
-        start_date = today - timedelta(days=30)
-        # For a month, get daily data
-        interval = 'day'
-    elif period == "3M":
-        start_date = today - timedelta(days=90)
-        # For 3 months, get data every 2 days
-        interval = 'day'
-        sampling_factor = 2
-    elif period == "6M":
-        start_date = today - timedelta(days=180)
-        # For 6 months, get data every 3 days
-        interval = 'day'
-        sampling_factor = 3
-    elif period == "1Y":
-        start_date = today - timedelta(days=365)
-        # For 1 year, get weekly data
-        interval = 'week'
-    elif period == "3Y":
-        start_date = today - timedelta(days=1095)
-        # For 3 years, get bi-weekly data
-        interval = 'week'
-        sampling_factor = 2
-    else:  # MAX
-        start_date = today - timedelta(days=3650)  # 10 years
-        # For MAX, get monthly data
-        interval = 'month'
-
-    # Build the base query with interval sampling for date
-    if interval == 'day' and period in ["3M", "6M"]:
-        # For day intervals with sampling, manually select dates
-        # at the specified sampling rate
-        date_query = db.query(
+    start_date = today - timedelta(days=days)
+    interval, interval_days = next(
+        (interval, interval_days) for interval, interval_days in HISTORY_RESOLUTIONS
+        if days // interval_days >= points
+    )
+    step = max(days // interval_days // points, 1)
+
+    if interval == "day":
+        # Sample the NAV dates first so the join only touches the kept days
+        dates = [row.date for row in db.query(
             HistoricalNAV.date
         ).filter(
             HistoricalNAV.date >= start_date,
@@ -163,20 +730,8 @@ def get_historical_performance(db: Session, user_id: int, period: str = "1M") ->
             HistoricalNAV.date
         ).order_by(
             HistoricalNAV.date
-        )
-
-        # Apply sampling for longer periods to reduce data points
-        if period == "3M":
-            # Keep every 2nd day
-            dates = [row.date for i, row in enumerate(date_query) if i % 2 == 0]
-        elif period == "6M":
-            # Keep every 3rd day
-            dates = [row.date for i, row in enumerate(date_query) if i % 3 == 0]
-        else:
-            dates = [row.date for row in date_query]
-
-        # Do the actual query with the sampled dates
-        query = db.query(
+        )][::step]
+        result = db.query(
             HistoricalNAV.date,
             func.sum(UserInvestment.units * HistoricalNAV.nav).label("portfolio_value")
         ).join(
@@ -189,49 +744,28 @@ def get_historical_performance(db: Session, user_id: int, period: str = "1M") ->
             HistoricalNAV.date
         ).order_by(
             HistoricalNAV.date
-        )
-
+        ).all()
     else:
-        # For week/month intervals, use PostgreSQL's date_trunc function
-        # This is much more efficient than manual sampling
-        query = db.query(
-            func.date_trunc(interval, HistoricalNAV.date).label('grouped_date'),
-            func.avg(UserInvestment.units * HistoricalNAV.nav).label("avg_value")
+        # One rollup row per fund and period, found through its (fund_id, period_start) key;
+        # each period is valued at its last NAV
+        rollup = NAV_ROLLUPS[interval]
+        result = db.query(
+            func.max(rollup.date).label("date"),
+            func.sum(UserInvestment.units * rollup.nav).label("portfolio_value")
         ).join(
-            UserInvestment, HistoricalNAV.fund_id == UserInvestment.fund_id
+            UserInvestment, rollup.fund_id == UserInvestment.fund_id
         ).filter(
             UserInvestment.user_id == user_id,
-            HistoricalNAV.date >= start_date,
-            HistoricalNAV.date <= today,
-            UserInvestment.investment_date <= HistoricalNAV.date
+            rollup.period_start >= date_trunc(interval, start_date),
+            rollup.period_start <= today,
+            UserInvestment.investment_date <= rollup.date
         ).group_by(
-            'grouped_date'
+            rollup.period_start
         ).order_by(
-            'grouped_date'
-        )
+            rollup.period_start
+        ).all()[::step]
 
-        if interval == 'week' and period == "3Y":
-            # For 3Y, get every other week
-            result_all = query.all()
-            result = [row for i, row in enumerate(result_all) if i % 2 == 0]
-        else:
-            result = query.all()
-
-        # Format the result
-        return [
-            {
-                "date": row.grouped_date.strftime("%d %b") if hasattr(row, 'grouped_date') else row.date.strftime(
-                    "%d %b"),
-                "value": round(row.avg_value if hasattr(row, 'avg_value') else row.portfolio_value, 2)
-            }
-            for row in result
-        ]
-
-    # Execute query
-    result = query.all()
-
-    # Format result
-    performance_data = [
+    return [
         {
             "date": row.date.strftime("%d %b"),
             "value": round(row.portfolio_value, 2)
@@ -239,4 +773,186 @@ def get_historical_performance(db: Session, user_id: int, period: str = "1M") ->
         for row in result
     ]
 
-    return performance_data
\ No newline at end of file
+
+@observe_crud
+def simulate_portfolios(db: Session, request: SimulationRequest) -> List[Dict[str, Any]]:
+    """
+    Value series of what-if portfolios against historical NAVs.
+
+    NAVs for every fund in any scenario are loaded once into a date-aligned
+    matrix; each scenario becomes a list of buy/switch/rebalance events and all
+    of them are valued together by analytics.simulate_portfolios.
+    Raises ValueError for scenarios that cannot be evaluated.
+    """
+    portfolio_lots = []
+    if any(scenario.include_portfolio for scenario in request.scenarios):
+        if request.user_id is None:
+            raise ValueError("include_portfolio requires user_id")
+        portfolio_lots = db.query(
+            UserInvestment.fund_id, UserInvestment.investment_date, UserInvestment.amount, UserInvestment.units
+        ).filter(
+            UserInvestment.user_id == request.user_id
+        ).all()
+
+    fund_ids, event_dates = set(), []
+    for scenario in request.scenarios:
+        lots = list(scenario.lots) + (portfolio_lots if scenario.include_portfolio else [])
+        fund_ids.update(lot.fund_id for lot in lots)
+        event_dates.extend(lot.investment_date for lot in lots)
+        for switch in scenario.switches:
+            fund_ids.update((switch.from_fund_id, switch.to_fund_id))
+            event_dates.append(switch.switch_date)
+        if scenario.target_weights:
+            if scenario.initial_amount is None:
+                raise ValueError(f"Scenario '{scenario.name}' has target_weights but no initial_amount")
+            if scenario.rebalance is not None and scenario.rebalance not in REBALANCE_MONTHS:
+                raise ValueError(f"Unknown rebalance rule '{scenario.rebalance}'")
+            fund_ids.update(scenario.target_weights)
+    if not fund_ids:
+        raise ValueError("Scenarios hold no funds")
+
+    start_date = min([request.start_date] if request.start_date else event_dates, default=None)
+    if start_date is None:
+        raise ValueError("start_date is required for target-weight scenarios without lots")
+    end_date = request.end_date or date.today()
+
+    # Date-aligned NAV matrix, forward-filled over days a fund has no NAV
+    funds = sorted(fund_ids)
+    columns = {fund_id: col for col, fund_id in enumerate(funds)}
+    rows = db.query(HistoricalNAV.date, HistoricalNAV.fund_id, HistoricalNAV.nav).filter(
+        HistoricalNAV.fund_id.in_(funds),
+        HistoricalNAV.date >= start_date,
+        HistoricalNAV.date <= end_date
+    ).all()
+    if not rows:
+        raise ValueError("No NAV history in the simulated period")
+    nav_dates, fund_column, nav_values = zip(*rows)
+    dates, date_rows = np.unique(np.array(nav_dates, dtype="datetime64[D]"), return_inverse=True)
+    raw = np.full((len(dates), len(funds)), np.nan)
+    raw[date_rows, [columns[fund_id] for fund_id in fund_column]] = nav_values
+    navs = analytics.forward_fill(raw)
+
+    has_nav = ~np.isnan(raw)
+    first_valid = {fund_id: int(np.argmax(has_nav[:, columns[fund_id]])) for fund_id in funds
+                   if has_nav[:, columns[fund_id]].any()}
+    months = dates.astype("datetime64[M]").astype(int)
+
+    def row_for(day: date, *needed: int) -> int:
+        for fund_id in needed:
+            if fund_id not in first_valid:
+                raise ValueError(f"No NAV history for fund {fund_id} in the simulated period")
+        row = int(np.searchsorted(dates, np.datetime64(day, "D")))
+        row = max([row] + [first_valid[fund_id] for fund_id in needed])
+        if row >= len(dates):
+            raise ValueError(f"{day} is after the last NAV date {dates[-1]}")
+        return row
+
+    scenario_events = []
+    for scenario in request.scenarios:
+        events = []
+        for lot in scenario.lots:
+            events.append((analytics.BUY, row_for(lot.investment_date, lot.fund_id), columns[lot.fund_id],
+                           lot.amount, float("nan")))
+        if scenario.include_portfolio:
+            for lot in portfolio_lots:
+                events.append((analytics.BUY, row_for(lot.investment_date, lot.fund_id), columns[lot.fund_id],
+                               lot.amount, lot.units))
+        for switch in scenario.switches:
+            events.append((analytics.SWITCH, row_for(switch.switch_date, switch.from_fund_id, switch.to_fund_id),
+                           columns[switch.from_fund_id], columns[switch.to_fund_id], switch.fraction))
+        if scenario.target_weights:
+            total_weight = sum(scenario.target_weights.values())
+            if total_weight <= 0:
+                raise ValueError(f"Scenario '{scenario.name}' has no positive target weights")
+            weights = np.zeros(len(funds))
+            for fund_id, weight in scenario.target_weights.items():
+                weights[columns[fund_id]] = weight / total_weight
+            start_row = row_for(request.start_date or start_date, *scenario.target_weights)
+            for fund_id in scenario.target_weights:
+                events.append((analytics.BUY, start_row, columns[fund_id],
+                               scenario.initial_amount * weights[columns[fund_id]], float("nan")))
+            if scenario.rebalance:
+                periods = months // REBALANCE_MONTHS[scenario.rebalance]
+                for row in np.flatnonzero(np.diff(periods)) + 1:
+                    if row > start_row:
+                        events.append((analytics.REBALANCE, int(row), weights.tolist()))
+        scenario_events.append(events)
+
+    values, invested = compute_pool.run(analytics.simulate_portfolios, navs, scenario_events,
+                                        rows=navs.size * len(scenario_events))
+
+    sampled = np.unique(np.linspace(0, len(dates) - 1, min(len(dates), request.max_points)).round().astype(int))
+    iso_dates = dates.astype(str)
+    results = []
+    for scenario, series, amount in zip(request.scenarios, values, invested):
+        series = np.asarray(series)
+        peaks = np.maximum.accumulate(series)
+        drawdowns = np.divide(series - peaks, peaks, out=np.zeros_like(series), where=peaks > 0)
+        final_value = float(series[-1])
+        results.append({
+            "name": scenario.name,
+            "invested": round(amount, 2),
+            "final_value": round(final_value, 2),
+            "return_percentage": round((final_value - amount) / amount * 100, 2) if amount else 0.0,
+            "max_drawdown_percentage": round(float(drawdowns.min()) * -100, 2),
+            "series": [{"date": iso_dates[row], "value": series[row]} for row in sampled]
+        })
+    return results
+
+
+
+# The iter_* readers below are generators, so they are not wrapped in observe_crud:
+# the decorator would only time creating the generator, not consuming it.
+
+def iter_investment_lots(db: Session, user_id: int, batch_size: int = 1000) -> Iterator[Tuple]:
+    """
+    Every lot of a user with its fund name and current value, oldest first.
+    Rows are fetched batch_size at a time (a server-side cursor on PostgreSQL),
+    so memory stays flat however many lots the user has.
+    """
+    result = db.execute(
+        select(
+            UserInvestment.id,
+            UserInvestment.fund_id,
+            MutualFund.name,
+            UserInvestment.investment_date,
+            UserInvestment.amount,
+            UserInvestment.nav_at_investment,
+            UserInvestment.units,
+            MutualFund.nav
+        ).join(
+            MutualFund, MutualFund.id == UserInvestment.fund_id
+        ).where(
+            UserInvestment.user_id == user_id
+        ).order_by(
+            UserInvestment.investment_date, UserInvestment.id
+        ).execution_options(yield_per=batch_size)
+    )
+    for row in result:
+        current_value = row.units * row.nav
+        yield (
+            row.id, row.fund_id, row.name, row.investment_date, row.amount, row.nav_at_investment,
+            row.units, row.nav, round(current_value, 2),
+            round((current_value - row.amount) / row.amount * 100, 2) if row.amount else 0.0
+        )
+
+
+def iter_portfolio_value_series(db: Session, user_id: int, batch_size: int = 1000) -> Iterator[Tuple]:
+    """Daily (date, portfolio value) over the user's whole NAV history, streamed like iter_investment_lots"""
+    result = db.execute(
+        select(
+            HistoricalNAV.date,
+            func.sum(UserInvestment.units * HistoricalNAV.nav).label("portfolio_value")
+        ).join(
+            UserInvestment, HistoricalNAV.fund_id == UserInvestment.fund_id
+        ).where(
+            UserInvestment.user_id == user_id,
+            UserInvestment.investment_date <= HistoricalNAV.date
+        ).group_by(
+            HistoricalNAV.date
+        ).order_by(
+            HistoricalNAV.date
+        ).execution_options(yield_per=batch_size)
+    )
+    for row in result:
+        yield row.date, round(row.portfolio_value, 2)
@@ -0,0 +1,149 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, or_, select, update
+from typing import Callable, Dict, List, Optional
+from datetime import date
+
+import numpy as np
+
+from app.models.investment import SipPlan, UserInvestment
+from app.schemas.investment import SipPlanCreate
+from app.metrics import observe_crud
+from app.services import analytics
+from app.services.live import dashboard_hub
+from app.services.nav_asof import nav_asof
+from app.crud.investment import add_lots_in_bulk
+
+# Months between instalments for each supported frequency
+SIP_FREQUENCIES = {"monthly": 1, "quarterly": 3, "half_yearly": 6, "yearly": 12}
+
+# Plans expanded per transaction by materialize_sip_plans
+SIP_BATCH_PLANS = 1000
+
+
+@observe_crud
+def get_sip_plan(db: Session, plan_id: int) -> Optional[SipPlan]:
+    return db.query(SipPlan).filter(SipPlan.id == plan_id).first()
+
+
+@observe_crud
+def get_user_sip_plans(db: Session, user_id: int) -> List[SipPlan]:
+    return db.query(SipPlan).filter(SipPlan.user_id == user_id).order_by(SipPlan.id).all()
+
+
+@observe_crud
+def create_sip_plan(db: Session, plan: SipPlanCreate) -> SipPlan:
+    """Create a plan and materialize its instalments up to today; ValueError for an invalid plan"""
+    if plan.frequency not in SIP_FREQUENCIES:
+        raise ValueError(f"Unknown frequency '{plan.frequency}'; expected one of {', '.join(SIP_FREQUENCIES)}")
+    if plan.amount <= 0:
+        raise ValueError("amount must be positive")
+    if plan.end_date is not None and plan.end_date < plan.start_date:
+        raise ValueError("end_date is before start_date")
+
+    db_plan = SipPlan(**plan.model_dump())
+    db.add(db_plan)
+    db.commit()
+    materialize_sip_plans(db, plan_ids=[db_plan.id])
+    db.refresh(db_plan)
+    return db_plan
+
+
+@observe_crud
+def delete_sip_plan(db: Session, plan_id: int) -> bool:
+    """Remove a plan; lots it already produced stay as ordinary investments"""
+    db_plan = get_sip_plan(db, plan_id)
+    if not db_plan:
+        return False
+
+    db.execute(
+        update(UserInvestment).where(UserInvestment.sip_plan_id == plan_id).values(sip_plan_id=None),
+        execution_options={"synchronize_session": False}
+    )
+    db.delete(db_plan)
+    db.commit()
+    return True
+
+
+@observe_crud
+def materialize_sip_plans(db: Session, through: Optional[date] = None, plan_ids: Optional[List[int]] = None,
+                          on_batch: Optional[Callable[[int], None]] = None) -> Dict[str, int]:
+    """
+    Turn every instalment due up to `through` (default today) and not yet
+    materialized into a UserInvestment lot.
+
+    Plans are processed SIP_BATCH_PLANS at a time in id order. For each batch
+    the instalment dates are generated with analytics.sip_schedule, priced in
+    one vectorized as-of lookup against the NAV history, and inserted together
+    with the position and portfolio updates and the plans' new
+    materialized_through in one transaction. A re-run only picks up instalments
+    after materialized_through, so an interrupted backfill resumes where it
+    stopped. A plan's instalments from the first one without a NAV (dated
+    before the fund's first NAV) are left for a later run, once the fund's
+    NAV history reaches back to it.
+
+    A batch's plans stay locked until its commit and concurrent runs skip
+    locked plans, so two runs never materialize the same instalments twice.
+    """
+    through = through or date.today()
+    counts = {"plans": 0, "lots_created": 0, "instalments_without_nav": 0}
+    last_id = 0
+    while True:
+        query = select(
+            SipPlan.id, SipPlan.user_id, SipPlan.fund_id, SipPlan.amount, SipPlan.frequency,
+            SipPlan.start_date, SipPlan.end_date, SipPlan.materialized_through
+        ).where(
+            SipPlan.id > last_id,
+            SipPlan.start_date <= through,
+            or_(SipPlan.materialized_through.is_(None), SipPlan.materialized_through < through),
+            # Finished plans that are fully materialized have nothing left to do
+            or_(SipPlan.end_date.is_(None), SipPlan.materialized_through.is_(None),
+                SipPlan.materialized_through < SipPlan.end_date)
+        ).order_by(SipPlan.id).limit(SIP_BATCH_PLANS).with_for_update(skip_locked=True)
+        if plan_ids is not None:
+            query = query.where(SipPlan.id.in_(plan_ids))
+        plans = db.execute(query).all()
+        if not plans:
+            break
+        last_id = plans[-1].id
+
+        ids = np.array([plan.id for plan in plans])
+        user_ids = np.array([plan.user_id for plan in plans])
+        fund_ids = np.array([plan.fund_id for plan in plans])
+        amounts = np.array([plan.amount for plan in plans], dtype=float)
+        ends = np.array([min(plan.end_date or through, through) for plan in plans], dtype="datetime64[D]")
+        done = np.array([plan.materialized_through or date.min for plan in plans], dtype="datetime64[D]")
+        index, dates = analytics.sip_schedule(
+            np.array([plan.start_date for plan in plans], dtype="datetime64[D]"),
+            ends,
+            np.array([SIP_FREQUENCIES[plan.frequency] for plan in plans])
+        )
+        due = dates > done[index]
+        index, dates = index[due], dates[due]
+
+        navs, _ = nav_asof.lookup(db, fund_ids[index], dates)
+        priced = ~np.isnan(navs)
+        counts["instalments_without_nav"] += int((~priced).sum())
+        # A plan is materialized only up to the day before its first unpriced
+        # instalment, so that instalment is created once its NAV history is loaded
+        np.minimum.at(ends, index[~priced], dates[~priced] - np.timedelta64(1, "D"))
+        created = priced & (dates <= ends[index])
+        index, dates, navs = index[created], dates[created], navs[created]
+
+        add_lots_in_bulk(db, user_ids[index], fund_ids[index], dates, amounts[index], navs, sip_plan_ids=ids[index])
+        db.execute(
+            update(SipPlan.__table__).where(
+                SipPlan.__table__.c.id == bindparam("plan_id")
+            ).values(
+                materialized_through=bindparam("through")
+            ),
+            [{"plan_id": plan_id, "through": end} for plan_id, end in zip(ids.tolist(), ends.tolist())]
+        )
+        db.commit()
+
+        for user_id in np.unique(user_ids[index]).tolist():
+            dashboard_hub.investments_changed(db, user_id)
+        counts["plans"] += len(plans)
+        counts["lots_created"] += len(index)
+        if on_batch is not None:
+            on_batch(counts["plans"])
+    return counts
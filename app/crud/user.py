@@ -1,30 +1,43 @@
+from sqlalchemy import insert, select
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
 from app.models.user import User
 from app.schemas.user import UserCreate
+from app.metrics import observe_crud
+from app.projection import select_columns, table_columns
+from app.services.group_commit import group_commit
 
+# Columns clients may request through fields=
+USER_COLUMNS = table_columns(User, ("id", "name", "email", "created_at"))
 
+
+@observe_crud
 def get_user(db: Session, user_id: int) -> Optional[User]:
     return db.query(User).filter(User.id == user_id).first()
 
 
+@observe_crud
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
     return db.query(User).filter(User.email == email).first()
 
 
-def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[User]:
-    return db.query(User).offset(skip).limit(limit).all()
+@observe_crud
+def get_users(db: Session, skip: int = 0, limit: int = 100, fields: Optional[List[str]] = None) -> List[Row]:
+    """Users as plain rows of the requested columns (all by default); no ORM instances are built"""
+    return db.execute(select(*select_columns(USER_COLUMNS, fields)).offset(skip).limit(limit)).all()
 
 
-def create_user(db: Session, user: UserCreate) -> User:
-    db_user = User(name=user.name, email=user.email)
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+@observe_crud
+def create_user(db: Session, user: UserCreate) -> Row:
+    """The new user's row, read back with RETURNING; committed through group_commit"""
+    return group_commit.run(db, lambda session: session.execute(
+        insert(User).values(name=user.name, email=user.email).returning(*User.__table__.columns)
+    ).one())
 
 
+@observe_crud
 def update_user(db: Session, user_id: int, user: UserCreate) -> Optional[User]:
     db_user = get_user(db, user_id)
     if not db_user:
@@ -38,6 +51,7 @@ def update_user(db: Session, user_id: int, user: UserCreate) -> Optional[User]:
     return db_user
 
 
+@observe_crud
 def delete_user(db: Session, user_id: int) -> bool:
     db_user = get_user(db, user_id)
     if not db_user:
@@ -1,20 +1,61 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+import asyncio
 import uvicorn
 import os
 
-from app.routers import users, investments, funds, analysis
-from app.database import engine, Base
+from app.config import settings
+from app.admission import AdmissionControlMiddleware
+from app.routers import users, investments, funds, analysis, admin
+from app.database import engine, replicas, Base
+from app.profiling import SQLProfilingMiddleware, install_sql_profiling
+from app.metrics import MetricsMiddleware, instrument_pool, render_metrics
+from app.services.warmup import readiness, run_warmups
+from app.services.jobs import scheduler
+from app.services.compute import ComputePoolBusy, ComputeTimeout, compute_pool
+from app.services import analysis_service  # registers the analytics jobs
+from app.services import investment_service  # registers the SIP job
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema creation is deferred to startup (and skipped in production, where
+    # Alembic owns the schema) so importing the app never touches the database.
+    if settings.CREATE_SCHEMA_ON_STARTUP:
+        await run_in_threadpool(Base.metadata.create_all, bind=engine)
+
+    # Warm up in the background: /healthz answers immediately, /readyz once warm.
+    warmup = None
+    if settings.WARMUP_ON_STARTUP:
+        warmup = asyncio.get_running_loop().run_in_executor(None, run_warmups)
+    else:
+        readiness.ready = True
+
+    if settings.JOB_SCHEDULER_ENABLED:
+        scheduler.start()
+
+    yield
+
+    if settings.JOB_SCHEDULER_ENABLED:
+        await run_in_threadpool(scheduler.stop)
+    if warmup is not None:
+        await warmup
+    await run_in_threadpool(compute_pool.shutdown)
 
-# Create tables if they don't exist
-Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="Investment Dashboard API",
     description="API for Investment Dashboard",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Per-route-class concurrency limits; added first so CORS headers reach its 503s too
+app.add_middleware(AdmissionControlMiddleware, engine=engine)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -24,16 +65,54 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Per-request SQL profiling, sampled via SQL_PROFILING_SAMPLE_RATE
+for profiled_engine in [engine, *replicas.engines]:
+    install_sql_profiling(profiled_engine)
+app.add_middleware(SQLProfilingMiddleware)
+
+# Prometheus metrics, scraped from /metrics
+instrument_pool(engine)
+app.add_middleware(MetricsMiddleware)
+
+# Offloaded analytics: shed load when the compute pool is saturated
+@app.exception_handler(ComputePoolBusy)
+async def compute_pool_busy_handler(request: Request, exc: ComputePoolBusy):
+    return JSONResponse({"detail": "Analytics capacity exhausted, retry shortly"}, status_code=503,
+                        headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)})
+
+
+@app.exception_handler(ComputeTimeout)
+async def compute_timeout_handler(request: Request, exc: ComputeTimeout):
+    return JSONResponse({"detail": str(exc)}, status_code=504)
+
+
 # Include routers
 app.include_router(users.router, prefix="/api/users", tags=["users"])
 app.include_router(investments.router, prefix="/api/investments", tags=["investments"])
 app.include_router(funds.router, prefix="/api/funds", tags=["funds"])
 app.include_router(analysis.router, prefix="/api/analysis", tags=["analysis"])
+app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 
 @app.get("/", tags=["root"])
 async def read_root():
     return {"message": "Welcome to Investment Dashboard API"}
 
+
+@app.get("/healthz", include_in_schema=False)
+async def read_health():
+    return {"status": "ok"}
+
+
+@app.get("/readyz", include_in_schema=False)
+async def read_readiness():
+    return JSONResponse(readiness.as_dict(), status_code=200 if readiness.ready else 503)
+
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=True)
\ No newline at end of file
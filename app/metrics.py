@@ -0,0 +1,180 @@
+import os
+import time
+from functools import wraps
+from typing import Callable, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to a directory shared by
+# them (and empty at startup); each worker writes its samples there and /metrics
+# aggregates all of them.
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+CRUD_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served",
+    multiprocess_mode="livesum",
+)
+CRUD_LATENCY = Histogram(
+    "crud_function_duration_seconds",
+    "Latency of crud layer functions",
+    ["function"],
+    buckets=CRUD_BUCKETS,
+)
+DB_POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Configured connection pool size",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Open DBAPI connections held by the pool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Connections currently checked out of the pool",
+    multiprocess_mode="livesum",
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests",
+    "Cache lookups by cache and result (hit or miss)",
+    ["cache", "result"],
+)
+COMPUTE_TASKS = Counter(
+    "compute_tasks",
+    "Analytics tasks by function and outcome (ok, inline, timeout or rejected)",
+    ["function", "result"],
+)
+COMPUTE_PENDING = Gauge(
+    "compute_tasks_pending",
+    "Tasks queued or running in the compute process pool",
+    multiprocess_mode="livesum",
+)
+ADMISSION_REQUESTS = Counter(
+    "admission_requests",
+    "Admission decisions by route class (admitted, queued, or shed_queue_full, shed_timeout, shed_pool)",
+    ["route_class", "result"],
+)
+ADMISSION_QUEUED = Gauge(
+    "admission_queue_depth",
+    "Requests waiting for a slot in their route class",
+    ["route_class"],
+    multiprocess_mode="livesum",
+)
+SINGLE_FLIGHT_REQUESTS = Counter(
+    "single_flight_requests",
+    "Coalesced endpoint calls by role: leader (ran the computation) or follower (shared a leader's result); "
+    "the coalescing ratio is follower / (leader + follower)",
+    ["route", "role"],
+)
+GROUP_COMMIT_BATCH_SIZE = Histogram(
+    "group_commit_batch_size",
+    "Writes committed together per group commit transaction",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+
+def observe_crud(func: Callable) -> Callable:
+    """Record the latency of a crud function in crud_function_duration_seconds"""
+    histogram = CRUD_LATENCY.labels(func.__name__)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started)
+
+    return wrapper
+
+
+def record_cache_access(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def instrument_pool(engine: Engine):
+    """Track pool occupancy through pool events, so the gauges work across worker processes"""
+    pool = engine.pool
+    size = getattr(pool, "size", None)
+    if callable(size):
+        DB_POOL_SIZE.inc(size())
+        # Connections opened before instrumentation (e.g. by create_all)
+        DB_POOL_CONNECTIONS.inc(pool.checkedin() + pool.checkedout())
+
+    @event.listens_for(pool, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        DB_POOL_CONNECTIONS.inc()
+
+    @event.listens_for(pool, "close")
+    def _on_close(dbapi_connection, connection_record):
+        DB_POOL_CONNECTIONS.dec()
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.dec()
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency histograms and the in-flight gauge"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            # Label by route template rather than raw path to keep cardinality bounded
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope.get("method", ""),
+                getattr(route, "path", "unmatched"),
+                str(status["code"]),
+            ).observe(time.perf_counter() - started)
@@ -1,12 +1,16 @@
 from app.models.user import User
 from app.models.fund import (
     MutualFund,
+    FundCatalogVersion,
     FundSectorAllocation,
     FundStockAllocation,
     FundMarketCapAllocation,
     FundOverlap,
     HistoricalNAV,
+    WeeklyNAV,
+    MonthlyNAV,
     Stock,
     FundHolding
 )
-from app.models.investment import UserInvestment
\ No newline at end of file
+from app.models.investment import UserInvestment, UserPosition, UserPortfolioValue, SipPlan
+from app.models.job import JobLock, JobRun
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, UniqueConstraint, Date
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, UniqueConstraint, Date, Index, DDL, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -24,6 +24,25 @@ class MutualFund(Base):
     holdings = relationship("FundHolding", back_populates="fund")
 
 
+class FundCatalogVersion(Base):
+    """
+    Single row counting committed writes to mutual_funds. Fund writes bump it
+    in their own transaction, so its row lock orders the bumps by commit and
+    workers' fund caches can tell whether the catalog changed since they loaded
+    it (updated_at cannot: now() is the transaction's start, not its commit).
+    """
+    __tablename__ = "fund_catalog_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+event.listen(
+    FundCatalogVersion.__table__, "after_create",
+    DDL("INSERT INTO fund_catalog_version (id, version) VALUES (1, 0)")
+)
+
+
 class FundSectorAllocation(Base):
     __tablename__ = "fund_sector_allocations"
 
@@ -37,6 +56,10 @@ class FundSectorAllocation(Base):
     # Relationships
     fund = relationship("MutualFund", back_populates="sector_allocations")
 
+    __table_args__ = (
+        Index('ix_fund_sector_allocations_fund_sector', 'fund_id', 'sector', postgresql_include=['percentage']),
+    )
+
 
 class FundStockAllocation(Base):
     __tablename__ = "fund_stock_allocations"
@@ -79,6 +102,8 @@ class FundOverlap(Base):
 
     __table_args__ = (
         UniqueConstraint('fund_id_1', 'fund_id_2', name='unique_fund_pair'),
+        # Overlaps with a set of funds on either side of the pair (screener)
+        Index('ix_fund_overlaps_fund2_fund1', 'fund_id_2', 'fund_id_1', postgresql_include=['overlap_percentage']),
     )
 
 
@@ -96,9 +121,39 @@ class HistoricalNAV(Base):
 
     __table_args__ = (
         UniqueConstraint('fund_id', 'date', name='unique_fund_date'),
+        # Date-only range scans (sampled chart dates) cannot use unique_fund_date
+        Index('ix_historical_nav_date_fund', 'date', 'fund_id', postgresql_include=['nav']),
     )
 
 
+class WeeklyNAV(Base):
+    """
+    Each fund's last NAV of every week (weeks start on Monday, as date_trunc's),
+    maintained from historical_nav so long-range charts read a row per week.
+    """
+    __tablename__ = "nav_weekly"
+
+    fund_id = Column(Integer, ForeignKey("mutual_funds.id"), primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    # Date of the NAV: the week's last day with one so far
+    date = Column(Date, nullable=False)
+    nav = Column(Float, nullable=False)
+
+
+class MonthlyNAV(Base):
+    """Each fund's last NAV of every calendar month, as WeeklyNAV for months"""
+    __tablename__ = "nav_monthly"
+
+    fund_id = Column(Integer, ForeignKey("mutual_funds.id"), primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    date = Column(Date, nullable=False)
+    nav = Column(Float, nullable=False)
+
+
+# Rollup table per date_trunc interval
+NAV_ROLLUPS = {"week": WeeklyNAV, "month": MonthlyNAV}
+
+
 class Stock(Base):
     __tablename__ = "stocks"
 
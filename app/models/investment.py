@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Date
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Date, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -14,8 +14,79 @@ class UserInvestment(Base):
     amount = Column(Float, nullable=False)
     nav_at_investment = Column(Float, nullable=False)
     units = Column(Float, nullable=False)
+    # Set on lots materialized from a SIP plan
+    sip_plan_id = Column(Integer, ForeignKey("sip_plans.id"), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
     user = relationship("User", back_populates="investments")
-    fund = relationship("MutualFund", back_populates="investments")
\ No newline at end of file
+    fund = relationship("MutualFund", back_populates="investments")
+
+    __table_args__ = (
+        # Every portfolio query filters by user and joins on fund; the included
+        # columns let PostgreSQL answer summaries from the index alone.
+        Index(
+            'ix_user_investments_user_fund',
+            'user_id', 'fund_id',
+            postgresql_include=['units', 'amount', 'nav_at_investment', 'investment_date']
+        ),
+    )
+
+
+class UserPosition(Base):
+    """
+    One row per (user, fund) aggregating that user's lots in the fund,
+    maintained by the investment crud writes so portfolio analytics read a
+    row per fund instead of re-aggregating every lot.
+    """
+    __tablename__ = "user_positions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    fund_id = Column(Integer, ForeignKey("mutual_funds.id"), primary_key=True)
+    units = Column(Float, nullable=False)
+    cost = Column(Float, nullable=False)
+    # cost / units; min and max lot NAVs give each fund's best and worst lot return
+    avg_nav = Column(Float, nullable=False)
+    min_nav = Column(Float, nullable=False)
+    max_nav = Column(Float, nullable=False)
+    first_investment_date = Column(Date, nullable=False)
+    last_investment_date = Column(Date, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # fund -> (user, units): the holders a NAV change has to be applied to
+        Index('ix_user_positions_fund_user', 'fund_id', 'user_id', postgresql_include=['units']),
+    )
+
+
+class UserPortfolioValue(Base):
+    """
+    Each user's current portfolio value and cost, kept up to date by the crud
+    layer (units x delta-NAV on NAV changes, a per-user refresh on investment
+    writes) so the dashboard summary is a primary-key read.
+    """
+    __tablename__ = "user_portfolio_values"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    current_value = Column(Float, nullable=False, default=0.0)
+    cost = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class SipPlan(Base):
+    """
+    A recurring investment of amount in a fund every frequency from start_date
+    until end_date (open-ended when None). Instalments become UserInvestment
+    lots in bulk; materialized_through is the last date already turned into lots.
+    """
+    __tablename__ = "sip_plans"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    fund_id = Column(Integer, ForeignKey("mutual_funds.id"), nullable=False)
+    amount = Column(Float, nullable=False)
+    frequency = Column(String, nullable=False)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=True)
+    materialized_through = Column(Date, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Index, JSON
+from sqlalchemy.sql import func
+
+from app.database import Base
+
+
+class JobLock(Base):
+    """One row per job; a run holds the job while locked_until is in the future"""
+    __tablename__ = "job_locks"
+
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+
+
+class JobRun(Base):
+    __tablename__ = "job_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_name = Column(String, nullable=False)
+    trigger = Column(String, nullable=False)  # schedule or manual
+    status = Column(String, nullable=False)  # queued, running, succeeded, failed, skipped
+    params = Column(JSON, nullable=True)  # arguments for parameterised jobs such as user_export
+    progress = Column(Float, nullable=False, default=0.0)
+    message = Column(Text, nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    duration_ms = Column(Float, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_job_runs_job_name_id', 'job_name', 'id'),
+    )
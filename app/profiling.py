@@ -0,0 +1,130 @@
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+
+logger = logging.getLogger("app.profiling")
+
+# Profile of the request being served, if it was sampled. The ContextVar is copied
+# into the threadpool that runs sync endpoints, so crud queries land on the same object.
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("sql_request_profile", default=None)
+
+
+class RequestProfile:
+    __slots__ = ("query_count", "db_time", "slowest_statement", "slowest_time", "statements", "started")
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_time = 0.0
+        self.slowest_statement: Optional[str] = None
+        self.slowest_time = 0.0
+        self.statements: Counter = Counter()
+        self.started = 0.0
+
+    def record(self, statement: str, duration: float):
+        self.query_count += 1
+        self.db_time += duration
+        self.statements[statement] += 1
+        if duration > self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_statement = statement
+
+    def repeated_statements(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statements executed at least threshold times, the usual signature of an N+1 loop"""
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+    def server_timing(self, repeated: List[Tuple[str, int]]) -> str:
+        metrics = [
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.query_count} queries"',
+            f"db-slowest;dur={self.slowest_time * 1000:.2f}",
+        ]
+        if repeated:
+            metrics.append(f'db-repeated;desc="{len(repeated)} repeated statements"')
+        return ", ".join(metrics)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.record(statement, time.perf_counter() - profile.started)
+
+
+def install_sql_profiling(engine: Engine):
+    """Attach the cursor hooks; they are no-ops for requests that were not sampled"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class SQLProfilingMiddleware:
+    """
+    ASGI middleware recording query count, DB time and the slowest statement for
+    sampled requests, emitted as a Server-Timing header and a structured log line.
+    """
+
+    def __init__(self, app, sample_rate: Optional[float] = None, n_plus_one_threshold: Optional[int] = None):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope, receive, send):
+        sample_rate = self.sample_rate if self.sample_rate is not None else settings.SQL_PROFILING_SAMPLE_RATE
+        if scope["type"] != "http" or sample_rate <= 0 or random.random() >= sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        threshold = self.n_plus_one_threshold or settings.SQL_PROFILING_N_PLUS_ONE_THRESHOLD
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        status: Dict[str, Any] = {}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                repeated = profile.repeated_statements(threshold)
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", profile.server_timing(repeated).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_profile.reset(token)
+            self._log(scope, status.get("code"), profile, time.perf_counter() - started, threshold)
+
+    def _log(self, scope, status_code, profile: RequestProfile, elapsed: float, threshold: int):
+        repeated = profile.repeated_statements(threshold)
+        record = {
+            "method": scope.get("method"),
+            "path": scope.get("path"),
+            "status": status_code,
+            "duration_ms": round(elapsed * 1000, 2),
+            "query_count": profile.query_count,
+            "db_time_ms": round(profile.db_time * 1000, 2),
+            "slowest_ms": round(profile.slowest_time * 1000, 2),
+            "slowest_statement": profile.slowest_statement,
+        }
+        logger.info(json.dumps(record))
+        for statement, count in repeated:
+            logger.warning(json.dumps({
+                "event": "possible_n_plus_one",
+                "path": scope.get("path"),
+                "count": count,
+                "statement": statement,
+            }))
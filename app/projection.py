@@ -0,0 +1,76 @@
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.sql import ColumnElement
+from starlette.responses import Response
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Names from a comma-separated fields= parameter; None (every column) when empty"""
+    if fields is None:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    return names or None
+
+
+def table_columns(model, names: Sequence[str]) -> Dict[str, ColumnElement]:
+    return {name: model.__table__.columns[name] for name in names}
+
+
+def select_columns(available: Dict[str, ColumnElement], fields: Optional[Sequence[str]]) -> List[ColumnElement]:
+    """
+    Columns for a Core select: those named in fields, in the order given, or
+    all of available when fields is None. Names outside available raise ValueError.
+    """
+    if fields is None:
+        return list(available.values())
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(available)}")
+    return [available[name] for name in dict.fromkeys(fields)]
+
+
+def as_dicts(rows) -> List[dict]:
+    """
+    Rows as dicts, for response model validation: pydantic reads dicts far
+    faster than it reads attributes off Row objects.
+    """
+    if not rows:
+        return []
+    keys = rows[0]._fields
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def _json_default(value: Any):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def json_response(items: List[dict], headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    JSON array encoded directly. Used for projected rows, which skip response
+    model validation: their columns are a client-chosen subset of the model.
+    """
+    body = json.dumps(items, default=_json_default, separators=(",", ":"))
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def encode_cursor(sort_by: str, descending: bool, value: Any, row_id: int) -> str:
+    """Opaque keyset cursor: the sort order and the (sort value, id) of the last row served"""
+    payload = json.dumps([sort_by, descending, value, row_id], default=_json_default)
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str, sort_by: str, descending: bool) -> Tuple[Any, int]:
+    """(sort value, id) of the last row of the previous page; ValueError if the cursor is not for this order"""
+    try:
+        cursor_sort, cursor_descending, value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        row_id = int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if cursor_sort != sort_by or cursor_descending != descending:
+        raise ValueError("Cursor belongs to a different sort order")
+    return value, row_id
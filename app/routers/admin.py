@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from app.database import get_db
+from app.models.job import JobRun
+from app.services.jobs import scheduler
+from app import schemas
+
+router = APIRouter()
+
+
+@router.get("/jobs", response_model=List[schemas.Job])
+def read_jobs(db: Session = Depends(get_db)):
+    """Registered jobs with their schedule, next run and latest run"""
+    return scheduler.describe(db)
+
+
+@router.get("/jobs/runs", response_model=List[schemas.JobRun])
+def read_job_runs(job_name: Optional[str] = None, limit: int = 50, db: Session = Depends(get_db)):
+    """Most recent runs first, optionally for one job"""
+    query = db.query(JobRun)
+    if job_name is not None:
+        query = query.filter(JobRun.job_name == job_name)
+    return query.order_by(JobRun.id.desc()).limit(limit).all()
+
+
+@router.get("/jobs/runs/{run_id}", response_model=schemas.JobRun)
+def read_job_run(run_id: int, db: Session = Depends(get_db)):
+    run = db.query(JobRun).filter(JobRun.id == run_id).first()
+    if run is None:
+        raise HTTPException(status_code=404, detail="Job run not found")
+    return run
+
+
+@router.post("/jobs/{job_name}/run", response_model=schemas.JobRun, status_code=202)
+def trigger_job(job_name: str, db: Session = Depends(get_db)):
+    """Queue an on-demand run; poll /jobs/runs/{id} for progress"""
+    if job_name not in scheduler.jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    run_id = scheduler.trigger(job_name, trigger="manual")
+    return db.query(JobRun).filter(JobRun.id == run_id).first()
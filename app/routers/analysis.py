@@ -2,15 +2,21 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
-from app.database import get_db
+from app.database import get_read_db
 from app import crud, schemas
+from app.services.single_flight import single_flight
 
 router = APIRouter()
 
 
 @router.get("/sector-allocation/{user_id}", response_model=List[schemas.SectorAllocation])
-def get_sector_allocation(user_id: int, db: Session = Depends(get_db)):
+def get_sector_allocation(user_id: int, db: Session = Depends(get_read_db)):
     """Get sector allocation for a user's portfolio"""
+    # Widgets refreshing together ask for the same allocation at once; they share one computation
+    return single_flight.do("sector_allocation", user_id, _sector_allocation, db, user_id)
+
+
+def _sector_allocation(db: Session, user_id: int):
     user = crud.get_user(db, user_id=user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -23,7 +29,7 @@ def get_overlap_analysis(
         user_id: int,
         fund1_id: Optional[int] = None,
         fund2_id: Optional[int] = None,
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_read_db)
 ):
     """Get overlap analysis for funds in user's portfolio"""
     user = crud.get_user(db, user_id=user_id)
@@ -38,4 +44,15 @@ def get_overlap_analysis(
         return [overlap]
     else:
         # Get all overlaps for user's funds
-        return crud.get_all_fund_overlaps(db, user_id=user_id)
\ No newline at end of file
+        return crud.get_all_fund_overlaps(db, user_id=user_id)
+
+
+@router.post("/simulate", response_model=List[schemas.ScenarioResult])
+def simulate(request: schemas.SimulationRequest, db: Session = Depends(get_read_db)):
+    """Value hypothetical lots, fund switches and rebalanced target weights against historical NAVs"""
+    if request.user_id is not None and not crud.get_user(db, user_id=request.user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        return crud.simulate_portfolios(db, request=request)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
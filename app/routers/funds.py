@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Dict, List, Optional
 
-from app.database import get_db
+from app.config import settings
+from app.database import get_db, get_read_db
+from app.projection import as_dicts, json_response, parse_fields
 from app import crud, schemas
 
 router = APIRouter()
@@ -16,14 +18,51 @@ def create_fund(fund: schemas.MutualFundCreate, db: Session = Depends(get_db)):
     return crud.create_fund(db=db, fund=fund)
 
 
+@router.post("/navs", response_model=Dict[str, int])
+def ingest_navs(updates: List[schemas.NavUpdate], db: Session = Depends(get_db)):
+    """Bulk NAV load: history rows, current NAVs and holders' portfolio values in one transaction"""
+    return crud.ingest_navs(db, updates=updates)
+
+
+@router.post("/nav-asof", response_model=List[schemas.NavAsOf])
+def read_navs_asof(queries: List[schemas.NavAsOfQuery], db: Session = Depends(get_read_db)):
+    """NAV of each (fund_id, as_of) pair on that date, or the last one published before it"""
+    if len(queries) > settings.NAV_ASOF_MAX_PAIRS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.NAV_ASOF_MAX_PAIRS} pairs per request")
+    return crud.get_navs_asof(db, queries=queries)
+
+
+@router.post("/screen", response_model=schemas.FundScreenPage)
+def screen_funds(request: schemas.FundScreenRequest, db: Session = Depends(get_read_db)):
+    """Funds matching type, NAV, return, sector, market-cap and portfolio overlap filters, keyset paged"""
+    if request.overlap_user_id is not None and not crud.get_user(db, user_id=request.overlap_user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        return crud.screen_funds(db, request=request)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
 @router.get("/", response_model=List[schemas.MutualFund])
-def read_funds(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    funds = crud.get_funds(db, skip=skip, limit=limit)
-    return funds
+def read_funds(skip: int = 0, limit: int = 100, fields: Optional[str] = None, db: Session = Depends(get_read_db)):
+    """fields: comma-separated columns to return (e.g. id,name,nav) instead of whole funds"""
+    selected = parse_fields(fields)
+    try:
+        funds = crud.get_funds(db, skip=skip, limit=limit, fields=selected)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return json_response(as_dicts(funds)) if selected else as_dicts(funds)
+
+
+@router.get("/search", response_model=List[schemas.FundSearchResult])
+def search_funds(q: str = Query(..., min_length=1, max_length=100), limit: int = Query(10, ge=1, le=50),
+                 db: Session = Depends(get_read_db)):
+    """Typeahead: prefix and fuzzy matches on fund name, ISN and fund type, ranked by match quality"""
+    return crud.search_funds(db, query=q, limit=limit)
 
 
 @router.get("/{fund_id}", response_model=schemas.MutualFund)
-def read_fund(fund_id: int, db: Session = Depends(get_db)):
+def read_fund(fund_id: int, db: Session = Depends(get_read_db)):
     db_fund = crud.get_fund(db, fund_id=fund_id)
     if db_fund is None:
         raise HTTPException(status_code=404, detail="Fund not found")
@@ -1,24 +1,90 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-
-from app.database import get_db
+from typing import List, Optional
+import asyncio
+import json
+
+from app.database import get_db, get_read_db
+from app.projection import json_response, parse_fields
+from app.services.live import Subscriber, dashboard_hub
+from app.services.single_flight import single_flight
 from app import crud, schemas
 
+# Comment lines sent on idle live streams so proxies keep the connection open
+HEARTBEAT_SECONDS = 15.0
+
 router = APIRouter()
 
 
 @router.post("/", response_model=schemas.Investment)
 def create_investment(investment: schemas.InvestmentCreate, db: Session = Depends(get_db)):
-    return crud.create_investment(db=db, investment=investment)
+    try:
+        return crud.create_investment(db=db, investment=investment)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.post("/sips", response_model=schemas.SipPlan)
+def create_sip_plan(plan: schemas.SipPlanCreate, db: Session = Depends(get_db)):
+    """Create a SIP plan; instalments already due are turned into lots straight away"""
+    try:
+        return crud.create_sip_plan(db=db, plan=plan)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.get("/sips/user/{user_id}", response_model=List[schemas.SipPlan])
+def read_user_sip_plans(user_id: int, db: Session = Depends(get_db)):
+    return crud.get_user_sip_plans(db, user_id=user_id)
+
+
+@router.delete("/sips/{plan_id}", response_model=bool)
+def delete_sip_plan(plan_id: int, db: Session = Depends(get_db)):
+    result = crud.delete_sip_plan(db, plan_id=plan_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="SIP plan not found")
+    return result
 
 
 @router.get("/user/{user_id}", response_model=List[schemas.Investment])
-def read_user_investments(user_id: int, db: Session = Depends(get_db)):
-    investments = crud.get_user_investments(db, user_id=user_id)
+def read_user_investments(
+        user_id: int, response: Response, fields: Optional[str] = None, sort_by: str = "id",
+        descending: bool = False, limit: Optional[int] = Query(None, ge=1, le=1000), cursor: Optional[str] = None,
+        db: Session = Depends(get_db)
+):
+    """
+    A user's lots with fund name, current value and return, ordered by sort_by
+    (id, investment_date, amount, current_value or return_percentage).
+    fields: comma-separated columns to return (e.g. fund_id,current_value) instead of whole lots.
+    With limit, the cursor of the next page is sent in the X-Next-Cursor header.
+    """
+    selected = parse_fields(fields)
+    try:
+        investments, next_cursor = crud.list_user_investments(
+            db, user_id=user_id, fields=selected, sort_by=sort_by, descending=descending, limit=limit, cursor=cursor
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    if selected:
+        return json_response(investments, headers=headers)
+    if headers:
+        response.headers.update(headers)
     return investments
 
 
+@router.get("/user/{user_id}/by-fund", response_model=List[schemas.InvestmentByFund])
+def read_user_investments_by_fund(user_id: int, sort_by: str = "current_value", descending: bool = True,
+                                  db: Session = Depends(get_db)):
+    """A user's holdings per fund; sort_by: fund_name, invested, current_value or return_percentage"""
+    try:
+        return crud.get_user_investments_by_fund(db, user_id=user_id, sort_by=sort_by, descending=descending)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
 @router.get("/{investment_id}", response_model=schemas.Investment)
 def read_investment(investment_id: int, db: Session = Depends(get_db)):
     db_investment = crud.get_investment(db, investment_id=investment_id)
@@ -29,7 +95,10 @@ def read_investment(investment_id: int, db: Session = Depends(get_db)):
 
 @router.put("/{investment_id}", response_model=schemas.Investment)
 def update_investment(investment_id: int, investment: schemas.InvestmentCreate, db: Session = Depends(get_db)):
-    db_investment = crud.update_investment(db, investment_id=investment_id, investment=investment)
+    try:
+        db_investment = crud.update_investment(db, investment_id=investment_id, investment=investment)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     if db_investment is None:
         raise HTTPException(status_code=404, detail="Investment not found")
     return db_investment
@@ -44,8 +113,13 @@ def delete_investment(investment_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/dashboard/{user_id}", response_model=schemas.DashboardData)
-def get_dashboard_data(user_id: int, db: Session = Depends(get_db)):
+def get_dashboard_data(user_id: int, db: Session = Depends(get_read_db)):
     """Get dashboard summary data for a specific user"""
+    # Tabs opened together (and market-open refreshes) share one in-flight computation
+    return single_flight.do("dashboard", user_id, _dashboard_data, db, user_id)
+
+
+def _dashboard_data(db: Session, user_id: int):
     user = crud.get_user(db, user_id=user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -74,4 +148,33 @@ def get_dashboard_data(user_id: int, db: Session = Depends(get_db)):
         "performance_data": performance_data,
         "sector_allocation": sector_allocation,
         "fund_overlap": fund_overlap
-    }
\ No newline at end of file
+    }
+
+
+@router.get("/dashboard/{user_id}/stream")
+async def stream_dashboard(user_id: int, db: Session = Depends(get_read_db)):
+    """
+    Server-Sent Events replacing dashboard polling: a snapshot on connect, then
+    a delta (new value, changed sector amounts, new chart point) whenever a held
+    fund's NAV or the user's investments change.
+    """
+    user = await run_in_threadpool(crud.get_user, db, user_id=user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    subscriber = Subscriber(asyncio.get_running_loop())
+    await run_in_threadpool(dashboard_hub.subscribe, db, user_id, subscriber)
+
+    async def events():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            dashboard_hub.unsubscribe(user_id, subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
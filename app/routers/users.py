@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+import os
 
 from app.database import get_db
+from app.models.job import JobRun
+from app.projection import as_dicts, json_response, parse_fields
+from app.services import export
+from app.services.jobs import scheduler
 from app import crud, schemas
 
 router = APIRouter()
@@ -17,9 +23,14 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
 
 @router.get("/", response_model=List[schemas.User])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    users = crud.get_users(db, skip=skip, limit=limit)
-    return users
+def read_users(skip: int = 0, limit: int = 100, fields: Optional[str] = None, db: Session = Depends(get_db)):
+    """fields: comma-separated columns to return (e.g. id,name) instead of whole users"""
+    selected = parse_fields(fields)
+    try:
+        users = crud.get_users(db, skip=skip, limit=limit, fields=selected)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return json_response(as_dicts(users)) if selected else as_dicts(users)
 
 
 @router.get("/{user_id}", response_model=schemas.User)
@@ -43,4 +54,56 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
     result = crud.delete_user(db, user_id=user_id)
     if not result:
         raise HTTPException(status_code=404, detail="User not found")
-    return result
\ No newline at end of file
+    return result
+
+def _export_request(user_id: int, format: str, section: Optional[str], db: Session) -> List[str]:
+    if crud.get_user(db, user_id=user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(export.FORMATS)}")
+    if section is not None and section not in export.SECTIONS:
+        raise HTTPException(status_code=400, detail=f"section must be one of {', '.join(export.SECTIONS)}")
+    if format == "csv":
+        # A CSV file holds one table
+        return [section or "lots"]
+    return [section] if section else list(export.SECTIONS)
+
+
+@router.get("/{user_id}/export")
+def export_user_data(user_id: int, format: str = "csv", section: Optional[str] = None,
+                     db: Session = Depends(get_db)):
+    """Stream the user's lots (with current values) and daily portfolio value history"""
+    sections = _export_request(user_id, format, section, db)
+    filename = f"user-{user_id}-{'-'.join(sections)}.{format}"
+    return StreamingResponse(
+        export.stream_export(user_id, format, sections),
+        media_type=export.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.post("/{user_id}/exports", response_model=schemas.JobRun, status_code=202)
+def create_user_export(user_id: int, format: str = "xlsx", section: Optional[str] = None,
+                       db: Session = Depends(get_db)):
+    """Generate the export in the background; download it from /exports/{run_id} once it succeeds"""
+    sections = _export_request(user_id, format, section, db)
+    run_id = scheduler.trigger("user_export", params={"user_id": user_id, "format": format, "sections": sections})
+    return db.query(JobRun).filter(JobRun.id == run_id).first()
+
+
+@router.get("/{user_id}/exports/{run_id}", response_model=schemas.JobRun)
+def read_user_export(user_id: int, run_id: int, response: Response, db: Session = Depends(get_db)):
+    """The export file once generated; otherwise the run's status (202 while pending)"""
+    run = db.query(JobRun).filter(JobRun.id == run_id, JobRun.job_name == "user_export").first()
+    if run is None or (run.params or {}).get("user_id") != user_id:
+        raise HTTPException(status_code=404, detail="Export not found")
+    if run.status == "succeeded":
+        path = export.export_path(run.id, run.params["format"])
+        if not os.path.exists(path):
+            raise HTTPException(status_code=410, detail="Export has expired")
+        return FileResponse(path, media_type=export.FORMATS[run.params["format"]],
+                            filename=f"user-{user_id}-export-{run.id}.{run.params['format']}")
+    if run.status in ("queued", "running"):
+        response.status_code = 202
+        return run
+    raise HTTPException(status_code=500, detail=run.message or "Export failed")
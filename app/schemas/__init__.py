@@ -2,15 +2,35 @@ from app.schemas.user import User, UserCreate
 from app.schemas.investment import (
     Investment,
     InvestmentCreate,
+    InvestmentByFund,
     DashboardData,
     PerformanceData,
-    FundPerformance
+    FundPerformance,
+    SipPlanCreate,
+    SipPlan
 )
 from app.schemas.fund import (
     MutualFund,
     MutualFundCreate,
+    FundSearchResult,
     SectorAllocation,
     StockAllocation,
     MarketCapAllocation,
-    FundOverlap
+    FundOverlap,
+    NavUpdate,
+    NavAsOfQuery,
+    NavAsOf,
+    RangeFilter,
+    FundScreenRequest,
+    FundScreenItem,
+    FundScreenPage
+)
+from app.schemas.job import Job, JobRun
+from app.schemas.analysis import (
+    SimulatedLot,
+    FundSwitch,
+    Scenario,
+    SimulationRequest,
+    SimulationPoint,
+    ScenarioResult
 )
\ No newline at end of file
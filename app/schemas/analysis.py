@@ -0,0 +1,53 @@
+from pydantic import BaseModel, Field
+from datetime import date
+from typing import List, Optional, Dict
+
+
+class SimulatedLot(BaseModel):
+    fund_id: int
+    investment_date: date
+    amount: float = Field(gt=0)
+
+
+class FundSwitch(BaseModel):
+    """Move a fraction of one fund's holding into another on a date"""
+    switch_date: date
+    from_fund_id: int
+    to_fund_id: int
+    fraction: float = Field(gt=0, le=1)
+
+
+class Scenario(BaseModel):
+    name: str
+    # Start from the user's actual lots (requires user_id on the request)
+    include_portfolio: bool = False
+    lots: List[SimulatedLot] = []
+    switches: List[FundSwitch] = []
+    # fund_id -> weight; invests initial_amount at the start date in these weights
+    target_weights: Optional[Dict[int, float]] = None
+    initial_amount: Optional[float] = Field(default=None, gt=0)
+    # Rebalance back to target_weights: "monthly", "quarterly" or "yearly"
+    rebalance: Optional[str] = None
+
+
+class SimulationRequest(BaseModel):
+    user_id: Optional[int] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    # Series are downsampled to at most this many points (the last point is always kept)
+    max_points: int = Field(default=366, ge=2)
+    scenarios: List[Scenario] = Field(min_length=1, max_length=100)
+
+
+class SimulationPoint(BaseModel):
+    date: date
+    value: float
+
+
+class ScenarioResult(BaseModel):
+    name: str
+    invested: float
+    final_value: float
+    return_percentage: float
+    max_drawdown_percentage: float
+    series: List[SimulationPoint]
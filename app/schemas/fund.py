@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from datetime import datetime
+from pydantic import BaseModel, Field
+from datetime import date, datetime
 from typing import List, Optional, Dict, Any
 
 
@@ -23,6 +23,16 @@ class MutualFund(MutualFundBase):
         orm_mode = True
 
 
+class FundSearchResult(BaseModel):
+    id: int
+    name: str
+    fund_type: str
+    isn: str
+    nav: float
+    # Match quality in (0, 1]: ISN, then name prefix, then word, then fuzzy matches
+    score: float
+
+
 class SectorAllocation(BaseModel):
     sector: str
     amount: float
@@ -48,4 +58,65 @@ class FundOverlap(BaseModel):
     overlapping_stocks: int
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+
+class NavUpdate(BaseModel):
+    fund_id: int
+    nav: float
+    nav_date: date
+
+
+class NavAsOfQuery(BaseModel):
+    fund_id: int
+    as_of: date
+
+
+class NavAsOf(NavAsOfQuery):
+    # None when the fund has no NAV on or before as_of
+    nav: Optional[float] = None
+    nav_date: Optional[date] = None
+
+
+class RangeFilter(BaseModel):
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+
+class FundScreenRequest(BaseModel):
+    fund_types: Optional[List[str]] = None
+    nav: Optional[RangeFilter] = None
+    # Return (%) over a period (1M, 3M, 6M, 1Y, 3Y) -> range
+    returns: Dict[str, RangeFilter] = {}
+    # Sector -> exposure (%) range; a fund without the sector has 0% exposure
+    sectors: Dict[str, RangeFilter] = {}
+    # Market-cap bucket (Large Cap, Mid Cap, Small Cap) -> share (%) range
+    market_cap: Dict[str, RangeFilter] = {}
+    # Highest overlap (%) with any fund held by this user; funds the user holds count as 100
+    overlap_user_id: Optional[int] = None
+    overlap: Optional[RangeFilter] = None
+    # name, nav, fund_type, overlap or return_<period>, e.g. return_1Y
+    sort_by: str = "name"
+    descending: bool = False
+    limit: int = Field(default=50, ge=1, le=500)
+    # next_cursor of the previous page
+    cursor: Optional[str] = None
+
+
+class FundScreenItem(BaseModel):
+    id: int
+    name: str
+    fund_type: str
+    isn: str
+    nav: float
+    # None where the fund has no NAV history that far back
+    returns: Dict[str, Optional[float]]
+    overlap: Optional[float] = None
+
+
+class FundScreenPage(BaseModel):
+    items: List[FundScreenItem]
+    # Funds matching the filters, across all pages
+    total: int
+    # None on the last page
+    next_cursor: Optional[str] = None
@@ -7,17 +7,20 @@ class InvestmentBase(BaseModel):
     fund_id: int
     investment_date: date
     amount: float
-    nav_at_investment: float
 
 
 class InvestmentCreate(InvestmentBase):
     user_id: int
+    # Omitted: the fund's NAV on investment_date (or the last one before it) is used
+    nav_at_investment: Optional[float] = None
 
 
 class Investment(InvestmentBase):
     id: int
+    nav_at_investment: float
     user_id: int
     units: float
+    sip_plan_id: Optional[int] = None
     fund_name: Optional[str] = None
     current_value: Optional[float] = None
     return_percentage: Optional[float] = None
@@ -27,6 +30,21 @@ class Investment(InvestmentBase):
         orm_mode = True
 
 
+class InvestmentByFund(BaseModel):
+    """A user's lots in one fund, aggregated"""
+    fund_id: int
+    fund_name: str
+    fund_type: str
+    units: float
+    invested: float
+    avg_nav: float
+    current_nav: float
+    current_value: float
+    return_percentage: float
+    first_investment_date: date
+    last_investment_date: date
+
+
 class PerformanceData(BaseModel):
     date: str
     value: float
@@ -49,4 +67,26 @@ class DashboardData(BaseModel):
     fund_overlap: List[Dict[str, Any]]
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class SipPlanBase(BaseModel):
+    fund_id: int
+    amount: float
+    # monthly, quarterly, half_yearly or yearly
+    frequency: str = "monthly"
+    start_date: date
+    end_date: Optional[date] = None
+
+
+class SipPlanCreate(SipPlanBase):
+    user_id: int
+
+
+class SipPlan(SipPlanBase):
+    id: int
+    user_id: int
+    materialized_through: Optional[date] = None
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
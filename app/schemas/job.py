@@ -0,0 +1,27 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+
+class JobRun(BaseModel):
+    id: int
+    job_name: str
+    trigger: str
+    status: str
+    params: Optional[Dict[str, Any]] = None
+    progress: float
+    message: Optional[str] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    duration_ms: Optional[float] = None
+    created_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+
+class Job(BaseModel):
+    name: str
+    schedule: Optional[str] = None
+    next_run: Optional[datetime] = None
+    last_run: Optional[JobRun] = None
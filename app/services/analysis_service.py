@@ -1,2 +1,25 @@
-# In a more complex application, this file would contain analysis-related business logic
-# For now, the necessary functionality is in the CRUD layer
\ No newline at end of file
+# Batch analytics that run as background jobs rather than inside request handlers
+from app import crud
+from app.services.jobs import JobContext, scheduler
+
+# Fund pairs whose overlaps are computed together (one holdings query, one pool task)
+OVERLAP_BATCH = 500
+
+
+@scheduler.job("recompute_fund_overlaps", schedule="0 2 * * *")
+def recompute_fund_overlaps(ctx: JobContext) -> str:
+    """Refresh fund_overlaps from current holdings for every fund pair some user holds together"""
+    pairs = crud.get_co_held_fund_pairs(ctx.db)
+    for start in range(0, len(pairs), OVERLAP_BATCH):
+        batch = pairs[start:start + OVERLAP_BATCH]
+        crud.upsert_fund_overlaps(ctx.db, crud.compute_fund_overlaps(ctx.db, batch))
+        done = start + len(batch)
+        ctx.report(done / len(pairs), f"{done}/{len(pairs)} fund pairs")
+    return f"Recomputed {len(pairs)} fund overlaps"
+
+
+@scheduler.job("rebuild_portfolio_values", schedule="30 1 * * *")
+def rebuild_portfolio_values(ctx: JobContext) -> str:
+    """Recompute user_portfolio_values from lots, correcting drift from incremental NAV updates"""
+    rows = crud.rebuild_portfolio_values(ctx.db)
+    return f"Rebuilt {rows} portfolio values"
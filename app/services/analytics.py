@@ -0,0 +1,172 @@
+"""
+Pure analytics kernels.
+
+Everything here takes and returns plain picklable values (lists, tuples, dicts
+of numbers and strings) and never touches the database, so the crud layer can
+run these in the compute process pool as easily as inline.
+"""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Pairs evaluated per vectorized block in overlap_matrix, bounding its memory use
+OVERLAP_PAIR_BLOCK = 1024
+
+
+def weighted_sector_allocation(fund_values: Dict[int, float],
+                               sector_rows: Sequence[Tuple[int, str, float]]) -> List[Dict]:
+    """
+    Portfolio sector breakdown from each fund's current value and its
+    (fund_id, sector, percentage) allocation rows, largest sector first.
+    """
+    total_value = sum(fund_values.values())
+    if not total_value or not sector_rows:
+        return []
+
+    fund_ids, sectors, percentages = zip(*sector_rows)
+    values = np.fromiter((fund_values.get(fund_id, 0.0) for fund_id in fund_ids), dtype=np.float64,
+                         count=len(fund_ids))
+    names, codes = np.unique(np.array(sectors, dtype=object), return_inverse=True)
+    amounts = np.bincount(codes, weights=values * np.asarray(percentages, dtype=np.float64) / 100,
+                          minlength=len(names))
+
+    result = [
+        {
+            "sector": str(sector),
+            "amount": round(float(amount), 2),
+            "percentage": round(float(amount / total_value * 100), 2)
+        }
+        for sector, amount in zip(names, amounts)
+    ]
+    result.sort(key=lambda x: x["amount"], reverse=True)
+    return result
+
+
+def overlap_matrix(holdings: Sequence[Tuple[int, int, float]],
+                   pairs: Sequence[Tuple[int, int]]) -> List[Tuple[int, int, float, int]]:
+    """
+    Overlap of each fund pair from (fund_id, stock_id, percentage) holdings:
+    the sum of the smaller weight of every stock both funds hold, and the
+    number of such stocks. Returns (fund_id_1, fund_id_2, percentage, stocks).
+    """
+    if not pairs:
+        return []
+    if not holdings:
+        return [(first, second, 0.0, 0) for first, second in pairs]
+
+    fund_ids, stock_ids, percentages = (np.asarray(column) for column in zip(*holdings))
+    funds, fund_rows = np.unique(fund_ids, return_inverse=True)
+    stocks, stock_cols = np.unique(stock_ids, return_inverse=True)
+    weights = np.zeros((len(funds) + 1, len(stocks)), dtype=np.float64)  # last row: funds with no holdings
+    np.add.at(weights, (fund_rows, stock_cols), percentages.astype(np.float64))
+
+    pair_array = np.asarray(pairs, dtype=np.int64)
+    rows = np.searchsorted(funds, pair_array)
+    rows = np.where(funds[np.minimum(rows, len(funds) - 1)] == pair_array, rows, len(funds))
+
+    result = []
+    for start in range(0, len(pair_array), OVERLAP_PAIR_BLOCK):
+        first = weights[rows[start:start + OVERLAP_PAIR_BLOCK, 0]]
+        second = weights[rows[start:start + OVERLAP_PAIR_BLOCK, 1]]
+        overlap = np.minimum(first, second).sum(axis=1)
+        common = ((first > 0) & (second > 0)).sum(axis=1)
+        for (fund1_id, fund2_id), percentage, count in zip(pair_array[start:start + OVERLAP_PAIR_BLOCK].tolist(),
+                                                            overlap.tolist(), common.tolist()):
+            result.append((fund1_id, fund2_id, round(percentage, 2), count))
+    return result
+
+
+def forward_fill(matrix: np.ndarray) -> np.ndarray:
+    """Carry each column's last non-NaN value down over later NaNs (holidays, missing NAVs)"""
+    valid = ~np.isnan(matrix)
+    rows = np.where(valid, np.arange(matrix.shape[0])[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    filled = matrix[rows, np.arange(matrix.shape[1])]
+    # Leading NaNs (before a fund's first NAV) have nothing to carry
+    filled[~np.maximum.accumulate(valid, axis=0)] = np.nan
+    return filled
+
+
+# Event kinds for simulate_portfolios, applied in this order when they share a row
+BUY, SWITCH, REBALANCE = 0, 1, 2
+
+
+def simulate_portfolios(navs: np.ndarray,
+                        scenarios: Sequence[Sequence[Tuple]]) -> Tuple[List[List[float]], List[float]]:
+    """
+    Value series of hypothetical portfolios over a date-aligned, forward-filled
+    NAV matrix (dates x funds). Each scenario is a list of events:
+
+    * (BUY, row, col, amount, units): buy amount of fund col at row; units may
+      be NaN to derive them from the NAV on that row
+    * (SWITCH, row, from_col, to_col, fraction): move a fraction of from_col's
+      holding into to_col at that row's NAVs
+    * (REBALANCE, row, weights): reset holdings to the weights (length funds,
+      summing to 1) of the portfolio's value at that row
+
+    Events only produce unit deltas on their rows; the series for all scenarios
+    is then one cumulative sum and one multiply against the NAV matrix.
+    Returns (values per scenario per row, amount invested per scenario).
+    """
+    dates, funds = navs.shape
+    priced = np.nan_to_num(navs)
+    deltas = np.zeros((len(scenarios), dates, funds), dtype=np.float64)
+    invested = []
+
+    for index, events in enumerate(scenarios):
+        held = np.zeros(funds, dtype=np.float64)
+        total = 0.0
+        for event in sorted(events, key=lambda event: (event[1], event[0])):
+            kind, row = event[0], event[1]
+            change = np.zeros(funds, dtype=np.float64)
+            if kind == BUY:
+                _, _, col, amount, units = event
+                change[col] = units if not np.isnan(units) else amount / navs[row, col]
+                total += amount
+            elif kind == SWITCH:
+                _, _, from_col, to_col, fraction = event
+                sold = held[from_col] * fraction
+                change[from_col] = -sold
+                change[to_col] = sold * navs[row, from_col] / navs[row, to_col]
+            else:
+                weights = np.asarray(event[2], dtype=np.float64)
+                value = float(held @ priced[row])
+                target = np.divide(value * weights, navs[row], out=np.zeros(funds), where=weights > 0)
+                change = target - held
+            held += change
+            deltas[index, row] += change
+        invested.append(total)
+
+    units = np.cumsum(deltas, axis=1)
+    values = np.einsum("sdf,df->sd", units, priced)
+    return values.round(2).tolist(), invested
+
+
+def sip_schedule(start_days: np.ndarray, end_days: np.ndarray,
+                 step_months: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Instalment dates of many SIP plans at once. Plan i pays on start_days[i]'s
+    day of the month (the last day in shorter months) every step_months[i]
+    months, up to and including end_days[i].
+
+    Returns (plan index, instalment date) arrays, grouped by plan and ascending
+    within each plan.
+    """
+    start = np.asarray(start_days, dtype="datetime64[D]")
+    end = np.asarray(end_days, dtype="datetime64[D]")
+    step = np.asarray(step_months, dtype=np.int64)
+    start_month = start.astype("datetime64[M]")
+    day = (start - start_month.astype("datetime64[D]")).astype(np.int64)
+    months = (end.astype("datetime64[M]") - start_month).astype(np.int64)
+    counts = np.where(end >= start, months // step + 1, 0)
+
+    plan = np.repeat(np.arange(len(start)), counts)
+    # Position of each instalment within its plan: 0, 1, 2, ... restarting per plan
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    month = start_month[plan] + offsets * step[plan]
+    first_day = month.astype("datetime64[D]")
+    month_length = ((month + 1).astype("datetime64[D]") - first_day).astype(np.int64)
+    dates = first_day + np.minimum(day[plan], month_length - 1)
+    # The last month's instalment can fall after end_days
+    keep = dates <= end[plan]
+    return plan[keep], dates[keep]
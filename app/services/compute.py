@@ -0,0 +1,115 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Optional
+
+from app.config import settings
+from app.metrics import COMPUTE_PENDING, COMPUTE_TASKS
+
+logger = logging.getLogger("app.compute")
+
+
+class ComputePoolBusy(Exception):
+    """Raised instead of queueing when the pool already has max_pending tasks"""
+
+
+class ComputeTimeout(Exception):
+    """Raised when an offloaded task does not finish within its timeout"""
+
+
+def _warm_worker():
+    # Pay the import cost once per worker instead of on the first offloaded task
+    import numpy  # noqa: F401
+    import app.services.analytics  # noqa: F401
+
+
+def _ping() -> bool:
+    return True
+
+
+class ComputePool:
+    """
+    Shared process pool for CPU-bound analytics, so heavy NumPy or pure-Python
+    loops do not hold the GIL in the uvicorn worker and starve cheap requests.
+
+    Tasks must be module-level functions with picklable arguments and results
+    (see app.services.analytics). Work smaller than min_rows, or any work while
+    the pool is not started, runs inline: for small inputs the pickling round
+    trip costs more than the computation. At most max_pending tasks may be queued
+    or running; beyond that run() raises ComputePoolBusy rather than letting the
+    queue grow without bound.
+    """
+
+    def __init__(self, workers: int = settings.COMPUTE_WORKERS, max_pending: int = settings.COMPUTE_MAX_PENDING,
+                 timeout_seconds: float = settings.COMPUTE_TIMEOUT_SECONDS,
+                 min_rows: int = settings.COMPUTE_OFFLOAD_MIN_ROWS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout_seconds = timeout_seconds
+        self.min_rows = min_rows
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(max(max_pending, 1))
+
+    @property
+    def started(self) -> bool:
+        return self._executor is not None
+
+    def start(self):
+        """Start the workers and wait until each has imported the analytics kernels"""
+        if self._executor is not None or self.workers <= 0:
+            return
+        # spawn rather than fork: the parent holds DB connections and threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_worker,
+        )
+        for future in [self._executor.submit(_ping) for _ in range(self.workers)]:
+            future.result()
+        logger.info("Compute pool started with %d workers", self.workers)
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+    def _release(self, future: Future):
+        self._slots.release()
+        COMPUTE_PENDING.dec()
+
+    def run(self, func: Callable, *args, rows: Optional[int] = None, timeout: Optional[float] = None) -> Any:
+        """
+        Run func(*args) in the pool and return its result, blocking the calling
+        thread. rows is the size of the input, used to keep small work inline.
+        """
+        name = func.__name__
+        if self._executor is None or (rows is not None and rows < self.min_rows):
+            COMPUTE_TASKS.labels(name, "inline").inc()
+            return func(*args)
+
+        if not self._slots.acquire(blocking=False):
+            COMPUTE_TASKS.labels(name, "rejected").inc()
+            raise ComputePoolBusy(f"Compute pool has {self.max_pending} tasks pending")
+        COMPUTE_PENDING.inc()
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._slots.release()
+            COMPUTE_PENDING.dec()
+            raise
+        # The slot is held until the worker finishes, even past a timeout, so
+        # abandoned tasks still count against the queue limit.
+        future.add_done_callback(self._release)
+
+        try:
+            result = future.result(timeout=timeout if timeout is not None else self.timeout_seconds)
+        except FutureTimeoutError:
+            future.cancel()
+            COMPUTE_TASKS.labels(name, "timeout").inc()
+            raise ComputeTimeout(f"{name} did not finish within its timeout")
+        COMPUTE_TASKS.labels(name, "ok").inc()
+        return result
+
+
+compute_pool = ComputePool()
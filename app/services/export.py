@@ -0,0 +1,216 @@
+import csv
+import io
+import math
+import os
+import time
+import zipfile
+from datetime import date
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.config import settings
+from app.database import ReadSessionLocal
+from app.services.jobs import JobContext, scheduler
+
+FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Section name -> (column headers, crud row generator taking (db, user_id, batch_size))
+SECTIONS: Dict[str, Tuple[List[str], Callable[..., Iterator[Tuple]]]] = {
+    "lots": ([
+        "investment_id", "fund_id", "fund_name", "investment_date", "amount", "nav_at_investment",
+        "units", "current_nav", "current_value", "return_percentage",
+    ], crud.iter_investment_lots),
+    "history": (["date", "portfolio_value"], crud.iter_portfolio_value_series),
+}
+
+# Rows written between yields of the streaming writers
+FLUSH_ROWS = 500
+
+
+def stream_csv(header: Sequence[str], rows: Iterable[Sequence]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % FLUSH_ROWS == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Unseekable file that collects what zipfile writes until drained"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '{sheets}</Types>'
+)
+_SHEET_CONTENT_TYPE = (
+    '<Override PartName="/xl/worksheets/sheet{index}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{sheets}</sheets></workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '{sheets}</Relationships>'
+)
+_SHEET_RELATIONSHIP = (
+    '<Relationship Id="rId{index}" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet{index}.xml"/>'
+)
+_SHEET_HEAD = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_TAIL = b'</sheetData></worksheet>'
+
+
+def _xlsx_cell(value) -> str:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if isinstance(value, float) and not math.isfinite(value):
+            # NaN and inf have no xlsx number form (Excel rejects the file): leave the cell blank
+            return '<c/>'
+        return f'<c><v>{value!r}</v></c>'
+    if value is None:
+        return '<c/>'
+    text = value.isoformat() if isinstance(value, date) else str(value)
+    return f'<c t="inlineStr"><is><t>{escape(text)}</t></is></c>'
+
+
+def stream_xlsx(sheets: Sequence[Tuple[str, Sequence[str], Iterable[Sequence]]]) -> Iterator[bytes]:
+    """
+    Write an XLSX workbook (one worksheet per (name, header, rows)) as it is
+    zipped, without holding the rows or the archive in memory. Strings are
+    written inline and dates as ISO text, so no shared-strings or styles parts
+    are needed. Non-finite floats are written as blank cells.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        indexes = range(1, len(sheets) + 1)
+        archive.writestr("[Content_Types].xml", _CONTENT_TYPES.format(
+            sheets="".join(_SHEET_CONTENT_TYPE.format(index=index) for index in indexes)))
+        archive.writestr("_rels/.rels", _ROOT_RELS)
+        archive.writestr("xl/workbook.xml", _WORKBOOK.format(sheets="".join(
+            f'<sheet name="{escape(name)}" sheetId="{index}" r:id="rId{index}"/>'
+            for index, (name, _, _) in zip(indexes, sheets))))
+        archive.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS.format(
+            sheets="".join(_SHEET_RELATIONSHIP.format(index=index) for index in indexes)))
+        yield sink.drain()
+
+        for index, (_, header, rows) in zip(indexes, sheets):
+            with archive.open(f"xl/worksheets/sheet{index}.xml", "w", force_zip64=True) as sheet:
+                sheet.write(_SHEET_HEAD)
+                sheet.write(("<row>" + "".join(map(_xlsx_cell, header)) + "</row>").encode())
+                for count, row in enumerate(rows, start=1):
+                    sheet.write(("<row>" + "".join(map(_xlsx_cell, row)) + "</row>").encode())
+                    if count % FLUSH_ROWS == 0:
+                        yield sink.drain()
+                sheet.write(_SHEET_TAIL)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def write_export(db: Session, user_id: int, export_format: str, sections: Sequence[str],
+                 on_section: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """Export chunks for a user's sections; CSV takes exactly one section"""
+    def rows(name: str, position: int) -> Iterator[Tuple]:
+        # A generator, so the query only runs once the writer reaches this section
+        if on_section is not None:
+            on_section(position)
+        yield from SECTIONS[name][1](db, user_id, batch_size=settings.EXPORT_BATCH_SIZE)
+
+    if export_format == "csv":
+        (section,) = sections
+        return stream_csv(SECTIONS[section][0], rows(section, 0))
+    return stream_xlsx([(name, SECTIONS[name][0], rows(name, position))
+                        for position, name in enumerate(sections)])
+
+
+def stream_export(user_id: int, export_format: str, sections: Sequence[str]) -> Iterator[bytes]:
+    """
+    Response body generator with its own session: request-scoped sessions are
+    closed once the endpoint returns, before a streamed body has been sent.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield from write_export(db, user_id, export_format, sections)
+    finally:
+        db.close()
+
+
+def export_path(run_id: int, export_format: str) -> str:
+    return os.path.join(settings.EXPORT_DIR, f"export-{run_id}.{export_format}")
+
+
+@scheduler.job("user_export", exclusive=False)
+def generate_user_export(ctx: JobContext) -> str:
+    """Write a user's export to EXPORT_DIR for download once the run succeeds"""
+    user_id, export_format = ctx.params["user_id"], ctx.params["format"]
+    sections = ctx.params["sections"]
+    os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+    path = export_path(ctx.run_id, export_format)
+
+    def on_section(position: int):
+        ctx.report(position / len(sections), f"Writing {sections[position]}")
+
+    with open(path + ".part", "wb") as fh:
+        for chunk in write_export(ctx.db, user_id, export_format, sections, on_section):
+            fh.write(chunk)
+    os.replace(path + ".part", path)
+    return os.path.basename(path)
+
+
+@scheduler.job("prune_exports", schedule="15 * * * *")
+def prune_exports(ctx: JobContext) -> str:
+    """Delete export files older than EXPORT_RETENTION_HOURS"""
+    if not os.path.isdir(settings.EXPORT_DIR):
+        return "No exports"
+    cutoff = time.time() - settings.EXPORT_RETENTION_HOURS * 3600
+    removed = 0
+    for entry in os.scandir(settings.EXPORT_DIR):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+            removed += 1
+    return f"Removed {removed} export files"
@@ -0,0 +1,149 @@
+import threading
+import time
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.metrics import record_cache_access
+from app.models.fund import FundCatalogVersion, MutualFund
+
+# How often a worker re-checks the catalog version, to pick up writes made by other workers
+VERSION_CHECK_SECONDS = 5.0
+
+
+class FundMeta(NamedTuple):
+    id: int
+    name: str
+    fund_type: str
+    isn: str
+    nav: float
+
+
+class FundMetadataCache:
+    """
+    In-process copy of the fund catalog (id, name, fund_type, isn, current NAV).
+
+    Loaded in one query and kept current by the crud write hooks in this process
+    plus a periodic check of the catalog version counter, which every fund write
+    bumps in its transaction, for writes made elsewhere.
+    Lookups swap whole dictionaries rather than mutating shared ones, so readers never
+    need the lock.
+    """
+
+    def __init__(self, version_check_seconds: float = VERSION_CHECK_SECONDS):
+        self.version_check_seconds = version_check_seconds
+        self._by_id: Dict[int, FundMeta] = {}
+        self._by_isn: Dict[str, FundMeta] = {}
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _catalog_version(db: Session) -> Optional[int]:
+        return db.execute(select(FundCatalogVersion.version).where(FundCatalogVersion.id == 1)).scalar()
+
+    def load(self, db: Session):
+        with self._lock:
+            version = self._catalog_version(db)
+            rows = db.execute(select(
+                MutualFund.id, MutualFund.name, MutualFund.fund_type, MutualFund.isn, MutualFund.nav
+            )).all()
+            by_id = {row.id: FundMeta(*row) for row in rows}
+            self._by_id = by_id
+            self._by_isn = {meta.isn: meta for meta in by_id.values()}
+            self._version = version
+            self._checked_at = time.monotonic()
+            self._loaded = True
+
+    def ensure_fresh(self, db: Session):
+        if not self._loaded:
+            self.load(db)
+            return
+        if time.monotonic() - self._checked_at < self.version_check_seconds:
+            return
+        self._checked_at = time.monotonic()
+        if self._catalog_version(db) != self._version:
+            self.load(db)
+
+    def invalidate(self):
+        self._loaded = False
+
+    def _load_missing(self, db: Session, condition) -> Dict[int, FundMeta]:
+        """Fetch funds created by another worker since our last version check"""
+        rows = db.execute(select(
+            MutualFund.id, MutualFund.name, MutualFund.fund_type, MutualFund.isn, MutualFund.nav
+        ).where(condition)).all()
+        found = {}
+        for row in rows:
+            found[row.id] = FundMeta(*row)
+            self.upsert(found[row.id])
+        return found
+
+    def get(self, db: Session, fund_id: int) -> Optional[FundMeta]:
+        self.ensure_fresh(db)
+        meta = self._by_id.get(fund_id)
+        record_cache_access("fund_metadata", meta is not None)
+        if meta is None:
+            meta = self._load_missing(db, MutualFund.id == fund_id).get(fund_id)
+        return meta
+
+    def get_by_isn(self, db: Session, isn: str) -> Optional[FundMeta]:
+        self.ensure_fresh(db)
+        meta = self._by_isn.get(isn)
+        record_cache_access("fund_metadata", meta is not None)
+        if meta is None:
+            meta = next(iter(self._load_missing(db, MutualFund.isn == isn).values()), None)
+        return meta
+
+    def get_many(self, db: Session, fund_ids: Iterable[int]) -> Dict[int, FundMeta]:
+        self.ensure_fresh(db)
+        by_id = self._by_id
+        found = {}
+        missing = []
+        for fund_id in fund_ids:
+            meta = by_id.get(fund_id)
+            if meta is not None:
+                found[fund_id] = meta
+            else:
+                missing.append(fund_id)
+            record_cache_access("fund_metadata", meta is not None)
+        if missing:
+            found.update(self._load_missing(db, MutualFund.id.in_(missing)))
+        return found
+
+    def catalog(self, db: Session) -> Dict[int, FundMeta]:
+        """The whole catalog by id. Writes swap in a new dict, so identity changes mean contents changed"""
+        self.ensure_fresh(db)
+        return self._by_id
+
+    def name(self, db: Session, fund_id: int, default: str = "Unknown") -> str:
+        meta = self.get(db, fund_id)
+        return meta.name if meta else default
+
+    def upsert(self, fund):
+        """Write hook: reflect a created or updated fund without reloading the catalog"""
+        meta = FundMeta(fund.id, fund.name, fund.fund_type, fund.isn, fund.nav)
+        with self._lock:
+            by_id = dict(self._by_id)
+            by_isn = dict(self._by_isn)
+            previous = by_id.get(fund.id)
+            if previous is not None and previous.isn != meta.isn:
+                by_isn.pop(previous.isn, None)
+            by_id[meta.id] = meta
+            by_isn[meta.isn] = meta
+            self._by_id, self._by_isn = by_id, by_isn
+
+    def remove(self, fund_id: int):
+        with self._lock:
+            by_id = dict(self._by_id)
+            meta = by_id.pop(fund_id, None)
+            if meta is None:
+                return
+            by_isn = dict(self._by_isn)
+            by_isn.pop(meta.isn, None)
+            self._by_id, self._by_isn = by_id, by_isn
+
+
+fund_cache = FundMetadataCache()
@@ -0,0 +1,263 @@
+import threading
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.fund import FundMarketCapAllocation, FundSectorAllocation, HistoricalNAV
+from app.projection import decode_cursor, encode_cursor
+from app.services.fund_cache import FundMeta, fund_cache
+
+# Return periods in days, as in the performance charts
+RETURN_PERIODS = {"1M": 30, "3M": 90, "6M": 180, "1Y": 365, "3Y": 1095}
+# Days before a period's start searched for its opening NAV (weekends, holidays)
+NAV_LOOKBACK_DAYS = 7
+CAP_TYPES = ["Large Cap", "Mid Cap", "Small Cap"]
+SORT_KEYS = {"name", "nav", "fund_type", "overlap"} | {f"return_{period}" for period in RETURN_PERIODS}
+
+
+class _Composition(NamedTuple):
+    """Slow-moving per-fund data, as (fund_ids, ...) row arrays"""
+    opening_navs: Dict[str, Tuple[np.ndarray, np.ndarray]]  # period -> (fund_ids, nav at period start)
+    sectors: List[str]
+    sector_rows: Tuple[np.ndarray, np.ndarray, np.ndarray]  # fund_ids, sector index, percentage
+    cap_rows: Tuple[np.ndarray, np.ndarray, np.ndarray]  # fund_ids, CAP_TYPES index, percentage
+    loaded_at: float
+
+
+def _rows(db: Session, statement) -> List[np.ndarray]:
+    rows = db.execute(statement).all()
+    return [np.array(column) for column in zip(*rows)] if rows else []
+
+
+def _load_composition(db: Session, today: date) -> _Composition:
+    opening_navs = {}
+    for period, days in RETURN_PERIODS.items():
+        start = today - timedelta(days=days)
+        # Range scan on ix_historical_nav_date_fund; the last NAV per fund in the window wins
+        columns = _rows(db, select(HistoricalNAV.fund_id, HistoricalNAV.nav).where(
+            HistoricalNAV.date > start - timedelta(days=NAV_LOOKBACK_DAYS),
+            HistoricalNAV.date <= start
+        ).order_by(HistoricalNAV.fund_id, HistoricalNAV.date))
+        if not columns:
+            opening_navs[period] = (np.array([], dtype=np.int64), np.array([]))
+            continue
+        fund_ids, navs = columns
+        last = np.r_[fund_ids[1:] != fund_ids[:-1], True]
+        opening_navs[period] = (fund_ids[last].astype(np.int64), navs[last].astype(float))
+
+    empty = (np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([]))
+    columns = _rows(db, select(
+        FundSectorAllocation.fund_id, FundSectorAllocation.sector, FundSectorAllocation.percentage
+    ))
+    sectors: List[str] = []
+    sector_rows = empty
+    if columns:
+        fund_ids, names, percentages = columns
+        sectors, codes = np.unique(names.astype(str), return_inverse=True)
+        sectors = sectors.tolist()
+        sector_rows = (fund_ids.astype(np.int64), codes, percentages.astype(float))
+
+    columns = _rows(db, select(
+        FundMarketCapAllocation.fund_id, FundMarketCapAllocation.cap_type, FundMarketCapAllocation.percentage
+    ))
+    cap_rows = empty
+    if columns:
+        fund_ids, cap_types, percentages = columns
+        known = np.isin(cap_types, CAP_TYPES)
+        codes = np.array([CAP_TYPES.index(cap_type) for cap_type in cap_types[known]], dtype=np.int64)
+        cap_rows = (fund_ids[known].astype(np.int64), codes, percentages[known].astype(float))
+
+    return _Composition(opening_navs, sectors, sector_rows, cap_rows, time.monotonic())
+
+
+class _Snapshot:
+    """Column arrays over one catalog version and one composition load, one row per fund, by id"""
+
+    def __init__(self, funds: Dict[int, FundMeta], composition: _Composition):
+        self.funds = funds
+        self.composition = composition
+        self.metas = [funds[fund_id] for fund_id in sorted(funds)]
+        self.ids = np.array([meta.id for meta in self.metas], dtype=np.int64)
+        self.navs = np.array([meta.nav for meta in self.metas], dtype=float)
+        self.names = np.array([meta.name.lower() for meta in self.metas], dtype=str)
+        self.fund_types = np.array([meta.fund_type for meta in self.metas], dtype=str)
+
+        self.returns = {}
+        for period, (fund_ids, opening) in composition.opening_navs.items():
+            values = np.full(len(self.ids), np.nan)
+            positions, found = self._positions(fund_ids)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values[positions] = (self.navs[positions] / opening[found] - 1) * 100
+            self.returns[period] = values
+        self.sector_index = {sector: index for index, sector in enumerate(composition.sectors)}
+        self.sector_exposure = self._matrix(composition.sector_rows, len(composition.sectors))
+        self.cap_mix = self._matrix(composition.cap_rows, len(CAP_TYPES))
+
+    def _positions(self, fund_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Row positions of the given funds, and a mask of those present in the catalog"""
+        positions = np.searchsorted(self.ids, fund_ids)
+        found = positions < len(self.ids)
+        found[found] = self.ids[positions[found]] == fund_ids[found]
+        return positions[found], found
+
+    def _matrix(self, rows: Tuple[np.ndarray, np.ndarray, np.ndarray], width: int) -> np.ndarray:
+        fund_ids, columns, percentages = rows
+        matrix = np.zeros((len(self.ids), width))
+        positions, found = self._positions(fund_ids)
+        np.add.at(matrix, (positions, columns[found]), percentages[found])
+        return matrix
+
+    def overlap(self, overlaps: Dict[int, float]) -> np.ndarray:
+        values = np.zeros(len(self.ids))
+        if overlaps:
+            positions, found = self._positions(np.array(list(overlaps), dtype=np.int64))
+            values[positions] = np.array(list(overlaps.values()))[found]
+        return values
+
+
+def _in_range(values: np.ndarray, bounds) -> np.ndarray:
+    mask = np.ones(len(values), dtype=bool)
+    if bounds is None:
+        return mask
+    # NaN fails both comparisons, so funds without a value never pass a bound
+    if bounds.min is not None:
+        mask &= values >= bounds.min
+    if bounds.max is not None:
+        mask &= values <= bounds.max
+    return mask
+
+
+class FundScreener:
+    """
+    Multi-criteria fund screen evaluated as boolean masks over per-fund column
+    arrays: fund type, NAV, returns per period, sector exposure, market-cap mix
+    and overlap with a user's portfolio.
+
+    Catalog columns follow the fund metadata cache (rebuilt when its dict is
+    swapped by a write or reload). Returns' opening NAVs and the sector and
+    market-cap mixes change at most daily; they are loaded in a few range
+    queries and kept for ttl_seconds. Results are ordered by the sort column
+    then id and paged with a keyset cursor on that pair, so a page costs the
+    same however deep it is and stays stable while funds are added.
+    """
+
+    def __init__(self, ttl_seconds: float = settings.FUND_SCREEN_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._composition: Optional[_Composition] = None
+        self._snapshot: Optional[_Snapshot] = None
+        self._lock = threading.Lock()
+
+    def load(self, db: Session) -> _Composition:
+        composition = _load_composition(db, date.today())
+        with self._lock:
+            self._composition = composition
+        return composition
+
+    def invalidate(self):
+        with self._lock:
+            self._composition = None
+            self._snapshot = None
+
+    def _current(self, db: Session) -> _Snapshot:
+        composition = self._composition
+        if composition is None or time.monotonic() - composition.loaded_at >= self.ttl_seconds:
+            composition = self.load(db)
+        funds = fund_cache.catalog(db)
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.funds is not funds or snapshot.composition is not composition:
+                snapshot = self._snapshot = _Snapshot(funds, composition)
+        return snapshot
+
+    def screen(self, db: Session, request, overlaps: Optional[Dict[int, float]] = None
+               ) -> Tuple[List[Dict[str, Any]], int, Optional[str]]:
+        """
+        (items, total, next_cursor) for a FundScreenRequest. overlaps maps fund
+        id to its overlap with the request's user, when the request involves one.
+        Raises ValueError for unknown periods, market-cap buckets, sort keys or cursors.
+        """
+        if request.sort_by not in SORT_KEYS:
+            raise ValueError(f"sort_by must be one of {', '.join(sorted(SORT_KEYS))}")
+        for period in request.returns:
+            if period not in RETURN_PERIODS:
+                raise ValueError(f"Unknown return period {period}")
+        for cap_type in request.market_cap:
+            if cap_type not in CAP_TYPES:
+                raise ValueError(f"Unknown market cap {cap_type}")
+        if (request.overlap is not None or request.sort_by == "overlap") and overlaps is None:
+            raise ValueError("Overlap filters and sorting need overlap_user_id")
+
+        snapshot = self._current(db)
+        mask = _in_range(snapshot.navs, request.nav)
+        if request.fund_types:
+            mask &= np.isin(snapshot.fund_types, request.fund_types)
+        for period, bounds in request.returns.items():
+            mask &= _in_range(snapshot.returns[period], bounds)
+        for sector, bounds in request.sectors.items():
+            index = snapshot.sector_index.get(sector)
+            exposure = snapshot.sector_exposure[:, index] if index is not None else np.zeros(len(snapshot.ids))
+            mask &= _in_range(exposure, bounds)
+        for cap_type, bounds in request.market_cap.items():
+            mask &= _in_range(snapshot.cap_mix[:, CAP_TYPES.index(cap_type)], bounds)
+        overlap = snapshot.overlap(overlaps) if overlaps is not None else None
+        if request.overlap is not None:
+            mask &= _in_range(overlap, request.overlap)
+
+        if request.sort_by == "name":
+            sort_values = snapshot.names
+        elif request.sort_by == "fund_type":
+            sort_values = snapshot.fund_types
+        elif request.sort_by == "nav":
+            sort_values = snapshot.navs
+        elif request.sort_by == "overlap":
+            sort_values = overlap
+        else:
+            sort_values = snapshot.returns[request.sort_by[len("return_"):]]
+            # Funds without the return cannot be placed in its order
+            mask &= ~np.isnan(sort_values)
+        total = int(np.count_nonzero(mask))
+
+        if request.cursor:
+            value, fund_id = decode_cursor(request.cursor, request.sort_by, request.descending)
+            if isinstance(value, str) != (sort_values.dtype.kind == "U"):
+                raise ValueError("Invalid cursor")
+            if request.descending:
+                mask &= (sort_values < value) | ((sort_values == value) & (snapshot.ids < fund_id))
+            else:
+                mask &= (sort_values > value) | ((sort_values == value) & (snapshot.ids > fund_id))
+
+        positions = np.flatnonzero(mask)
+        order = np.lexsort((snapshot.ids[positions], sort_values[positions]))
+        if request.descending:
+            order = order[::-1]
+        page = positions[order[:request.limit + 1]]
+        next_cursor = None
+        if len(page) > request.limit:
+            page = page[:request.limit]
+            last = page[-1]
+            next_cursor = encode_cursor(request.sort_by, request.descending,
+                                        sort_values[last].item(), int(snapshot.ids[last]))
+
+        items = []
+        for position in page:
+            meta = snapshot.metas[position]
+            returns = {period: values[position] for period, values in snapshot.returns.items()}
+            items.append({
+                "id": meta.id,
+                "name": meta.name,
+                "fund_type": meta.fund_type,
+                "isn": meta.isn,
+                "nav": meta.nav,
+                "returns": {period: None if np.isnan(value) else round(float(value), 4)
+                            for period, value in returns.items()},
+                "overlap": None if overlap is None else float(overlap[position]),
+            })
+        return items, total, next_cursor
+
+
+fund_screener = FundScreener()
@@ -0,0 +1,175 @@
+import bisect
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.services.fund_cache import FundMeta, fund_cache
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Fields a token can come from; a term matching several counts for the best (lowest) one
+NAME, FUND_TYPE, ISN, NO_MATCH = 0, 1, 2, 3
+
+# Match tiers, best first. Within the name tiers a fund whose name is mostly
+# covered by the query ranks higher; fuzzy matches scale with trigram similarity.
+SCORE_ISN_EXACT = 1.0
+SCORE_ISN_PREFIX = 0.95
+SCORE_NAME_PREFIX = 0.9
+SCORE_NAME_WORDS = 0.8
+SCORE_ANY_WORDS = 0.7
+SCORE_FUZZY = 0.6
+COVERAGE_BONUS = 0.05
+
+# Share of the query's trigrams a name must contain to count as a fuzzy match
+FUZZY_THRESHOLD = 0.5
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def _trigrams(word: str) -> Set[str]:
+    # Padded like pg_trgm, so word starts weigh more than word middles
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _Snapshot:
+    """
+    Immutable index over one version of the catalog. Funds are addressed by
+    position; each distinct token keeps a postings slice of (position, field)
+    in CSR layout, so all tokens sharing a prefix form one contiguous slice.
+    """
+
+    def __init__(self, funds: Dict[int, FundMeta]):
+        self.funds = funds
+        self.metas = list(funds.values())
+        self.names = [" ".join(_words(meta.name)) for meta in self.metas]
+        self.name_lengths = np.array([max(len(name), 1) for name in self.names], dtype=float)
+        # Rank of each fund in name order: tie-break, and funds whose name starts
+        # with a phrase form one contiguous rank range
+        order = sorted(range(len(self.names)), key=self.names.__getitem__)
+        self.sorted_names = [self.names[position] for position in order]
+        self.name_rank = np.empty(len(order), dtype=np.int64)
+        self.name_rank[order] = np.arange(len(order))
+        self.isns = [meta.isn.lower() for meta in self.metas]
+
+        postings: Dict[str, Dict[int, int]] = {}
+        trigrams: Dict[str, List[int]] = {}
+        for position, meta in enumerate(self.metas):
+            name_words = _words(meta.name)
+            # Best field last, so a token in several fields keeps the best one
+            tokens = [(self.isns[position], ISN)] + [(word, FUND_TYPE) for word in _words(meta.fund_type)]
+            tokens += [(word, NAME) for word in name_words]
+            for token, field in tokens:
+                postings.setdefault(token, {})[position] = field
+            for trigram in set().union(*map(_trigrams, name_words)):
+                trigrams.setdefault(trigram, []).append(position)
+
+        self.tokens = sorted(postings)
+        sizes = [len(postings[token]) for token in self.tokens]
+        self.token_starts = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        self.posting_funds = np.fromiter(
+            (position for token in self.tokens for position in postings[token]), dtype=np.int64,
+            count=int(self.token_starts[-1]))
+        self.posting_fields = np.fromiter(
+            (field for token in self.tokens for field in postings[token].values()), dtype=np.int8,
+            count=int(self.token_starts[-1]))
+        self.trigrams = {trigram: np.array(positions, dtype=np.int64) for trigram, positions in trigrams.items()}
+
+    def best_fields(self, term: str) -> np.ndarray:
+        """Per fund, the best field having a token that starts with term (NO_MATCH if none)"""
+        first = bisect.bisect_left(self.tokens, term)
+        last = bisect.bisect_left(self.tokens, term + "\uffff", first)
+        start, end = self.token_starts[first], self.token_starts[last]
+        funds, fields = self.posting_funds[start:end], self.posting_fields[start:end]
+        best = np.full(len(self.metas), NO_MATCH, dtype=np.int8)
+        # Assign worst fields first so the best one wins
+        for field in (ISN, FUND_TYPE, NAME):
+            best[funds[fields == field]] = field
+        return best
+
+    def name_prefix_range(self, phrase: str) -> Tuple[int, int]:
+        first = bisect.bisect_left(self.sorted_names, phrase)
+        return first, bisect.bisect_left(self.sorted_names, phrase + "\uffff", first)
+
+    def fuzzy_similarity(self, terms: List[str]) -> np.ndarray:
+        """Per fund, the share of the query's trigrams found in its name"""
+        query = set().union(*map(_trigrams, terms))
+        postings = [self.trigrams[trigram] for trigram in query if trigram in self.trigrams]
+        if not postings:
+            return np.zeros(len(self.metas))
+        return np.bincount(np.concatenate(postings), minlength=len(self.metas)) / len(query)
+
+
+class FundSearchIndex:
+    """
+    Typeahead search over fund name, ISN and fund type.
+
+    Every query term must be a prefix of some word of the fund. ISN matches rank
+    first, then funds whose name starts with the query, then funds matching all
+    terms in the name, then in any field. When fewer than limit funds match that
+    way, names sharing at least FUZZY_THRESHOLD of the query's trigrams are added
+    as fuzzy matches, which tolerates typos.
+
+    The index is built from the fund metadata cache and rebuilt on the next
+    search after the catalog changes (the cache swaps its dict on every write or
+    reload), so it follows fund writes from this worker and others. Queries are
+    a few bisects and vectorized passes over the fund arrays.
+    """
+
+    def __init__(self):
+        self._snapshot: Optional[_Snapshot] = None
+        self._lock = threading.Lock()
+
+    def _current(self, db: Session) -> _Snapshot:
+        funds = fund_cache.catalog(db)
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.funds is not funds:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.funds is not funds:
+                    snapshot = self._snapshot = _Snapshot(funds)
+        return snapshot
+
+    def search(self, db: Session, query: str, limit: int = 10) -> List[Tuple[FundMeta, float]]:
+        """Best matches first as (fund, score), score in (0, 1]"""
+        terms = _words(query)
+        if not terms or limit <= 0:
+            return []
+        snapshot = self._current(db)
+        if not snapshot.metas:
+            return []
+        phrase = " ".join(terms)
+
+        fields = np.max([snapshot.best_fields(term) for term in terms], axis=0)
+        coverage = COVERAGE_BONUS * np.minimum(len(phrase) / snapshot.name_lengths, 1.0)
+        first, last = snapshot.name_prefix_range(phrase)
+        name_prefix = (snapshot.name_rank >= first) & (snapshot.name_rank < last)
+
+        scores = np.where(fields == NAME, SCORE_NAME_WORDS + coverage, SCORE_ANY_WORDS)
+        scores = np.where(name_prefix, SCORE_NAME_PREFIX + coverage, scores)
+        if len(terms) == 1:
+            scores = np.where(fields == ISN, SCORE_ISN_PREFIX, scores)
+            exact = [position for position in np.flatnonzero(fields == ISN) if snapshot.isns[position] == phrase]
+            scores[exact] = SCORE_ISN_EXACT
+        scores = np.where(fields == NO_MATCH, 0.0, scores)
+
+        if np.count_nonzero(scores) < limit:
+            similarity = snapshot.fuzzy_similarity(terms)
+            fuzzy = (scores == 0) & (similarity >= FUZZY_THRESHOLD)
+            scores[fuzzy] = SCORE_FUZZY * similarity[fuzzy]
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > limit:
+            # Keep everything tied with the limit-th score so ties break by name
+            cutoff = -np.partition(-scores[matched], limit - 1)[limit - 1]
+            matched = matched[scores[matched] >= cutoff]
+        ranked = matched[np.lexsort((snapshot.name_rank[matched], -scores[matched]))][:limit]
+        return [(snapshot.metas[position], round(float(scores[position]), 4)) for position in ranked]
+
+
+fund_search = FundSearchIndex()
@@ -0,0 +1,131 @@
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.metrics import GROUP_COMMIT_BATCH_SIZE
+
+
+class _Write:
+    __slots__ = ("work", "done", "finished", "result", "error")
+
+    def __init__(self, work: Callable[[Session], Any]):
+        self.work = work
+        # Set once: when the write is committed (or failed), or when it is promoted to leader
+        self.done = threading.Event()
+        self.finished = False
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class GroupCommit:
+    """
+    Runs write transactions, optionally batching concurrent ones into a shared
+    commit so a burst of writes pays for one commit (and fsync) instead of one
+    each.
+
+    Disabled, run() executes the write in the caller's session and commits it,
+    as the crud layer always has. Enabled, the first writer to arrive becomes
+    the leader: it waits up to window_ms for others (or until max_batch are
+    queued), then runs every queued write in one session, each inside its own
+    SAVEPOINT, and commits once. A write that raises is rolled back to its
+    savepoint and its exception goes to its own caller only; if the commit
+    itself fails, every write in the batch fails with that error. Callers block
+    until their write is committed, so a response is never sent for a write
+    that is not durable. Writes queued behind a full batch are led by the
+    first of them, so the leader's own request is not held past its batch.
+
+    Writes run in a session other than the caller's and that session is
+    closed after the commit, so they must return plain rows (INSERT / UPDATE
+    ... RETURNING) rather than ORM instances.
+    """
+
+    def __init__(self, enabled: bool = settings.GROUP_COMMIT_ENABLED,
+                 window_ms: float = settings.GROUP_COMMIT_WINDOW_MS,
+                 max_batch: int = settings.GROUP_COMMIT_MAX_BATCH,
+                 session_factory: Callable[[], Session] = SessionLocal):
+        self.enabled = enabled
+        self.window_seconds = window_ms / 1000
+        self.max_batch = max_batch
+        self.session_factory = session_factory
+        self._pending: List[_Write] = []
+        self._leading = False
+        self._cond = threading.Condition()
+
+    def run(self, db: Session, work: Callable[[Session], Any]) -> Any:
+        """work(session) committed; raises whatever work raised"""
+        if not self.enabled:
+            result = work(db)
+            db.commit()
+            return result
+
+        write = _Write(work)
+        with self._cond:
+            self._pending.append(write)
+            leader = not self._leading
+            self._leading = True
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+        if not leader:
+            write.done.wait()
+        if not write.finished:
+            # Leader, from the start or promoted: its own write is in the batch it commits
+            self._lead()
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def _lead(self):
+        with self._cond:
+            deadline = time.monotonic() + self.window_seconds
+            while len(self._pending) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        try:
+            self._commit(batch)
+        finally:
+            with self._cond:
+                if self._pending:
+                    self._pending[0].done.set()
+                else:
+                    self._leading = False
+            for write in batch:
+                write.finished = True
+                write.done.set()
+
+    def _commit(self, batch: List[_Write]):
+        session = self.session_factory()
+        try:
+            if session.get_bind().dialect.name == "sqlite":
+                # pysqlite begins transactions lazily, before the first DML; without an
+                # explicit BEGIN, the first SAVEPOINT would open a transaction of its own
+                # and its RELEASE would commit it
+                session.execute(text("BEGIN IMMEDIATE"))
+            for write in batch:
+                try:
+                    with session.begin_nested():
+                        write.result = write.work(session)
+                except Exception as exc:
+                    write.error = exc
+            session.commit()
+        except Exception as exc:
+            session.rollback()
+            for write in batch:
+                if write.error is None:
+                    write.result, write.error = None, exc
+        finally:
+            session.close()
+            GROUP_COMMIT_BATCH_SIZE.observe(len(batch))
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+
+group_commit = GroupCommit()
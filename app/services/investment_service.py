@@ -1,2 +1,17 @@
-# In a more complex application, this file would contain investment-related business logic
-# For now, the necessary functionality is in the CRUD layer
\ No newline at end of file
+# Investment jobs that run in the background rather than inside request handlers
+from app import crud
+from app.models.investment import SipPlan
+from app.services.jobs import JobContext, scheduler
+
+
+@scheduler.job("materialize_sip_plans", schedule="0 6 * * *")
+def materialize_sip_plans(ctx: JobContext) -> str:
+    """Turn SIP instalments due up to today into lots, resuming from each plan's materialized_through"""
+    total = ctx.db.query(SipPlan).count()
+
+    def on_batch(plans: int):
+        ctx.report(min(plans / total, 1.0) if total else 1.0, f"{plans} plans")
+
+    counts = crud.materialize_sip_plans(ctx.db, on_batch=on_batch)
+    return (f"Created {counts['lots_created']} lots from {counts['plans']} plans "
+            f"({counts['instalments_without_nav']} instalments had no NAV)")
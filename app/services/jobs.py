@@ -0,0 +1,303 @@
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.job import JobLock, JobRun
+
+logger = logging.getLogger("app.jobs")
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class CronSchedule:
+    """
+    Five-field cron expression (minute hour day-of-month month day-of-week) in UTC,
+    supporting "*", "*/n", "a-b", "a-b/n" and comma-separated lists. Day-of-week
+    runs 0-6 with 0 as Sunday. As in standard cron, when both day fields are
+    restricted (neither starts with "*") a day matches if either field does.
+    """
+
+    RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self.RANGES)
+        )
+        self.either_day = not fields[2].startswith("*") and not fields[4].startswith("*")
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> Set[int]:
+        values: Set[int] = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_text = part.split("/")
+                step = int(step_text)
+            if part == "*":
+                start, stop = low, high
+            elif "-" in part:
+                start, stop = (int(value) for value in part.split("-"))
+            else:
+                start = stop = int(part)
+            if start < low or stop > high or step < 1:
+                raise ValueError(f"Cron field {field!r} out of range {low}-{high}")
+            values.update(range(start, stop + 1, step))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day, weekday = moment.day in self.days, (moment.weekday() + 1) % 7 in self.weekdays
+        return day or weekday if self.either_day else day and weekday
+
+    def matches(self, moment: datetime) -> bool:
+        return (
+            moment.minute in self.minutes
+            and moment.hour in self.hours
+            and moment.month in self.months
+            and self._day_matches(moment)
+        )
+
+    def next_after(self, moment: datetime) -> datetime:
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366)
+        while candidate < limit:
+            if candidate.month not in self.months or not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression {self.expression!r} never fires")
+
+
+class JobContext:
+    """Handed to job handlers: a session of their own plus progress reporting"""
+
+    def __init__(self, scheduler: "JobScheduler", job: "Job", run_id: int, db: Session,
+                 params: Optional[Dict[str, Any]] = None):
+        self.scheduler = scheduler
+        self.job = job
+        self.run_id = run_id
+        self.db = db
+        self.params = params or {}
+
+    def report(self, progress: float, message: Optional[str] = None):
+        """Record progress (0-1) on the run and extend the job's lock lease"""
+        self.scheduler._update_run(self.run_id, progress=min(max(progress, 0.0), 1.0), message=message)
+        if self.job.exclusive:
+            self.scheduler._extend_lock(self.job)
+
+
+JobHandler = Callable[[JobContext], Optional[str]]
+
+
+@dataclass
+class Job:
+    name: str
+    handler: JobHandler
+    schedule: Optional[CronSchedule]
+    lease: timedelta
+    # Exclusive jobs run at most once at a time across all workers; others run per trigger
+    exclusive: bool = True
+    next_run: Optional[datetime] = None
+
+
+class JobScheduler:
+    """
+    Runs registered jobs on their cron schedule or on demand, on a worker pool
+    separate from the request threadpool. Every worker process runs a scheduler;
+    the job_locks row makes sure only one of them executes a given job at a time.
+    """
+
+    def __init__(self, session_factory=SessionLocal, workers: int = settings.JOB_WORKERS,
+                 poll_seconds: float = 30.0):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.jobs: Dict[str, Job] = {}
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def job(self, name: str, schedule: Optional[str] = None, lease_seconds: int = 3600, exclusive: bool = True):
+        """Decorator registering a handler; it returns an optional result message"""
+        def decorator(handler: JobHandler) -> JobHandler:
+            self.jobs[name] = Job(name, handler, CronSchedule(schedule) if schedule else None,
+                                  timedelta(seconds=lease_seconds), exclusive)
+            return handler
+        return decorator
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job-worker")
+        now = utcnow()
+        for job in self.jobs.values():
+            job.next_run = job.schedule.next_after(now) if job.schedule else None
+        self._thread = threading.Thread(target=self._loop, name="job-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            now = utcnow()
+            for job in self.jobs.values():
+                if job.next_run is not None and job.next_run <= now:
+                    job.next_run = job.schedule.next_after(now)
+                    self.trigger(job.name, trigger="schedule")
+            upcoming = [job.next_run for job in self.jobs.values() if job.next_run is not None]
+            wait = min([(min(upcoming) - utcnow()).total_seconds()] if upcoming else [self.poll_seconds])
+            self._stop.wait(max(min(wait, self.poll_seconds), 0.5))
+
+    def trigger(self, name: str, trigger: str = "manual", params: Optional[Dict[str, Any]] = None) -> Optional[int]:
+        """
+        Queue a run and return its id; raises KeyError for unknown jobs. Every
+        worker's scheduler fires each tick, so a scheduled run of an exclusive
+        job takes the lock first and, if another worker holds it, is dropped
+        without recording a run (None).
+        """
+        job = self.jobs[name]
+        locked = job.exclusive and trigger == "schedule"
+        if locked and not self._acquire_lock(job):
+            return None
+        db = self.session_factory()
+        try:
+            run = JobRun(job_name=name, trigger=trigger, status="queued", params=params, progress=0.0)
+            db.add(run)
+            db.commit()
+            run_id = run.id
+        except Exception:
+            if locked:
+                self._release_lock(job)
+            raise
+        finally:
+            db.close()
+
+        if self._executor is None:
+            # Scheduler not started (e.g. disabled or in a script): run inline
+            self._execute(job, run_id, params, locked)
+        else:
+            self._executor.submit(self._execute, job, run_id, params, locked)
+        return run_id
+
+    def _acquire_lock(self, job: Job) -> bool:
+        db = self.session_factory()
+        try:
+            try:
+                db.add(JobLock(name=job.name))
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+            now = utcnow()
+            result = db.execute(
+                update(JobLock)
+                .where(JobLock.name == job.name, or_(JobLock.locked_until.is_(None), JobLock.locked_until < now))
+                .values(owner=self.owner, locked_until=now + job.lease)
+            )
+            db.commit()
+            return result.rowcount == 1
+        finally:
+            db.close()
+
+    def _extend_lock(self, job: Job):
+        db = self.session_factory()
+        try:
+            db.execute(
+                update(JobLock)
+                .where(JobLock.name == job.name, JobLock.owner == self.owner)
+                .values(locked_until=utcnow() + job.lease)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _release_lock(self, job: Job):
+        db = self.session_factory()
+        try:
+            db.execute(
+                update(JobLock)
+                .where(JobLock.name == job.name, JobLock.owner == self.owner)
+                .values(owner=None, locked_until=None)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _update_run(self, run_id: int, **values):
+        db = self.session_factory()
+        try:
+            db.execute(update(JobRun).where(JobRun.id == run_id).values(**values))
+            db.commit()
+        finally:
+            db.close()
+
+    def _execute(self, job: Job, run_id: int, params: Optional[Dict[str, Any]] = None, locked: bool = False):
+        if job.exclusive and not locked and not self._acquire_lock(job):
+            self._update_run(run_id, status="skipped", message="Another run holds the job lock")
+            return
+
+        started = time.perf_counter()
+        self._update_run(run_id, status="running", started_at=utcnow())
+        db = self.session_factory()
+        try:
+            message = job.handler(JobContext(self, job, run_id, db, params))
+            status, progress = "succeeded", 1.0
+        except Exception as exc:
+            logger.exception("Job %s (run %s) failed", job.name, run_id)
+            db.rollback()
+            status, progress, message = "failed", None, str(exc)
+        finally:
+            db.close()
+            if job.exclusive:
+                self._release_lock(job)
+
+        values = dict(status=status, message=message, finished_at=utcnow(),
+                      duration_ms=round((time.perf_counter() - started) * 1000, 2))
+        if progress is not None:
+            values["progress"] = progress
+        self._update_run(run_id, **values)
+
+    def describe(self, db: Session) -> List[Dict]:
+        """Registered jobs with their schedule and latest run, for the admin API"""
+        described = []
+        for job in self.jobs.values():
+            last_run = db.query(JobRun).filter(JobRun.job_name == job.name).order_by(JobRun.id.desc()).first()
+            described.append({
+                "name": job.name,
+                "schedule": job.schedule.expression if job.schedule else None,
+                "next_run": job.next_run,
+                "last_run": last_run,
+            })
+        return described
+
+
+scheduler = JobScheduler()
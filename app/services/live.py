@@ -0,0 +1,205 @@
+import asyncio
+import threading
+from datetime import date
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.fund import FundSectorAllocation
+from app.models.investment import UserPosition
+from app.services.fund_cache import fund_cache
+
+# Events buffered per connection before it is told to resync instead
+QUEUE_SIZE = 100
+
+
+class Subscriber:
+    """One live connection; create it on the event loop that will read its queue"""
+    __slots__ = ("queue", "loop")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.loop = loop
+
+    def _put(self, event: Dict[str, Any]):
+        if self.queue.full():
+            # A slow client gets one resync marker rather than an unbounded backlog
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = {"type": "resync"}
+        self.queue.put_nowait(event)
+
+    def push(self, event: Dict[str, Any]):
+        """Thread-safe: crud hooks run in the request threadpool"""
+        self.loop.call_soon_threadsafe(self._put, event)
+
+
+class _UserState:
+    """What a subscribed user's dashboard shows, kept current by applying deltas"""
+
+    def __init__(self, units: Dict[int, float], navs: Dict[int, float], cost: float,
+                 sectors: Dict[int, List[Tuple[str, float]]]):
+        self.units = units
+        self.navs = navs
+        self.cost = cost
+        self.sectors = sectors
+        self.current_value = sum(units[fund_id] * navs[fund_id] for fund_id in units)
+        self.sector_amounts: Dict[str, float] = {}
+        for fund_id, allocations in sectors.items():
+            for sector, percentage in allocations:
+                value = units[fund_id] * navs[fund_id] * percentage / 100
+                self.sector_amounts[sector] = self.sector_amounts.get(sector, 0.0) + value
+
+    def snapshot(self) -> Dict[str, Any]:
+        total = self.current_value
+        sectors = sorted(self.sector_amounts.items(), key=lambda item: item[1], reverse=True)
+        return {
+            "type": "snapshot",
+            "current_investment_value": round(total, 2),
+            "initial_investment_value": round(self.cost, 2),
+            "sector_allocation": [
+                {"sector": sector, "amount": round(amount, 2),
+                 "percentage": round(amount / total * 100, 2) if total else 0.0}
+                for sector, amount in sectors
+            ],
+            "chart_point": _chart_point(total),
+        }
+
+
+def _chart_point(value: float) -> Dict[str, Any]:
+    # Same shape as the dashboard's performance_data points
+    return {"date": date.today().strftime("%d %b"), "value": round(value, 2)}
+
+
+def _load_state(db: Session, user_id: int) -> _UserState:
+    holdings = db.query(
+        UserPosition.fund_id,
+        UserPosition.units,
+        UserPosition.cost
+    ).filter(
+        UserPosition.user_id == user_id
+    ).all()
+    funds = fund_cache.get_many(db, [h.fund_id for h in holdings])
+    held = [h for h in holdings if h.fund_id in funds]
+
+    sectors: Dict[int, List[Tuple[str, float]]] = {h.fund_id: [] for h in held}
+    if sectors:
+        for alloc in db.query(
+            FundSectorAllocation.fund_id, FundSectorAllocation.sector, FundSectorAllocation.percentage
+        ).filter(FundSectorAllocation.fund_id.in_(list(sectors))).all():
+            sectors[alloc.fund_id].append((alloc.sector, alloc.percentage))
+
+    return _UserState(
+        units={h.fund_id: h.units for h in held},
+        navs={h.fund_id: funds[h.fund_id].nav for h in held},
+        cost=sum(h.cost for h in held),
+        sectors=sectors,
+    )
+
+
+class DashboardHub:
+    """
+    Pushes dashboard deltas to live (SSE) subscribers.
+
+    Only users with an open connection have state here, and the fund_id -> users
+    index only lists those users, so a NAV change touches just the subscribers
+    holding that fund: each gets units x delta-NAV applied to its total and to
+    the fund's sectors, with no query. Investment writes reload only the writing
+    user's state, and only if that user is subscribed.
+
+    State lives in this process. With several workers, a subscriber only sees
+    writes handled by the worker its connection landed on.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[Subscriber]] = {}
+        self._states: Dict[int, _UserState] = {}
+        self._fund_users: Dict[int, Set[int]] = {}
+        self._lock = threading.Lock()
+
+    def subscriber_count(self, user_id: Optional[int] = None) -> int:
+        if user_id is not None:
+            return len(self._subscribers.get(user_id, ()))
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def _index(self, user_id: int, state: _UserState):
+        previous = self._states.get(user_id)
+        for fund_id in (previous.units if previous else ()):
+            users = self._fund_users.get(fund_id)
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del self._fund_users[fund_id]
+        self._states[user_id] = state
+        for fund_id in state.units:
+            self._fund_users.setdefault(fund_id, set()).add(user_id)
+
+    def subscribe(self, db: Session, user_id: int, subscriber: Subscriber):
+        """Register a connection; its queue starts with a full snapshot"""
+        state = None if user_id in self._states else _load_state(db, user_id)
+        with self._lock:
+            if user_id not in self._states:
+                # The last connection may have closed since the check above
+                self._index(user_id, state or _load_state(db, user_id))
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+            subscriber.push(self._states[user_id].snapshot())
+
+    def unsubscribe(self, user_id: int, subscriber: Subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is None:
+                return
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[user_id]
+                state = self._states.pop(user_id)
+                for fund_id in state.units:
+                    users = self._fund_users.get(fund_id)
+                    if users is not None:
+                        users.discard(user_id)
+                        if not users:
+                            del self._fund_users[fund_id]
+
+    def _publish(self, user_id: int, event: Dict[str, Any]):
+        for subscriber in self._subscribers.get(user_id, ()):
+            subscriber.push(event)
+
+    def fund_nav_changed(self, fund_id: int, nav: float):
+        """Write hook: apply a fund's new NAV to the subscribers holding it"""
+        if fund_id not in self._fund_users:
+            return
+        with self._lock:
+            for user_id in self._fund_users.get(fund_id, ()):
+                state = self._states[user_id]
+                change = state.units[fund_id] * (nav - state.navs[fund_id])
+                state.navs[fund_id] = nav
+                if not change:
+                    continue
+                state.current_value += change
+                changed = []
+                for sector, percentage in state.sectors.get(fund_id, ()):
+                    state.sector_amounts[sector] += change * percentage / 100
+                    changed.append({"sector": sector, "amount": round(state.sector_amounts[sector], 2)})
+                self._publish(user_id, {
+                    "type": "nav",
+                    "fund_id": fund_id,
+                    "nav": nav,
+                    "current_investment_value": round(state.current_value, 2),
+                    "initial_investment_value": round(state.cost, 2),
+                    "sector_changes": changed,
+                    "chart_point": _chart_point(state.current_value),
+                })
+
+    def investments_changed(self, db: Session, user_id: int):
+        """Write hook: a subscribed user's lots changed, so reload and resend their snapshot"""
+        if user_id not in self._subscribers:
+            return
+        state = _load_state(db, user_id)
+        with self._lock:
+            if user_id not in self._subscribers:
+                return
+            self._index(user_id, state)
+            self._publish(user_id, state.snapshot())
+
+
+dashboard_hub = DashboardHub()
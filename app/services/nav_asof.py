@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.metrics import record_cache_access
+from app.models.fund import HistoricalNAV
+
+
+class NavSeries(NamedTuple):
+    dates: np.ndarray  # datetime64[D], ascending
+    navs: np.ndarray
+    loaded_at: float
+
+
+_EMPTY_DATES = np.array([], dtype="datetime64[D]")
+
+
+class NavAsOfIndex:
+    """
+    NAV on a date, or the last NAV before it (weekends and holidays), for
+    batches of (fund_id, date) pairs.
+
+    Each fund's history is held as sorted date and NAV arrays, loaded on first
+    use in one query per batch of missing funds. A batch is resolved with one
+    searchsorted per distinct fund. At most max_funds histories are kept (least
+    recently used are dropped), and entries older than ttl_seconds are reloaded
+    so NAVs ingested by other workers show up.
+    """
+
+    def __init__(self, max_funds: int = settings.NAV_ASOF_CACHE_FUNDS,
+                 ttl_seconds: float = settings.NAV_ASOF_TTL_SECONDS):
+        self.max_funds = max_funds
+        self.ttl_seconds = ttl_seconds
+        self._series: "OrderedDict[int, NavSeries]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load(db: Session, fund_ids: List[int]) -> Dict[int, NavSeries]:
+        rows = db.execute(select(HistoricalNAV.fund_id, HistoricalNAV.date, HistoricalNAV.nav).where(
+            HistoricalNAV.fund_id.in_(fund_ids)
+        ).order_by(
+            HistoricalNAV.fund_id, HistoricalNAV.date
+        )).all()
+        loaded_at = time.monotonic()
+        series = {fund_id: NavSeries(_EMPTY_DATES, np.array([]), loaded_at) for fund_id in fund_ids}
+        if rows:
+            funds, dates, navs = zip(*rows)
+            funds = np.array(funds)
+            dates = np.array(dates, dtype="datetime64[D]")
+            navs = np.array(navs, dtype=float)
+            bounds = np.flatnonzero(np.diff(funds)) + 1
+            for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(funds)]):
+                series[int(funds[start])] = NavSeries(dates[start:end], navs[start:end], loaded_at)
+        return series
+
+    def series(self, db: Session, fund_ids: Iterable[int]) -> Dict[int, NavSeries]:
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for fund_id in fund_ids:
+                entry = self._series.get(fund_id)
+                if entry is not None and now - entry.loaded_at < self.ttl_seconds:
+                    self._series.move_to_end(fund_id)
+                    found[fund_id] = entry
+                else:
+                    missing.append(fund_id)
+                record_cache_access("nav_history", fund_id in found)
+        if missing:
+            loaded = self._load(db, missing)
+            found.update(loaded)
+            with self._lock:
+                self._series.update(loaded)
+                while len(self._series) > self.max_funds:
+                    self._series.popitem(last=False)
+        return found
+
+    def lookup(self, db: Session, fund_ids: Sequence[int],
+               dates: Sequence[date]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (navs, nav_dates) aligned with the input pairs: the NAV in effect on each
+        date and the date it was published. NaN / NaT where the fund has no NAV
+        on or before the date.
+        """
+        fund_ids = np.asarray(fund_ids, dtype=np.int64)
+        days = np.asarray(dates, dtype="datetime64[D]")
+        navs = np.full(len(fund_ids), np.nan)
+        nav_dates = np.full(len(fund_ids), np.datetime64("NaT"), dtype="datetime64[D]")
+        if not len(fund_ids):
+            return navs, nav_dates
+
+        order = np.argsort(fund_ids, kind="stable")
+        sorted_funds = fund_ids[order]
+        starts = np.flatnonzero(np.r_[True, sorted_funds[1:] != sorted_funds[:-1]])
+        series = self.series(db, sorted_funds[starts].tolist())
+        for start, end in zip(starts, np.r_[starts[1:], len(order)]):
+            history = series[int(sorted_funds[start])]
+            rows = order[start:end]
+            positions = np.searchsorted(history.dates, days[rows], side="right") - 1
+            found = positions >= 0
+            navs[rows[found]] = history.navs[positions[found]]
+            nav_dates[rows[found]] = history.dates[positions[found]]
+        return navs, nav_dates
+
+    def nav_on(self, db: Session, fund_id: int, day: date) -> Optional[float]:
+        navs, _ = self.lookup(db, [fund_id], [day])
+        return None if np.isnan(navs[0]) else float(navs[0])
+
+    def invalidate(self, fund_ids: Optional[Iterable[int]] = None):
+        """Write hook: drop cached histories that changed (all of them when fund_ids is None)"""
+        with self._lock:
+            if fund_ids is None:
+                self._series.clear()
+                return
+            for fund_id in fund_ids:
+                self._series.pop(fund_id, None)
+
+
+nav_asof = NavAsOfIndex()
@@ -0,0 +1,70 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from app.config import settings
+from app.metrics import SINGLE_FLIGHT_REQUESTS
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: the first caller for a key (the leader)
+    runs the function, and callers arriving with the same key while it is still
+    running (followers) block until it finishes and receive its result, or its
+    exception. Nothing is kept once the call completes, so a request arriving
+    afterwards always computes afresh; this only removes duplicate work, it
+    never serves results older than the request.
+
+    Endpoints run in the threadpool, so waiting is a plain threading.Event.
+    Followers never touch their own session, which therefore never checks out
+    a connection: the whole herd costs one computation and one connection.
+    """
+
+    def __init__(self, enabled: bool = settings.SINGLE_FLIGHT_ENABLED):
+        self.enabled = enabled
+        self._calls: Dict[Tuple[str, Hashable], _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, route: str, key: Hashable, func: Callable[..., Any], *args) -> Any:
+        """func(*args), shared with any in-flight call for the same route and key"""
+        if not self.enabled:
+            return func(*args)
+
+        flight = (route, key)
+        with self._lock:
+            call = self._calls.get(flight)
+            leader = call is None
+            if leader:
+                call = self._calls[flight] = _Call()
+        SINGLE_FLIGHT_REQUESTS.labels(route, "leader" if leader else "follower").inc()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args)
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[flight]
+            call.done.set()
+        return call.result
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+single_flight = SingleFlight()
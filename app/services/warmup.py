@@ -0,0 +1,110 @@
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, engine
+from app.models.fund import MutualFund, FundSectorAllocation
+from app.services.compute import compute_pool
+from app.services.fund_cache import fund_cache
+from app.services.fund_screen import fund_screener
+
+logger = logging.getLogger("app.warmup")
+
+WarmupTask = Callable[[Session], None]
+
+_tasks: List[Tuple[str, WarmupTask]] = []
+
+
+class ReadinessState:
+    """Warm-up progress reported by /readyz"""
+
+    def __init__(self):
+        self.ready = False
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.durations_ms: Dict[str, float] = {}
+        self.failures: Dict[str, str] = {}
+
+    def as_dict(self) -> Dict:
+        elapsed = None
+        if self.started_at is not None and self.finished_at is not None:
+            elapsed = round((self.finished_at - self.started_at) * 1000, 2)
+        return {
+            "ready": self.ready,
+            "warmup_ms": elapsed,
+            "tasks_ms": self.durations_ms,
+            "failures": self.failures,
+        }
+
+
+readiness = ReadinessState()
+
+
+def register_warmup(name: str) -> Callable[[WarmupTask], WarmupTask]:
+    """Register a task that runs with its own session before the app reports ready"""
+    def decorator(task: WarmupTask) -> WarmupTask:
+        _tasks.append((name, task))
+        return task
+    return decorator
+
+
+def run_warmups(state: ReadinessState = readiness):
+    """
+    Run every registered warm-up task in order, then flip readiness.
+    A failing task is logged and reported but does not keep the app unready;
+    whatever it would have preloaded is loaded lazily instead.
+    """
+    state.started_at = time.perf_counter()
+    for name, task in _tasks:
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            task(db)
+        except Exception as exc:
+            logger.exception("Warm-up task %s failed", name)
+            state.failures[name] = str(exc)
+        finally:
+            db.close()
+            state.durations_ms[name] = round((time.perf_counter() - started) * 1000, 2)
+    state.finished_at = time.perf_counter()
+    state.ready = True
+    logger.info("Warm-up finished in %.1f ms", (state.finished_at - state.started_at) * 1000)
+
+
+@register_warmup("connection_pool")
+def warm_connection_pool(db: Session):
+    """Open the pool's steady-state connections up front instead of on the first requests"""
+    size = getattr(engine.pool, "size", None)
+    count = size() if callable(size) else 1
+    connections = [engine.connect() for _ in range(count)]
+    for connection in connections:
+        connection.close()
+
+
+@register_warmup("reference_data")
+def warm_reference_data(db: Session):
+    """Touch fund metadata, current NAVs and sector rows so the database serves them from memory"""
+    db.execute(select(MutualFund.id, MutualFund.name, MutualFund.fund_type, MutualFund.isn, MutualFund.nav)).all()
+    db.execute(select(
+        FundSectorAllocation.fund_id, FundSectorAllocation.sector, FundSectorAllocation.percentage
+    )).all()
+
+
+@register_warmup("fund_metadata")
+def warm_fund_metadata(db: Session):
+    fund_cache.load(db)
+
+
+@register_warmup("fund_screen")
+def warm_fund_screen(db: Session):
+    """Load the screener's returns and sector / market-cap mixes ahead of the first screen"""
+    fund_screener.load(db)
+
+
+@register_warmup("compute_pool")
+def warm_compute_pool(db: Session):
+    """Spawn the analytics worker processes; until then offloaded work runs inline"""
+    compute_pool.start()
@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+"""
+Endpoint benchmark harness.
+
+Loads a synthetic dataset (see generate_dataset.py) into the database named by
+DATABASE_URL, drives every router endpoint under configurable concurrency and
+records latency percentiles, throughput and SQL statements per request.
+
+Usage:
+    DATABASE_URL=sqlite:///bench.db python scripts/benchmark.py run --profile small --output current.json
+    python scripts/benchmark.py run --base-url http://localhost:8000 --output current.json
+    python scripts/benchmark.py compare baseline.json current.json --threshold 0.15
+
+Pass --background sector_allocation to keep heavy analytics running while the
+other endpoints are measured; comparing runs with COMPUTE_WORKERS=0 and >0 shows
+what offloading to the compute pool does to their tail latency.
+
+Read path comparison: the same lots loaded as ORM instances, as Core rows
+and as a projected subset of columns, each serialized as the router would,
+with time and peak Python memory per variant:
+    DATABASE_URL=sqlite:///bench.db python scripts/benchmark.py reads --rows 10000
+
+Write throughput: concurrent create_investment calls committed one per request,
+then with GROUP_COMMIT_ENABLED's batching (concurrent writes share a commit);
+the lots are removed afterwards:
+    DATABASE_URL=sqlite:///bench.db python scripts/benchmark.py writes --writes 2000 --concurrency 32
+
+Admission control isolation: flood analytics well past its limits and compare
+the cheap endpoints with ADMISSION_CONTROL_ENABLED=1 and 0. With it on, the
+flood is partly shed (reported as "shed", 503 + Retry-After, not as errors)
+and the CRUD endpoints keep their latency:
+    python scripts/benchmark.py run --endpoints fund_detail user_investments \
+        --background sector_allocation --background-concurrency 64
+"""
+import sys
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import contextvars
+import subprocess
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import httpx
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event, func, select
+
+# Statement counter for the request currently being driven; propagates into the
+# threadpool that runs the sync endpoints.
+_statement_counter: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar(
+    "statement_counter", default=None
+)
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = _statement_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+# Typeahead queries for fund_search: prefixes as typed, ISN prefixes and a typo
+SEARCH_QUERIES = ["h", "hdf", "hdfc mid", "sbi", "axis fl", "INF0000001", "nipon smal", "liquid"]
+
+
+def endpoint_specs(users: int, funds: int, overlap_pairs: Sequence) -> Dict[str, Callable[[random.Random], str]]:
+    """Endpoint name -> function producing a request path with randomized ids"""
+    def user_id(rng: random.Random) -> int:
+        return rng.randint(1, max(users, 1))
+
+    def fund_pair(rng: random.Random) -> str:
+        if not overlap_pairs:
+            return f"/api/analysis/overlap/{user_id(rng)}"
+        first, second = rng.choice(overlap_pairs)
+        return f"/api/analysis/overlap/{user_id(rng)}?fund1_id={first}&fund2_id={second}"
+
+    return {
+        "dashboard": lambda rng: f"/api/investments/dashboard/{user_id(rng)}",
+        "sector_allocation": lambda rng: f"/api/analysis/sector-allocation/{user_id(rng)}",
+        "overlap_all": lambda rng: f"/api/analysis/overlap/{user_id(rng)}",
+        "overlap_pair": fund_pair,
+        "fund_list": lambda rng: f"/api/funds/?skip={rng.randint(0, max(funds - 100, 0))}&limit=100",
+        "fund_detail": lambda rng: f"/api/funds/{rng.randint(1, max(funds, 1))}",
+        "fund_search": lambda rng: f"/api/funds/search?q={rng.choice(SEARCH_QUERIES)}",
+        "user_investments": lambda rng: f"/api/investments/user/{user_id(rng)}",
+        "user_list": lambda rng: "/api/users/?skip=0&limit=100",
+    }
+
+
+def summarize(latencies_ms: List[float], errors: int, elapsed: float, statements: List[int],
+              shed: int = 0) -> Dict[str, Any]:
+    values = np.array(latencies_ms) if latencies_ms else np.zeros(1)
+    return {
+        "requests": len(latencies_ms),
+        "errors": errors,
+        "shed": shed,
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+        "max_ms": round(float(values.max()), 3),
+        "throughput_rps": round(len(latencies_ms) / elapsed, 2) if elapsed else 0.0,
+        "sql_per_request": round(float(np.mean(statements)), 2) if statements else None,
+    }
+
+
+async def drive_endpoint(client: httpx.AsyncClient, make_path: Callable[[random.Random], str], requests: int,
+                         concurrency: int, seed: int, count_sql: bool) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    paths = [make_path(rng) for _ in range(requests)]
+    latencies: List[float] = []
+    statements: List[int] = []
+    errors = shed = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(path: str):
+        nonlocal errors, shed
+        async with semaphore:
+            counter = [0]
+            token = _statement_counter.set(counter) if count_sql else None
+            started = time.perf_counter()
+            try:
+                response = await client.get(path)
+                # 404s are expected for random ids without data and 503s are admission
+                # control shedding load; any other 5xx is a failure
+                if response.status_code == 503:
+                    shed += 1
+                elif response.status_code >= 500:
+                    errors += 1
+            except Exception:
+                errors += 1
+            finally:
+                latencies.append((time.perf_counter() - started) * 1000.0)
+                if token is not None:
+                    _statement_counter.reset(token)
+                    statements.append(counter[0])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(path) for path in paths))
+    return summarize(latencies, errors, time.perf_counter() - started, statements, shed)
+
+
+async def background_load(client: httpx.AsyncClient, make_path: Callable[[random.Random], str], concurrency: int,
+                          seed: int, stop: asyncio.Event) -> Dict[str, Any]:
+    """Keep concurrency requests in flight against one endpoint until stop is set"""
+    rng = random.Random(seed)
+    latencies: List[float] = []
+    errors = shed = 0
+
+    async def loop():
+        nonlocal errors, shed
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                response = await client.get(make_path(rng))
+                if response.status_code == 503:
+                    shed += 1
+                    # Honour Retry-After loosely so a shed flood does not spin
+                    await asyncio.sleep(0.01)
+                elif response.status_code >= 500:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000.0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(loop() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started, [], shed)
+
+
+def _dataset_shape():
+    from app.database import SessionLocal
+    from app.models import User, MutualFund, FundOverlap
+
+    db = SessionLocal()
+    try:
+        users = db.execute(select(func.count(User.id))).scalar() or 0
+        funds = db.execute(select(func.count(MutualFund.id))).scalar() or 0
+        pairs = db.execute(select(FundOverlap.fund_id_1, FundOverlap.fund_id_2).limit(1000)).all()
+        return users, funds, [tuple(pair) for pair in pairs]
+    finally:
+        db.close()
+
+
+def _load_dataset(profile: str, seed: int, reset: bool):
+    from generate_dataset import PROFILES, DatasetGenerator
+    from app.database import engine, Base
+
+    if reset:
+        Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    users, _, _ = _dataset_shape()
+    if users:
+        print(f"Reusing existing dataset with {users:,} users")
+        return
+    print(f"Generating profile '{profile}' (seed {seed})")
+    DatasetGenerator(PROFILES[profile], seed=seed).generate(engine)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    count_sql = args.base_url is None
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+        dialect = "remote"
+        users, funds, pairs = args.users, args.funds, []
+    else:
+        _load_dataset(args.profile, args.seed, args.reset)
+        from app.main import app
+        from app.database import engine
+        from app.services.compute import compute_pool
+
+        # ASGITransport does not run the lifespan, so start the analytics workers here
+        compute_pool.start()
+        event.listen(engine, "before_cursor_execute", _count_statement)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark",
+                                   timeout=args.timeout)
+        dialect = engine.dialect.name
+        users, funds, pairs = _dataset_shape()
+
+    specs = endpoint_specs(users, funds, pairs)
+    selected = args.endpoints or list(specs)
+    results: Dict[str, Any] = {}
+    async with client:
+        # Heavy analytics running alongside the measured endpoints, to expose tail
+        # latency of cheap requests while CPU-bound work is in flight
+        stop = asyncio.Event()
+        background = background_stats = None
+        if args.background:
+            background = asyncio.create_task(background_load(client, specs[args.background],
+                                                             args.background_concurrency, args.seed + 2000, stop))
+        for index, name in enumerate(selected):
+            if args.warmup:
+                await drive_endpoint(client, specs[name], args.warmup, args.concurrency, args.seed + 1000 + index,
+                                     False)
+            results[name] = await drive_endpoint(client, specs[name], args.requests, args.concurrency,
+                                                 args.seed + index, count_sql)
+            stats = results[name]
+            print(f"{name:>18}: p50 {stats['p50_ms']:8.2f}ms  p95 {stats['p95_ms']:8.2f}ms  "
+                  f"p99 {stats['p99_ms']:8.2f}ms  {stats['throughput_rps']:8.1f} req/s  "
+                  f"sql/req {stats['sql_per_request']}  errors {stats['errors']}  shed {stats['shed']}")
+        if background is not None:
+            stop.set()
+            background_stats = await background
+            print(f"background {args.background}: p50 {background_stats['p50_ms']:.2f}ms  "
+                  f"p99 {background_stats['p99_ms']:.2f}ms  {background_stats['throughput_rps']:.1f} req/s  "
+                  f"errors {background_stats['errors']}  shed {background_stats['shed']}")
+    if not args.base_url:
+        compute_pool.shutdown()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "profile": None if args.base_url else args.profile,
+            "dialect": dialect,
+            "concurrency": args.concurrency,
+            "requests_per_endpoint": args.requests,
+            "seed": args.seed,
+            "background": args.background,
+            "background_concurrency": args.background_concurrency if args.background else None,
+            "users": users,
+            "funds": funds,
+        },
+        "endpoints": results,
+        "background": background_stats,
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float,
+            metrics: Sequence[str] = ("p50_ms", "p95_ms", "p99_ms")) -> List[str]:
+    """Return a description of every metric that regressed by more than threshold"""
+    regressions = []
+    for name, base in baseline["endpoints"].items():
+        now = current["endpoints"].get(name)
+        if now is None:
+            continue
+        for metric in metrics:
+            before, after = base[metric], now[metric]
+            if before and (after - before) / before > threshold:
+                regressions.append(f"{name}.{metric}: {before:.2f}ms -> {after:.2f}ms "
+                                   f"(+{(after - before) / before:.0%})")
+        if base.get("sql_per_request") is not None and now.get("sql_per_request") is not None:
+            if now["sql_per_request"] > base["sql_per_request"]:
+                regressions.append(f"{name}.sql_per_request: {base['sql_per_request']} -> {now['sql_per_request']}")
+        if now["errors"] > base["errors"]:
+            regressions.append(f"{name}.errors: {base['errors']} -> {now['errors']}")
+    return regressions
+
+
+def run_reads(args) -> Dict[str, Any]:
+    """Time and peak memory of listing args.rows lots through each read path"""
+    import tracemalloc
+    from pydantic import TypeAdapter
+
+    _load_dataset(args.profile, args.seed, args.reset)
+    from app import schemas
+    from app.crud.investment import INVESTMENT_COLUMNS
+    from app.database import SessionLocal
+    from app.models import MutualFund, UserInvestment
+    from app.projection import as_dicts, json_response, select_columns
+
+    adapter = TypeAdapter(List[schemas.Investment])
+    fields = args.fields.split(",")
+    lot_columns = {name: column for name, column in INVESTMENT_COLUMNS.items()
+                   if name in UserInvestment.__table__.columns}
+
+    def lots(columns):
+        return select(*columns).join_from(UserInvestment, MutualFund, MutualFund.id == UserInvestment.fund_id)
+
+    def orm(db):
+        lots = db.query(UserInvestment).limit(args.rows).all()
+        return len(lots), adapter.dump_json(adapter.validate_python(lots, from_attributes=True))
+
+    def core(db):
+        rows = db.execute(select(*lot_columns.values()).limit(args.rows)).all()
+        return len(rows), adapter.dump_json(adapter.validate_python(as_dicts(rows), from_attributes=True))
+
+    def enriched(db):
+        # Fund name, current value and return from the same joined select
+        rows = db.execute(lots(select_columns(INVESTMENT_COLUMNS, None)).limit(args.rows)).all()
+        return len(rows), adapter.dump_json(adapter.validate_python(as_dicts(rows), from_attributes=True))
+
+    def projected(db):
+        rows = db.execute(lots(select_columns(INVESTMENT_COLUMNS, fields)).limit(args.rows)).all()
+        return len(rows), json_response(as_dicts(rows)).body
+
+    results = {}
+    variants = (("orm", orm), ("core", core), ("core_enriched", enriched), (f"core_fields[{args.fields}]", projected))
+    for name, variant in variants:
+        timings, peaks = [], []
+        for _ in range(args.repeat):
+            # Timed and traced separately: tracemalloc slows allocation-heavy code several times over
+            for traced in (False, True):
+                db = SessionLocal()
+                try:
+                    if traced:
+                        tracemalloc.start()
+                    started = time.perf_counter()
+                    rows, body = variant(db)
+                    if traced:
+                        peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+                        tracemalloc.stop()
+                    else:
+                        timings.append((time.perf_counter() - started) * 1000)
+                finally:
+                    db.close()
+        results[name] = {
+            "rows": rows,
+            "bytes": len(body),
+            "median_ms": round(float(np.median(timings)), 2),
+            "peak_kib": round(float(np.median(peaks)), 1),
+        }
+        print(f"{name:>32}: {rows:,} rows  {results[name]['median_ms']:9.2f}ms  "
+              f"peak {results[name]['peak_kib']:10.1f}KiB  body {len(body):,}B")
+    return results
+
+
+def run_writes(args) -> Dict[str, Any]:
+    """Writes per second of concurrent create_investment calls with group commit off and on"""
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import date
+    from prometheus_client import REGISTRY
+
+    _load_dataset(args.profile, args.seed, args.reset)
+    from app import crud
+    from app.database import SessionLocal
+    from app.models import MutualFund, User, UserInvestment
+    from app.schemas import InvestmentCreate
+    from app.services.group_commit import group_commit
+
+    with SessionLocal() as db:
+        users = db.query(func.max(User.id)).scalar()
+        funds = db.query(MutualFund.id, MutualFund.nav).all()
+        last_lot = db.query(func.max(UserInvestment.id)).scalar() or 0
+    rng = random.Random(args.seed)
+    payloads = []
+    for _ in range(args.writes):
+        fund_id, nav = rng.choice(funds)
+        payloads.append(InvestmentCreate(user_id=rng.randint(1, users), fund_id=fund_id, amount=1000.0,
+                                         investment_date=date.today(), nav_at_investment=nav))
+
+    def write(investment: InvestmentCreate) -> bool:
+        db = SessionLocal()
+        try:
+            crud.create_investment(db, investment)
+            return True
+        except Exception:
+            return False
+        finally:
+            db.close()
+
+    def batches() -> float:
+        return REGISTRY.get_sample_value("group_commit_batch_size_count") or 0.0
+
+    results = {}
+    configured = group_commit.enabled
+    try:
+        for enabled in (False, True):
+            name = "group_commit" if enabled else "per_request_commit"
+            group_commit.enabled = enabled
+            committed = batches()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(args.concurrency) as pool:
+                succeeded = sum(pool.map(write, payloads))
+            elapsed = time.perf_counter() - started
+            transactions = batches() - committed if enabled else succeeded
+            results[name] = {
+                "writes": succeeded,
+                "errors": len(payloads) - succeeded,
+                "writes_per_second": round(succeeded / elapsed, 1),
+                "commits": int(transactions),
+            }
+            print(f"{name:>20}: {succeeded:,} writes in {elapsed:6.2f}s  "
+                  f"{results[name]['writes_per_second']:9.1f} writes/s  {int(transactions):,} commits  "
+                  f"{results[name]['errors']} errors")
+    finally:
+        group_commit.enabled = configured
+        # Leave the dataset as it was
+        with SessionLocal() as db:
+            db.query(UserInvestment).filter(UserInvestment.id > last_lot).delete(synchronize_session=False)
+            db.commit()
+            crud.rebuild_positions(db)
+            crud.reload_portfolio_values(db)
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Investment Dashboard API")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    run = subcommands.add_parser("run", help="Run the benchmark and write results as JSON")
+    run.add_argument("--profile", default="small", help="Dataset profile to load when the database is empty")
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--reset", action="store_true", help="Drop and regenerate the dataset first")
+    run.add_argument("--base-url", default=None, help="Benchmark a running server instead of the in-process app")
+    run.add_argument("--users", type=int, default=100, help="User id range when using --base-url")
+    run.add_argument("--funds", type=int, default=50, help="Fund id range when using --base-url")
+    run.add_argument("--concurrency", type=int, default=8)
+    run.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    run.add_argument("--warmup", type=int, default=20, help="Untimed requests per endpoint")
+    run.add_argument("--timeout", type=float, default=60.0)
+    run.add_argument("--endpoints", nargs="*", default=None, help="Subset of endpoints to drive")
+    run.add_argument("--output", default=None, help="Write results JSON to this path")
+    run.add_argument("--background", default=None,
+                     help="Endpoint to keep under load while the others are measured, e.g. sector_allocation")
+    run.add_argument("--background-concurrency", type=int, default=4)
+
+    reads = subcommands.add_parser("reads", help="Compare ORM, Core and projected list reads")
+    reads.add_argument("--profile", default="small", help="Dataset profile to load when the database is empty")
+    reads.add_argument("--seed", type=int, default=42)
+    reads.add_argument("--reset", action="store_true", help="Drop and regenerate the dataset first")
+    reads.add_argument("--rows", type=int, default=10_000)
+    reads.add_argument("--fields", default="fund_id,amount,units", help="Columns for the projected variant")
+    reads.add_argument("--repeat", type=int, default=5)
+
+    writes = subcommands.add_parser("writes", help="Compare write throughput with and without group commit")
+    writes.add_argument("--profile", default="small", help="Dataset profile to load when the database is empty")
+    writes.add_argument("--seed", type=int, default=42)
+    writes.add_argument("--reset", action="store_true", help="Drop and regenerate the dataset first")
+    writes.add_argument("--writes", type=int, default=2000, help="Investments created per variant")
+    writes.add_argument("--concurrency", type=int, default=32)
+
+    cmp = subcommands.add_parser("compare", help="Compare results against a saved baseline")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--threshold", type=float, default=0.10, help="Allowed relative latency increase")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "reads":
+        run_reads(args)
+        return 0
+
+    if args.command == "writes":
+        run_writes(args)
+        return 0
+
+    if args.command == "run":
+        results = asyncio.run(run_benchmark(args))
+        if args.output:
+            with open(args.output, "w") as fh:
+                json.dump(results, fh, indent=2)
+            print(f"Results written to {args.output}")
+        return 0
+
+    with open(args.baseline) as fh:
+        baseline = json.load(fh)
+    with open(args.current) as fh:
+        current = json.load(fh)
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print("Regressions against baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Synthetic dataset generator for benchmarks and load testing.
+
+Generates funds with geometric Brownian motion NAV histories, stock holdings with
+the sector and market-cap mixes derived from them, pairwise fund overlaps, and
+users holding SIP and lump-sum lots, then bulk loads everything in chunks.
+
+Output is deterministic for a given profile, seed and end date, so benchmark runs
+against the same dataset are comparable.
+
+Usage:
+    python scripts/generate_dataset.py --profile small --reset
+    python scripts/generate_dataset.py --profile large --seed 7 --end-date 2026-06-30
+"""
+import sys
+import os
+import io
+import csv
+import time
+import argparse
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from app import crud
+from app.database import engine as default_engine, Base
+from app.models import (
+    User,
+    MutualFund,
+    UserInvestment,
+    FundSectorAllocation,
+    FundStockAllocation,
+    FundMarketCapAllocation,
+    FundOverlap,
+    HistoricalNAV,
+    Stock,
+    FundHolding
+)
+
+
+@dataclass(frozen=True)
+class DatasetProfile:
+    funds: int
+    years: int
+    users: int
+    stocks: int
+    holdings_per_fund: int = 40
+    max_funds_per_user: int = 8
+    sip_share: float = 0.7
+    # Every pair among the most popular funds gets an overlap row, plus a few random peers per fund
+    overlap_top: int = 100
+    overlap_peers: int = 5
+
+
+PROFILES: Dict[str, DatasetProfile] = {
+    "small": DatasetProfile(funds=50, years=3, users=200, stocks=200, overlap_top=50),
+    "medium": DatasetProfile(funds=1_000, years=10, users=10_000, stocks=1_000),
+    "large": DatasetProfile(funds=10_000, years=20, users=100_000, stocks=2_000, overlap_top=200),
+}
+
+SECTORS = [
+    "Financial", "Technology", "Energy", "Healthcare", "Consumer Goods",
+    "Industrials", "Telecom", "Materials", "Utilities", "Real Estate",
+]
+
+# fund_type -> (annual drift, annual volatility, Dirichlet alpha for large/mid/small cap mix)
+FUND_TYPES = {
+    "Large Cap": (0.11, 0.16, (12.0, 2.0, 0.5)),
+    "Mid Cap": (0.14, 0.22, (2.0, 10.0, 2.0)),
+    "Small Cap": (0.16, 0.28, (0.5, 2.0, 12.0)),
+    "Flexi Cap": (0.13, 0.19, (6.0, 4.0, 3.0)),
+    "ELSS": (0.12, 0.18, (7.0, 3.0, 2.0)),
+    "Index": (0.10, 0.15, (20.0, 0.5, 0.1)),
+}
+CAP_TYPES = ["Large Cap", "Mid Cap", "Small Cap"]
+
+AMCS = [
+    "ICICI Prudential", "HDFC", "SBI", "Axis", "Mirae Asset", "Kotak", "Nippon India",
+    "Motilal Oswal", "Aditya Birla Sun Life", "UTI", "DSP", "Parag Parikh", "Tata", "Franklin India",
+]
+
+SIP_AMOUNTS = np.array([500.0, 1000.0, 2000.0, 2500.0, 5000.0, 10000.0, 25000.0])
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def _rng(seed: int, stream: int) -> np.random.Generator:
+    """Independent stream per entity kind, so changing one profile knob leaves the rest unchanged"""
+    return np.random.default_rng([seed, stream])
+
+
+def _to_dates(days: np.ndarray) -> List[date]:
+    return days.astype("datetime64[D]").astype(object).tolist()
+
+
+def bulk_insert(conn: Connection, table, columns: Sequence[str], arrays: Sequence[Sequence],
+                chunk_size: int = 10_000) -> int:
+    """Insert column arrays in chunks, using COPY on PostgreSQL and executemany elsewhere"""
+    total = len(arrays[0]) if arrays else 0
+    if total == 0:
+        return 0
+
+    if conn.dialect.name == "postgresql":
+        cursor = conn.connection.dbapi_connection.cursor()
+        copy_sql = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        for start in range(0, total, chunk_size):
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(zip(*(column[start:start + chunk_size] for column in arrays)))
+            buffer.seek(0)
+            cursor.copy_expert(copy_sql, buffer)
+        cursor.close()
+    else:
+        insert = table.insert()
+        for start in range(0, total, chunk_size):
+            rows = [
+                dict(zip(columns, values))
+                for values in zip(*(column[start:start + chunk_size] for column in arrays))
+            ]
+            conn.execute(insert, rows)
+    return total
+
+
+def business_days(start: date, end: date) -> np.ndarray:
+    days = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+    return days[np.is_busday(days)]
+
+
+def gbm_paths(rng: np.random.Generator, mu: np.ndarray, sigma: np.ndarray, start_nav: np.ndarray,
+              steps: int) -> np.ndarray:
+    """NAV paths of shape (len(mu), steps) from daily geometric Brownian motion"""
+    dt = 1.0 / TRADING_DAYS_PER_YEAR
+    shocks = rng.standard_normal((len(mu), steps))
+    log_returns = ((mu - 0.5 * sigma ** 2) * dt)[:, None] + (sigma * np.sqrt(dt))[:, None] * shocks
+    log_returns[:, 0] = 0.0
+    return start_nav[:, None] * np.exp(np.cumsum(log_returns, axis=1))
+
+
+class DatasetGenerator:
+    def __init__(self, profile: DatasetProfile, seed: int = 42, end_date: Optional[date] = None,
+                 chunk_size: int = 10_000, fund_chunk: int = 200, user_chunk: int = 2_000):
+        self.profile = profile
+        self.seed = seed
+        self.end_date = end_date or datetime.now().date()
+        self.chunk_size = chunk_size
+        self.fund_chunk = fund_chunk
+        self.user_chunk = user_chunk
+
+        start_date = self.end_date - timedelta(days=round(365.25 * profile.years))
+        self.days = business_days(start_date, self.end_date)
+        # First business day of every month, used to price SIP instalments and lump sums
+        month_starts = np.unique(self.days.astype("datetime64[M]"))
+        self.month_day_index = np.searchsorted(self.days, month_starts.astype("datetime64[D]"))
+        self.counts: Dict[str, int] = {}
+
+    def _log(self, message: str):
+        print(f"[{time.strftime('%H:%M:%S')}] {message}")
+
+    def _count(self, name: str, rows: int):
+        self.counts[name] = self.counts.get(name, 0) + rows
+
+    def generate(self, engine: Engine = default_engine) -> Dict[str, int]:
+        profile = self.profile
+        rng_funds = _rng(self.seed, 0)
+        fund_ids = np.arange(1, profile.funds + 1)
+        type_names = list(FUND_TYPES)
+        fund_types = rng_funds.integers(0, len(type_names), profile.funds)
+        amcs = rng_funds.integers(0, len(AMCS), profile.funds)
+        start_navs = rng_funds.uniform(10.0, 150.0, profile.funds)
+        drift = np.array([FUND_TYPES[type_names[t]][0] for t in fund_types]) + rng_funds.normal(0, 0.03, profile.funds)
+        vol = np.array([FUND_TYPES[type_names[t]][1] for t in fund_types]) * rng_funds.uniform(0.8, 1.2, profile.funds)
+
+        monthly_nav = np.empty((profile.funds, len(self.month_day_index)))
+        rng_nav = _rng(self.seed, 1)
+        for start in range(0, profile.funds, self.fund_chunk):
+            stop = min(start + self.fund_chunk, profile.funds)
+            paths = gbm_paths(rng_nav, drift[start:stop], vol[start:stop], start_navs[start:stop], len(self.days))
+            monthly_nav[start:stop] = paths[:, self.month_day_index]
+            with engine.begin() as conn:
+                self._load_funds(conn, fund_ids[start:stop], fund_types[start:stop], amcs[start:stop],
+                                 type_names, paths)
+            self._log(f"Loaded NAV history for funds {start + 1}-{stop} of {profile.funds}")
+
+        with engine.begin() as conn:
+            self._load_stocks(conn)
+            weights = self._load_fund_composition(conn, fund_ids, fund_types, type_names)
+            self._load_overlaps(conn, weights)
+
+        popularity = 1.0 / np.arange(1, profile.funds + 1) ** 0.8
+        popularity /= popularity.sum()
+        rng_users = _rng(self.seed, 2)
+        for start in range(0, profile.users, self.user_chunk):
+            stop = min(start + self.user_chunk, profile.users)
+            with engine.begin() as conn:
+                self._load_users(conn, rng_users, np.arange(start + 1, stop + 1), popularity, monthly_nav)
+            self._log(f"Loaded users {start + 1}-{stop} of {profile.users}")
+
+        # Lots and NAVs were bulk loaded, so the aggregates the crud writes maintain are built in one pass
+        with Session(engine) as db:
+            self._count("user_positions", crud.rebuild_positions(db))
+            self._count("user_portfolio_values", crud.reload_portfolio_values(db))
+            for table, rows in crud.rebuild_nav_rollups(db).items():
+                self._count(table, rows)
+            # Funds were bulk loaded too: running workers' fund caches reload when the version moves
+            crud.bump_fund_catalog_version(db)
+            db.commit()
+
+        with engine.begin() as conn:
+            self._reset_sequences(conn)
+        return self.counts
+
+    def _load_stocks(self, conn: Connection):
+        rng = _rng(self.seed, 3)
+        count = self.profile.stocks
+        self.stock_sectors = rng.integers(0, len(SECTORS), count)
+        ids = np.arange(1, count + 1)
+        bulk_insert(conn, Stock.__table__, ["id", "symbol", "name", "sector"], [
+            ids.tolist(),
+            [f"STK{i:05d}" for i in ids],
+            [f"Synthetic Stock {i}" for i in ids],
+            [SECTORS[s] for s in self.stock_sectors],
+        ], self.chunk_size)
+        self._count("stocks", count)
+
+    def _load_fund_composition(self, conn: Connection, fund_ids: np.ndarray, fund_types: np.ndarray,
+                               type_names: List[str]) -> np.ndarray:
+        """Holdings, top stock allocations, sector and market-cap mixes; returns the fund x stock weight matrix"""
+        profile = self.profile
+        rng = _rng(self.seed, 4)
+        held = min(profile.holdings_per_fund, profile.stocks)
+        weights = np.zeros((profile.funds, profile.stocks), dtype=np.float32)
+
+        # Rank-ordered picks from a skewed stock popularity, so funds share their top names
+        stock_popularity = 1.0 / np.arange(1, profile.stocks + 1) ** 0.6
+        stock_popularity /= stock_popularity.sum()
+        for row in range(profile.funds):
+            picks = rng.choice(profile.stocks, size=held, replace=False, p=stock_popularity)
+            weights[row, picks] = rng.dirichlet(np.full(held, 1.5))
+
+        rows, cols = np.nonzero(weights)
+        pct = np.round(weights[rows, cols].astype(np.float64) * 100.0, 4)
+        bulk_insert(conn, FundHolding.__table__, ["fund_id", "stock_id", "percentage"],
+                    [fund_ids[rows].tolist(), (cols + 1).tolist(), pct.tolist()], self.chunk_size)
+        self._count("fund_holdings", len(rows))
+
+        top = np.argsort(-weights, axis=1)[:, :10]
+        top_rows = np.repeat(np.arange(profile.funds), top.shape[1])
+        top_cols = top.ravel()
+        bulk_insert(conn, FundStockAllocation.__table__, ["fund_id", "stock_name", "percentage"], [
+            fund_ids[top_rows].tolist(),
+            [f"Synthetic Stock {c + 1}" for c in top_cols],
+            np.round(weights[top_rows, top_cols].astype(np.float64) * 100.0, 4).tolist(),
+        ], self.chunk_size)
+        self._count("fund_stock_allocations", len(top_rows))
+
+        # Sector mix is the holding weights summed by stock sector
+        sector_matrix = np.zeros((profile.stocks, len(SECTORS)), dtype=np.float32)
+        sector_matrix[np.arange(profile.stocks), self.stock_sectors] = 1.0
+        sector_weights = (weights @ sector_matrix).astype(np.float64)
+        rows, cols = np.nonzero(sector_weights > 0.0005)
+        bulk_insert(conn, FundSectorAllocation.__table__, ["fund_id", "sector", "percentage"], [
+            fund_ids[rows].tolist(),
+            [SECTORS[c] for c in cols],
+            np.round(sector_weights[rows, cols] * 100.0, 2).tolist(),
+        ], self.chunk_size)
+        self._count("fund_sector_allocations", len(rows))
+
+        alphas = np.array([FUND_TYPES[type_names[t]][2] for t in fund_types])
+        caps = np.vstack([rng.dirichlet(alpha) for alpha in alphas])
+        cap_rows = np.repeat(np.arange(profile.funds), len(CAP_TYPES))
+        bulk_insert(conn, FundMarketCapAllocation.__table__, ["fund_id", "cap_type", "percentage"], [
+            fund_ids[cap_rows].tolist(),
+            CAP_TYPES * profile.funds,
+            np.round(caps.ravel() * 100.0, 2).tolist(),
+        ], self.chunk_size)
+        self._count("fund_market_cap_allocations", len(cap_rows))
+
+        return weights
+
+    def _load_funds(self, conn: Connection, ids: np.ndarray, fund_types: np.ndarray, amcs: np.ndarray,
+                    type_names: List[str], paths: np.ndarray):
+        bulk_insert(conn, MutualFund.__table__, ["id", "name", "fund_type", "isn", "nav"], [
+            ids.tolist(),
+            [f"{AMCS[a]} {type_names[t]} Fund {i}" for i, a, t in zip(ids, amcs, fund_types)],
+            [type_names[t] for t in fund_types],
+            [f"INF{i:09d}" for i in ids],
+            np.round(paths[:, -1], 4).tolist(),
+        ], self.chunk_size)
+        self._count("mutual_funds", len(ids))
+
+        steps = paths.shape[1]
+        dates = _to_dates(self.days)
+        bulk_insert(conn, HistoricalNAV.__table__, ["fund_id", "date", "nav"], [
+            np.repeat(ids, steps).tolist(),
+            dates * len(ids),
+            np.round(paths, 4).ravel().tolist(),
+        ], self.chunk_size)
+        self._count("historical_nav", paths.size)
+
+    def _load_overlaps(self, conn: Connection, weights: np.ndarray):
+        profile = self.profile
+        rng = _rng(self.seed, 5)
+        top = min(profile.overlap_top, profile.funds)
+        first, second = np.triu_indices(top, k=1)
+        peers = rng.integers(0, profile.funds, (profile.funds, profile.overlap_peers))
+        pairs = np.concatenate([
+            np.column_stack([first, second]),
+            np.column_stack([np.repeat(np.arange(profile.funds), profile.overlap_peers), peers.ravel()]),
+        ])
+        pairs = np.unique(np.sort(pairs, axis=1), axis=0)
+        pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+
+        total = 0
+        for start in range(0, len(pairs), self.chunk_size):
+            a, b = pairs[start:start + self.chunk_size].T
+            shared = np.minimum(weights[a], weights[b])
+            overlap = shared.sum(axis=1, dtype=np.float64) * 100.0
+            stocks = (shared > 0).sum(axis=1)
+            keep = stocks > 0
+            total += bulk_insert(conn, FundOverlap.__table__,
+                                 ["fund_id_1", "fund_id_2", "overlap_percentage", "overlapping_stocks"], [
+                                     (a[keep] + 1).tolist(),
+                                     (b[keep] + 1).tolist(),
+                                     np.round(overlap[keep], 2).tolist(),
+                                     stocks[keep].tolist(),
+                                 ], self.chunk_size)
+        self._count("fund_overlaps", total)
+
+    def _load_users(self, conn: Connection, rng: np.random.Generator, user_ids: np.ndarray,
+                    popularity: np.ndarray, monthly_nav: np.ndarray):
+        profile = self.profile
+        months = len(self.month_day_index)
+        bulk_insert(conn, User.__table__, ["id", "name", "email"], [
+            user_ids.tolist(),
+            [f"User {i}" for i in user_ids],
+            [f"user{i}@example.com" for i in user_ids],
+        ], self.chunk_size)
+        self._count("users", len(user_ids))
+
+        lot_users, lot_funds, lot_months, lot_amounts = [], [], [], []
+        fund_counts = rng.integers(1, min(profile.max_funds_per_user, profile.funds) + 1, len(user_ids))
+        for user_id, count in zip(user_ids, fund_counts):
+            funds = rng.choice(profile.funds, size=count, replace=False, p=popularity)
+            for fund in funds:
+                if rng.random() < profile.sip_share:
+                    # Monthly SIP from a random start, either still running or stopped later
+                    start = rng.integers(0, months)
+                    stop = months if rng.random() < 0.6 else rng.integers(start, months) + 1
+                    instalments = np.arange(start, stop)
+                    amount = np.full(len(instalments), rng.choice(SIP_AMOUNTS))
+                else:
+                    instalments = np.sort(rng.choice(months, size=min(rng.integers(1, 4), months), replace=False))
+                    amount = np.round(rng.uniform(10_000, 500_000, len(instalments)), -3)
+                lot_users.append(np.full(len(instalments), user_id))
+                lot_funds.append(np.full(len(instalments), fund))
+                lot_months.append(instalments)
+                lot_amounts.append(amount)
+
+        funds = np.concatenate(lot_funds)
+        month_index = np.concatenate(lot_months)
+        amounts = np.concatenate(lot_amounts)
+        navs = np.round(monthly_nav[funds, month_index], 4)
+        dates = np.array(_to_dates(self.days), dtype=object)[self.month_day_index[month_index]]
+        lots = bulk_insert(conn, UserInvestment.__table__,
+                           ["user_id", "fund_id", "investment_date", "amount", "nav_at_investment", "units"], [
+                               np.concatenate(lot_users).tolist(),
+                               (funds + 1).tolist(),
+                               dates.tolist(),
+                               amounts.tolist(),
+                               navs.tolist(),
+                               np.round(amounts / navs, 6).tolist(),
+                           ], self.chunk_size)
+        self._count("user_investments", lots)
+
+    def _reset_sequences(self, conn: Connection):
+        """Explicit ids bypass PostgreSQL sequences; move them past the loaded rows"""
+        if conn.dialect.name != "postgresql":
+            return
+        for table in Base.metadata.sorted_tables:
+            if "id" in table.c:
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {table.name}), 0) + 1, false)"
+                ))
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic benchmark dataset")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end-date", type=date.fromisoformat, default=None,
+                        help="Last NAV date (YYYY-MM-DD); defaults to today")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="Rows per bulk insert")
+    parser.add_argument("--reset", action="store_true", help="Drop and recreate all tables first")
+    args = parser.parse_args(argv)
+
+    if args.reset:
+        Base.metadata.drop_all(bind=default_engine)
+    Base.metadata.create_all(bind=default_engine)
+
+    with default_engine.connect() as conn:
+        if conn.execute(text("SELECT COUNT(*) FROM users")).scalar():
+            print("Database already has data. Use --reset to replace it.")
+            return
+
+    started = time.perf_counter()
+    generator = DatasetGenerator(PROFILES[args.profile], seed=args.seed, end_date=args.end_date,
+                                 chunk_size=args.chunk_size)
+    counts = generator.generate(default_engine)
+    elapsed = time.perf_counter() - started
+
+    for table, rows in sorted(counts.items()):
+        print(f"{table:>30}: {rows:,}")
+    print(f"Generated profile '{args.profile}' in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
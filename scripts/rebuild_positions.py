@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Check or rebuild user_positions (and the user_portfolio_values derived from
+them) against the investment lots.
+
+The crud layer keeps both tables current on every investment write; lots
+loaded any other way (bulk imports, manual SQL) need a rebuild afterwards.
+
+Usage:
+    python scripts/rebuild_positions.py --verify
+    python scripts/rebuild_positions.py
+"""
+import sys
+import os
+import argparse
+from typing import Optional, Sequence
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import crud
+from app.database import SessionLocal
+
+# Mismatches printed by --verify; the total is always reported
+SHOW_MISMATCHES = 20
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Verify or rebuild user positions from investment lots")
+    parser.add_argument("--verify", action="store_true",
+                        help="Only report positions that disagree with the lots; exit 1 if any do")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.verify:
+            mismatches = crud.verify_positions(db)
+            for mismatch in mismatches[:SHOW_MISMATCHES]:
+                print(f"user {mismatch['user_id']} fund {mismatch['fund_id']}: {mismatch['problem']}")
+            print(f"{len(mismatches)} positions disagree with the lots")
+            return 1 if mismatches else 0
+
+        positions = crud.rebuild_positions(db)
+        portfolios = crud.reload_portfolio_values(db)
+        print(f"Rebuilt {positions} positions and {portfolios} portfolio values")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
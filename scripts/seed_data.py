@@ -11,6 +11,7 @@ import random
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from sqlalchemy.orm import Session
+from app import crud
 from app.database import SessionLocal, engine, Base
 from app.models import (
     User,
@@ -62,6 +63,8 @@ def seed_data():
             MutualFund(name="HDFC Large Cap Fund", fund_type="Large Cap", isn="INF179K01CQ2", nav=106.00),
         ]
         db.add_all(funds)
+        # Running workers' fund caches only reload when the catalog version moves
+        crud.bump_fund_catalog_version(db)
         db.commit()
         for fund in funds:
             db.refresh(fund)
@@ -302,6 +305,11 @@ def seed_data():
 
         db.commit()
 
+        # Lots and NAVs above were added directly, not through crud.create_investment or crud.ingest_navs
+        crud.rebuild_positions(db)
+        crud.reload_portfolio_values(db)
+        crud.rebuild_nav_rollups(db)
+
         print("Database seeded successfully!")
 
     except Exception as e:
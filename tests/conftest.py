@@ -0,0 +1,95 @@
+import os
+import tempfile
+from datetime import date, timedelta
+
+# Point the app at a throwaway SQLite database before anything imports app.database
+_db_dir = tempfile.mkdtemp(prefix="fundfusion-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+# Analytics run inline unless a test starts its own compute pool
+os.environ.setdefault("COMPUTE_WORKERS", "0")
+
+import pytest
+
+from app import crud
+from app.database import SessionLocal, engine, Base
+from app.services.fund_cache import fund_cache
+from app.services.fund_screen import fund_screener
+from app.services.nav_asof import nav_asof
+from app.models import (
+    User,
+    MutualFund,
+    UserInvestment,
+    FundSectorAllocation,
+    FundOverlap,
+    HistoricalNAV,
+)
+
+Base.metadata.create_all(bind=engine)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                # The catalog version row is created with its table and only ever counts up
+                if table.name != "fund_catalog_version":
+                    conn.execute(table.delete())
+        fund_cache.invalidate()
+        nav_asof.invalidate()
+        fund_screener.invalidate()
+
+
+def seed_portfolio(db):
+    """A user holding three funds with sector, overlap and 120 days of NAV data"""
+    user = User(name="Test User", email="test@example.com")
+    db.add(user)
+    funds = [
+        MutualFund(name="Alpha Bluechip Fund", fund_type="Large Cap", isn="INF000A00001", nav=120.0),
+        MutualFund(name="Beta Midcap Fund", fund_type="Mid Cap", isn="INF000A00002", nav=90.0),
+        MutualFund(name="Gamma Flexi Cap Fund", fund_type="Flexi Cap", isn="INF000A00003", nav=110.0),
+    ]
+    db.add_all(funds)
+    db.commit()
+
+    today = date.today()
+    db.add_all([
+        UserInvestment(user_id=user.id, fund_id=funds[0].id, investment_date=today - timedelta(days=100),
+                       amount=10000.0, nav_at_investment=100.0, units=100.0),
+        UserInvestment(user_id=user.id, fund_id=funds[1].id, investment_date=today - timedelta(days=60),
+                       amount=5000.0, nav_at_investment=100.0, units=50.0),
+        UserInvestment(user_id=user.id, fund_id=funds[2].id, investment_date=today - timedelta(days=20),
+                       amount=2000.0, nav_at_investment=100.0, units=20.0),
+    ])
+    db.add_all([
+        FundSectorAllocation(fund_id=funds[0].id, sector="Financial", percentage=60.0),
+        FundSectorAllocation(fund_id=funds[0].id, sector="Technology", percentage=40.0),
+        FundSectorAllocation(fund_id=funds[1].id, sector="Healthcare", percentage=100.0),
+        FundSectorAllocation(fund_id=funds[2].id, sector="Technology", percentage=50.0),
+        FundSectorAllocation(fund_id=funds[2].id, sector="Energy", percentage=50.0),
+    ])
+    db.add_all([
+        FundOverlap(fund_id_1=funds[0].id, fund_id_2=funds[1].id, overlap_percentage=40.0, overlapping_stocks=2),
+        FundOverlap(fund_id_1=funds[0].id, fund_id_2=funds[2].id, overlap_percentage=70.0, overlapping_stocks=4),
+    ])
+    for fund in funds:
+        db.add_all([
+            HistoricalNAV(fund_id=fund.id, date=today - timedelta(days=offset), nav=100.0 + (120 - offset) * 0.1)
+            for offset in range(120)
+        ])
+    db.commit()
+    # The lots and NAVs bypassed the crud layer, so build their positions, portfolio values and NAV rollups
+    crud.rebuild_positions(db)
+    crud.reload_portfolio_values(db)
+    crud.rebuild_nav_rollups(db)
+
+    return {"user": user, "funds": funds}
+
+
+@pytest.fixture
+def seeded(db):
+    return seed_portfolio(db)
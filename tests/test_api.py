@@ -0,0 +1,497 @@
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import zipfile
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import admission
+from app.config import settings
+from app.main import app
+from app.models import FundHolding, FundOverlap, HistoricalNAV, Stock
+from app.profiling import RequestProfile
+from app.services.compute import ComputePoolBusy, compute_pool
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_benchmarked_endpoints_respond(client, seeded):
+    user_id = seeded["user"].id
+    fund_ids = [fund.id for fund in seeded["funds"]]
+    paths = [
+        f"/api/investments/dashboard/{user_id}",
+        f"/api/analysis/sector-allocation/{user_id}",
+        f"/api/analysis/overlap/{user_id}",
+        f"/api/analysis/overlap/{user_id}?fund1_id={fund_ids[0]}&fund2_id={fund_ids[1]}",
+        "/api/funds/",
+        f"/api/funds/{fund_ids[0]}",
+        f"/api/investments/user/{user_id}",
+        "/api/users/",
+    ]
+    for path in paths:
+        response = client.get(path)
+        assert response.status_code == 200, f"{path}: {response.text}"
+
+
+def test_dashboard_summary(client, seeded):
+    response = client.get(f"/api/investments/dashboard/{seeded['user'].id}")
+    data = response.json()
+
+    assert data["current_investment_value"] == pytest.approx(100 * 120.0 + 50 * 90.0 + 20 * 110.0)
+    assert data["initial_investment_value"] == pytest.approx(17000.0)
+    assert data["best_performing_scheme"]["name"] == "Alpha Bluechip Fund"
+    assert data["worst_performing_scheme"]["name"] == "Beta Midcap Fund"
+    assert data["performance_data"]
+    assert {row["sector"] for row in data["sector_allocation"]} == {"Financial", "Technology", "Healthcare", "Energy"}
+    assert len(data["fund_overlap"]) == 2
+
+
+def test_sql_profiling_server_timing_header(client, seeded, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "SQL_PROFILING_SAMPLE_RATE", 1.0)
+
+    with caplog.at_level("INFO", logger="app.profiling"):
+        response = client.get(f"/api/investments/dashboard/{seeded['user'].id}")
+
+    timing = response.headers["server-timing"]
+    assert timing.startswith("db;dur=")
+    assert "db-slowest;dur=" in timing
+    assert any('"query_count"' in record.getMessage() for record in caplog.records)
+
+
+def test_sql_profiling_flags_repeated_statements():
+    profile = RequestProfile()
+    for _ in range(3):
+        profile.record("SELECT * FROM mutual_funds WHERE id = ?", 0.001)
+    profile.record("SELECT * FROM users WHERE id = ?", 0.002)
+
+    repeated = profile.repeated_statements(3)
+    assert repeated == [("SELECT * FROM mutual_funds WHERE id = ?", 3)]
+    assert 'db-repeated;desc="1 repeated statements"' in profile.server_timing(repeated)
+    assert profile.query_count == 4
+    assert profile.slowest_statement == "SELECT * FROM users WHERE id = ?"
+
+
+def test_metrics_endpoint_exposes_route_and_crud_histograms(client, seeded):
+    client.get(f"/api/analysis/sector-allocation/{seeded['user'].id}")
+    body = client.get("/metrics").text
+
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/analysis/sector-allocation/{user_id}"' in body
+    assert 'crud_function_duration_seconds_count{function="get_portfolio_sector_allocation"}' in body
+    assert "http_requests_in_flight" in body
+    assert "db_pool_checked_out" in body
+
+
+STARTUP_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import app.main
+import_ms = (time.perf_counter() - started) * 1000
+
+from fastapi.testclient import TestClient
+started = time.perf_counter()
+with TestClient(app.main.app) as client:
+    while client.get("/readyz").status_code != 200:
+        time.sleep(0.005)
+    ready_ms = (time.perf_counter() - started) * 1000
+    status = client.get("/api/funds/").status_code
+    first_request_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({"import_ms": import_ms, "ready_ms": ready_ms,
+                  "first_request_ms": first_request_ms, "status": status}))
+"""
+
+
+def _run_python(code, **env):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=root, env={**os.environ, **env},
+        capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip().splitlines()[-1]
+
+
+def test_import_does_not_touch_the_database():
+    # Nothing listens on port 1, so any connection attempt at import time would fail
+    output = _run_python("import app.main; print('imported')",
+                         DATABASE_URL="postgresql://nobody@127.0.0.1:1/none", ENVIRONMENT="production")
+    assert output == "imported"
+
+
+def test_import_and_time_to_first_request(tmp_path):
+    timings = json.loads(_run_python(STARTUP_SCRIPT, DATABASE_URL=f"sqlite:///{tmp_path / 'startup.db'}"))
+
+    assert timings["status"] == 200
+    assert 0 < timings["import_ms"] < 5000, timings
+    # Readiness comes before the first request, which is measured from the same start
+    assert 0 < timings["ready_ms"] <= timings["first_request_ms"] < 5000, timings
+
+
+def test_health_and_readiness(client):
+    assert client.get("/healthz").json() == {"status": "ok"}
+    deadline = time.monotonic() + 10
+    while client.get("/readyz").status_code != 200 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    body = client.get("/readyz").json()
+    assert body["ready"] is True
+    assert {"connection_pool", "reference_data"} <= set(body["tasks_ms"])
+
+
+def test_trigger_overlap_job_and_poll_status(client, seeded, db):
+    alpha, beta = seeded["funds"][0], seeded["funds"][1]
+    stocks = [Stock(symbol=f"STK{i}", name=f"Stock {i}", sector="Financial") for i in range(3)]
+    db.add_all(stocks)
+    db.commit()
+    db.add_all([
+        FundHolding(fund_id=alpha.id, stock_id=stocks[0].id, percentage=30.0),
+        FundHolding(fund_id=alpha.id, stock_id=stocks[1].id, percentage=20.0),
+        FundHolding(fund_id=beta.id, stock_id=stocks[1].id, percentage=25.0),
+        FundHolding(fund_id=beta.id, stock_id=stocks[2].id, percentage=10.0),
+    ])
+    db.commit()
+
+    jobs = {job["name"]: job for job in client.get("/api/admin/jobs").json()}
+    assert jobs["recompute_fund_overlaps"]["schedule"] == "0 2 * * *"
+
+    response = client.post("/api/admin/jobs/recompute_fund_overlaps/run")
+    assert response.status_code == 202
+    run_id = response.json()["id"]
+
+    deadline = time.monotonic() + 10
+    run = client.get(f"/api/admin/jobs/runs/{run_id}").json()
+    while run["status"] in ("queued", "running") and time.monotonic() < deadline:
+        time.sleep(0.01)
+        run = client.get(f"/api/admin/jobs/runs/{run_id}").json()
+
+    assert run["status"] == "succeeded", run
+    assert run["progress"] == 1.0
+    assert run["duration_ms"] is not None
+    overlap = client.get(f"/api/analysis/overlap/{seeded['user'].id}",
+                         params={"fund1_id": alpha.id, "fund2_id": beta.id}).json()
+    assert overlap[0]["overlap_percentage"] == 20.0
+    assert overlap[0]["overlapping_stocks"] == 1
+    assert client.post("/api/admin/jobs/missing/run").status_code == 404
+
+
+def test_simulate_what_if_scenarios(db, client, seeded):
+    alpha, beta, _ = (fund.id for fund in seeded["funds"])
+    today = date.today()
+    alpha_nav = lambda days_ago: 100.0 + (120 - days_ago) * 0.1  # seeded NAV history
+    # Beta climbs five times as fast, so switching into it and rebalancing towards it both pay
+    beta_nav = lambda days_ago: 50.0 + (120 - days_ago) * 0.5
+    for row in db.query(HistoricalNAV).filter(HistoricalNAV.fund_id == beta):
+        row.nav = beta_nav((today - row.date).days)
+    db.commit()
+
+    response = client.post("/api/analysis/simulate", json={
+        "user_id": seeded["user"].id,
+        "max_points": 10,
+        "scenarios": [
+            {"name": "actual", "include_portfolio": True},
+            {"name": "lump sum", "lots": [
+                {"fund_id": alpha, "investment_date": str(today - timedelta(days=100)), "amount": 1000.0}
+            ]},
+            {"name": "switch half", "lots": [
+                {"fund_id": alpha, "investment_date": str(today - timedelta(days=100)), "amount": 1000.0}
+            ], "switches": [
+                {"switch_date": str(today - timedelta(days=50)), "from_fund_id": alpha, "to_fund_id": beta,
+                 "fraction": 0.5}
+            ]},
+            {"name": "60/40 monthly", "target_weights": {str(alpha): 3, str(beta): 2}, "initial_amount": 1000.0,
+             "rebalance": "monthly"},
+            {"name": "60/40 held", "target_weights": {str(alpha): 3, str(beta): 2}, "initial_amount": 1000.0},
+        ],
+    })
+    assert response.status_code == 200, response.text
+    scenarios = {result["name"]: result for result in response.json()}
+    results = {name: result["final_value"] for name, result in scenarios.items()}
+
+    # The seeded lots, valued at the last NAVs in the history (gamma's path is alpha's)
+    assert results["actual"] == pytest.approx(100 * alpha_nav(0) + 50 * beta_nav(0) + 20 * alpha_nav(0), abs=0.01)
+    assert scenarios["actual"]["invested"] == 17000.0
+    lump_sum = 1000.0 / alpha_nav(100) * alpha_nav(0)
+    assert results["lump sum"] == pytest.approx(lump_sum, abs=0.01)
+
+    # Half the alpha units are sold at day 50's NAV and the proceeds buy beta at its NAV that day
+    kept = 1000.0 / alpha_nav(100) / 2
+    switched = kept * alpha_nav(50) / beta_nav(50)
+    assert results["switch half"] == pytest.approx(kept * alpha_nav(0) + switched * beta_nav(0), abs=0.01)
+
+    # Without a start_date, target weights are invested at the earliest event date (the lots, 100 days
+    # ago); monthly rebalancing resets the 60/40 split on the first NAV day of every later month
+    held = [600.0 / alpha_nav(100), 400.0 / beta_nav(100)]
+    assert results["60/40 held"] == pytest.approx(held[0] * alpha_nav(0) + held[1] * beta_nav(0), abs=0.01)
+    units = list(held)
+    for days_ago in range(99, -1, -1):
+        day = today - timedelta(days=days_ago)
+        if day.month != (day - timedelta(days=1)).month:
+            value = units[0] * alpha_nav(days_ago) + units[1] * beta_nav(days_ago)
+            units = [0.6 * value / alpha_nav(days_ago), 0.4 * value / beta_nav(days_ago)]
+    assert results["60/40 monthly"] == pytest.approx(units[0] * alpha_nav(0) + units[1] * beta_nav(0), abs=0.01)
+
+    # Beta outgrows alpha, so each move towards it beats holding alpha; rebalancing sells beta's gains
+    assert results["lump sum"] < results["switch half"]
+    assert results["lump sum"] < results["60/40 monthly"] < results["60/40 held"]
+
+    assert len(scenarios["lump sum"]["series"]) == 10
+    assert scenarios["lump sum"]["series"][-1] == {"date": str(today), "value": round(lump_sum, 2)}
+    assert scenarios["lump sum"]["max_drawdown_percentage"] == 0.0
+
+    invalid = client.post("/api/analysis/simulate", json={"scenarios": [
+        {"name": "no history", "lots": [{"fund_id": 999, "investment_date": str(today), "amount": 10.0}]}
+    ]})
+    assert invalid.status_code == 400
+
+
+def test_streaming_exports(client, seeded):
+    user_id = seeded["user"].id
+
+    response = client.get(f"/api/users/{user_id}/export", params={"format": "csv"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lots = list(csv.reader(io.StringIO(response.text)))
+    assert lots[0][:3] == ["investment_id", "fund_id", "fund_name"]
+    assert [row[2] for row in lots[1:]] == ["Alpha Bluechip Fund", "Beta Midcap Fund", "Gamma Flexi Cap Fund"]
+    assert float(lots[1][8]) == 100 * 120.0  # units * current NAV
+
+    history = client.get(f"/api/users/{user_id}/export", params={"format": "csv", "section": "history"})
+    # One row per NAV date since the first lot, 100 days ago
+    assert len(history.text.strip().splitlines()) == 1 + 101
+
+    workbook = client.get(f"/api/users/{user_id}/export", params={"format": "xlsx"})
+    with zipfile.ZipFile(io.BytesIO(workbook.content)) as archive:
+        assert archive.testzip() is None
+        assert b'name="history"' in archive.read("xl/workbook.xml")
+        assert archive.read("xl/worksheets/sheet1.xml").count(b"<row>") == 4
+
+    assert client.get(f"/api/users/{user_id}/export", params={"format": "pdf"}).status_code == 400
+    assert client.get("/api/users/999/export").status_code == 404
+
+
+def test_background_export_file(client, seeded, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "EXPORT_DIR", str(tmp_path))
+    user_id = seeded["user"].id
+
+    run = client.post(f"/api/users/{user_id}/exports", params={"format": "csv"}).json()
+    assert run["params"] == {"user_id": user_id, "format": "csv", "sections": ["lots"]}
+
+    deadline = time.monotonic() + 10
+    response = client.get(f"/api/users/{user_id}/exports/{run['id']}")
+    while response.status_code == 202 and time.monotonic() < deadline:
+        time.sleep(0.01)
+        response = client.get(f"/api/users/{user_id}/exports/{run['id']}")
+
+    assert response.status_code == 200
+    assert response.text == client.get(f"/api/users/{user_id}/export", params={"format": "csv"}).text
+    assert client.get(f"/api/users/{user_id + 1}/exports/{run['id']}").status_code == 404
+
+
+def test_dashboard_stream_requires_existing_user(client):
+    assert client.get("/api/investments/dashboard/999/stream").status_code == 404
+
+
+def test_nav_asof_lookup_and_investment_without_nav(client, seeded, db):
+    alpha, beta, _ = seeded["funds"]
+    today = date.today()
+    nav_on = lambda days_ago: 100.0 + (120 - days_ago) * 0.1  # seeded NAV history
+    # A weekend: no NAV published 10 and 11 days ago
+    db.query(HistoricalNAV).filter(
+        HistoricalNAV.fund_id == alpha.id,
+        HistoricalNAV.date.in_([today - timedelta(days=10), today - timedelta(days=11)])
+    ).delete(synchronize_session=False)
+    db.commit()
+
+    response = client.post("/api/funds/nav-asof", json=[
+        {"fund_id": alpha.id, "as_of": str(today - timedelta(days=10))},
+        {"fund_id": beta.id, "as_of": str(today - timedelta(days=10))},
+        {"fund_id": alpha.id, "as_of": str(today - timedelta(days=200))},
+        {"fund_id": 999999, "as_of": str(today)},
+        {"fund_id": alpha.id, "as_of": str(today + timedelta(days=3))},
+    ])
+    assert response.status_code == 200
+    results = response.json()
+    assert results[0]["nav"] == pytest.approx(nav_on(12))
+    assert results[0]["nav_date"] == str(today - timedelta(days=12))
+    assert results[1]["nav"] == pytest.approx(nav_on(10))
+    assert results[2]["nav"] is None and results[2]["nav_date"] is None
+    assert results[3]["nav"] is None
+    assert results[4]["nav_date"] == str(today)
+
+    created = client.post("/api/investments/", json={
+        "user_id": seeded["user"].id, "fund_id": alpha.id, "amount": 1000.0,
+        "investment_date": str(today - timedelta(days=11)),
+    }).json()
+    assert created["nav_at_investment"] == pytest.approx(nav_on(12))
+    assert created["units"] == pytest.approx(1000.0 / nav_on(12))
+
+    missing = client.post("/api/investments/", json={
+        "user_id": seeded["user"].id, "fund_id": alpha.id, "amount": 1000.0,
+        "investment_date": str(today - timedelta(days=200)),
+    })
+    assert missing.status_code == 400
+
+
+def test_admission_control_sheds_analytics_and_keeps_crud(client, seeded, monkeypatch):
+    user_id = seeded["user"].id
+    # No analytics slots and no queue: every analytics request is shed
+    monkeypatch.setitem(admission.limiters, "analytics", admission.RouteClassLimiter("analytics", 0, 0, 0.1))
+    response = client.get(f"/api/analysis/sector-allocation/{user_id}")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(settings.ADMISSION_RETRY_AFTER_SECONDS)
+    assert client.get(f"/api/funds/{seeded['funds'][0].id}").status_code == 200
+
+    # A saturated pool sheds analytics and exports before their queues, but not CRUD
+    monkeypatch.setitem(admission.limiters, "analytics", admission.RouteClassLimiter("analytics", 8, 8, 0.1))
+    monkeypatch.setattr(admission, "pool_utilization", lambda engine: 1.0)
+    assert client.get(f"/api/investments/dashboard/{user_id}").status_code == 503
+    assert client.get(f"/api/users/{user_id}/export").status_code == 503
+    assert client.get(f"/api/investments/user/{user_id}").status_code == 200
+    assert client.get("/healthz").status_code == 200
+
+    # A full compute pool sheds with the same Retry-After as admission control
+    monkeypatch.setattr(admission, "pool_utilization", lambda engine: 0.0)
+    monkeypatch.setattr(settings, "ADMISSION_RETRY_AFTER_SECONDS", 7)
+    def busy(func, *args, **kwargs):
+        raise ComputePoolBusy("Compute pool has 0 tasks pending")
+    monkeypatch.setattr(compute_pool, "run", busy)
+    response = client.get(f"/api/analysis/sector-allocation/{user_id}")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
+
+
+def test_fund_search_ranks_matches_and_follows_writes(seeded, client):
+    # Seeded before the app starts: the catalog is warmed with the seeded funds
+    alpha, beta, gamma = seeded["funds"]
+    search = lambda q, **params: client.get("/api/funds/search", params=dict(q=q, **params)).json()
+
+    assert [r["id"] for r in search("alp")] == [alpha.id]
+    exact = search("inf000a00002")
+    assert exact[0]["id"] == beta.id and exact[0]["score"] == 1.0
+    # Every ISN shares the prefix; limit caps the result
+    assert len(search("INF000A", limit=2)) == 2
+    # "mid" prefixes Beta's name and "cap" its fund type; Gamma shares only "cap", a weak fuzzy match
+    mid_cap = search("mid cap")
+    assert [r["id"] for r in mid_cap] == [beta.id, gamma.id]
+    assert mid_cap[0]["score"] >= 0.7 > mid_cap[1]["score"]
+    # Typo: no prefix match, found through trigrams
+    fuzzy = search("gama flexi")
+    assert fuzzy[0]["id"] == gamma.id and fuzzy[0]["score"] < 0.7
+    assert search("zzzz") == []
+    assert client.get("/api/funds/search").status_code == 422
+
+    created = client.post("/api/funds/", json={
+        "name": "Delta Liquid Fund", "fund_type": "Liquid", "isn": "INF000A00004", "nav": 1000.0
+    }).json()
+    assert [r["id"] for r in search("delta")] == [created["id"]]
+    client.put(f"/api/funds/{created['id']}", json={
+        "name": "Epsilon Liquid Fund", "fund_type": "Liquid", "isn": "INF000A00004", "nav": 1000.0
+    })
+    assert search("delta") == []
+    assert search("epsilon")[0]["name"] == "Epsilon Liquid Fund"
+
+
+def test_fund_screen_filters_sorts_and_pages(seeded, client, db):
+    alpha, beta, gamma = seeded["funds"]
+    user_id = seeded["user"].id
+    screen = lambda **body: client.post("/api/funds/screen", json=body)
+    ids = lambda response: [item["id"] for item in response.json()["items"]]
+
+    assert ids(screen(fund_types=["Mid Cap"])) == [beta.id]
+    assert ids(screen(nav={"min": 100, "max": 115})) == [gamma.id]
+    # Alpha has 40% technology, Gamma 50%; Beta none
+    assert ids(screen(sectors={"Technology": {"min": 45}})) == [gamma.id]
+    assert ids(screen(sectors={"Technology": {"max": 0}})) == [beta.id]
+    # NAV history starts 119 days ago: 1M returns for all, no 6M returns
+    gainers = screen(returns={"1M": {"min": 0}}, sort_by="return_1M", descending=True).json()
+    assert [item["id"] for item in gainers["items"]] == [alpha.id, gamma.id]
+    assert gainers["items"][0]["returns"]["1M"] == pytest.approx((120.0 / 109.0 - 1) * 100, abs=1e-3)
+    assert gainers["items"][0]["returns"]["6M"] is None
+    assert ids(screen(returns={"6M": {"min": -100}})) == []
+
+    # Keyset pages of one, by NAV
+    pages, cursor = [], None
+    while True:
+        page = screen(sort_by="nav", limit=1, cursor=cursor).json()
+        assert page["total"] == 3
+        pages += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == [beta.id, gamma.id, alpha.id]
+    assert screen(sort_by="name", cursor=screen(sort_by="nav", limit=1).json()["next_cursor"]).status_code == 400
+
+    # Overlap with the portfolio: held funds count as 100; Delta overlaps Beta (as fund_id_2 side) by 25%
+    delta = client.post("/api/funds/", json={
+        "name": "Delta Value Fund", "fund_type": "Value", "isn": "INF000A00004", "nav": 50.0
+    }).json()
+    db.add(FundOverlap(fund_id_1=delta["id"], fund_id_2=beta.id, overlap_percentage=25.0, overlapping_stocks=1))
+    db.commit()
+    low_overlap = screen(overlap_user_id=user_id, overlap={"max": 50}).json()["items"]
+    assert [(item["id"], item["overlap"]) for item in low_overlap] == [(delta["id"], 25.0)]
+    assert ids(screen(overlap_user_id=user_id, sort_by="overlap", limit=2)) == [delta["id"], alpha.id]
+
+    assert screen(sort_by="bogus").status_code == 400
+    assert screen(overlap={"max": 50}).status_code == 400
+    assert screen(market_cap={"Giant Cap": {"min": 1}}).status_code == 400
+    assert screen(overlap_user_id=999999).status_code == 404
+
+
+def test_list_endpoints_project_requested_fields(client, seeded):
+    user_id = seeded["user"].id
+    funds = client.get("/api/funds/", params={"fields": "id,nav"}).json()
+    assert [sorted(fund) for fund in funds] == [["id", "nav"]] * 3
+    lots = client.get(f"/api/investments/user/{user_id}", params={"fields": "fund_id, investment_date"}).json()
+    assert {lot["investment_date"] for lot in lots} == {
+        str(date.today() - timedelta(days=days)) for days in (100, 60, 20)
+    }
+    assert set(lots[0]) == {"fund_id", "investment_date"}
+    users = client.get("/api/users/", params={"fields": "email"}).json()
+    assert users == [{"email": "test@example.com"}]
+
+    # Without fields, whole rows go through the response model as before
+    full = client.get(f"/api/investments/user/{user_id}").json()
+    assert len(full) == 3 and full[0]["units"] > 0 and "fund_name" in full[0]
+    response = client.get("/api/funds/", params={"fields": "id,password"})
+    assert response.status_code == 400 and "password" in response.json()["detail"]
+
+
+def test_user_investments_enriched_sorted_and_paged(client, seeded):
+    user_id = seeded["user"].id
+    alpha, beta, gamma = (fund.id for fund in seeded["funds"])
+    lots = client.get(f"/api/investments/user/{user_id}", params={"sort_by": "current_value"}).json()
+    assert [(lot["fund_name"], lot["current_value"]) for lot in lots] == [
+        ("Gamma Flexi Cap Fund", 2200.0), ("Beta Midcap Fund", 4500.0), ("Alpha Bluechip Fund", 12000.0)
+    ]
+    assert [lot["return_percentage"] for lot in lots] == pytest.approx([10.0, -10.0, 20.0])
+
+    # Keyset pages by return, best first; the cursor travels in a header
+    params = {"sort_by": "return_percentage", "descending": True, "limit": 2, "fields": "fund_id"}
+    first = client.get(f"/api/investments/user/{user_id}", params=params)
+    assert first.json() == [{"fund_id": alpha}, {"fund_id": gamma}]
+    cursor = first.headers["X-Next-Cursor"]
+    second = client.get(f"/api/investments/user/{user_id}", params={**params, "cursor": cursor})
+    assert second.json() == [{"fund_id": beta}] and "X-Next-Cursor" not in second.headers
+    mismatched = client.get(f"/api/investments/user/{user_id}", params={"sort_by": "amount", "cursor": cursor})
+    assert mismatched.status_code == 400
+    assert client.get(f"/api/investments/user/{user_id}", params={"sort_by": "units"}).status_code == 400
+
+    # A second lot in Beta is folded into its fund row
+    client.post("/api/investments/", json={"user_id": user_id, "fund_id": beta, "amount": 900.0,
+                                           "investment_date": str(date.today()), "nav_at_investment": 90.0})
+    by_fund = client.get(f"/api/investments/user/{user_id}/by-fund").json()
+    assert [row["fund_id"] for row in by_fund] == [alpha, beta, gamma]
+    assert by_fund[1]["units"] == pytest.approx(60.0)
+    assert by_fund[1]["invested"] == pytest.approx(5900.0)
+    assert by_fund[1]["current_value"] == pytest.approx(5400.0)
+    by_return = client.get(f"/api/investments/user/{user_id}/by-fund",
+                           params={"sort_by": "return_percentage", "descending": False}).json()
+    assert by_return[0]["fund_id"] == beta
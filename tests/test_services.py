@@ -0,0 +1,772 @@
+import asyncio
+import io
+import os
+import re
+import threading
+import time
+import zipfile
+
+import pytest
+from sqlalchemy import create_engine, event, false, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Query, Session, sessionmaker
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from prometheus_client import REGISTRY
+
+from app import crud, schemas
+from app.admission import RouteClassLimiter, route_class
+from app.crud import investment as investment_crud
+from app.database import engine, Base, ReplicaSet, RoutingSession, SessionLocal
+from app.models import (FundOverlap, HistoricalNAV, JobRun, MonthlyNAV, MutualFund, UserPortfolioValue, UserPosition,
+                        WeeklyNAV)
+from app.schemas import InvestmentCreate, MutualFundCreate, SipPlanCreate, UserCreate
+from app.services.export import stream_xlsx
+from app.services.fund_cache import FundMetadataCache, fund_cache
+from app.services.group_commit import group_commit
+from app.services.jobs import CronSchedule, JobScheduler
+from app.services.analytics import sip_schedule, weighted_sector_allocation
+from app.services.live import DashboardHub, Subscriber
+from app.services.nav_asof import nav_asof
+from app.services.compute import ComputePool, ComputePoolBusy, ComputeTimeout, compute_pool
+from app.services.single_flight import SingleFlight
+
+# Tables that grow with users and history; a full scan on any of them is a regression
+HOT_TABLES = {"user_investments", "user_positions", "historical_nav", "nav_weekly", "nav_monthly",
+              "fund_sector_allocations", "fund_overlaps"}
+
+
+def _capture_statements(bind, func, *args, **kwargs):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(bind, "before_cursor_execute", before_cursor_execute)
+    try:
+        func(*args, **kwargs)
+    finally:
+        event.remove(bind, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+def _sqlite_full_scans(statement, parameters):
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    scans = []
+    for row in plan:
+        # SQLite reports both table scans and full index scans as "SCAN <table> ..."
+        match = re.match(r"SCAN (\w+)", row[-1])
+        if match and match.group(1) in HOT_TABLES:
+            scans.append(row[-1])
+    return scans
+
+
+HOT_QUERIES = [
+    ("get_user_investments", lambda db, s: crud.get_user_investments(db, user_id=s["user"].id)),
+    ("list_user_investments_by_value", lambda db, s: crud.list_user_investments(
+        db, user_id=s["user"].id, sort_by="current_value", descending=True, limit=2)),
+    ("get_user_investments_by_fund", lambda db, s: crud.get_user_investments_by_fund(db, user_id=s["user"].id)),
+    ("get_investment_summary", lambda db, s: crud.get_investment_summary(db, user_id=s["user"].id)),
+    ("get_performance_extremes", lambda db, s: crud.get_performance_extremes(db, user_id=s["user"].id)),
+    ("get_historical_performance_1M",
+     lambda db, s: crud.get_historical_performance(db, user_id=s["user"].id, period="1M")),
+    ("get_historical_performance_3M",
+     lambda db, s: crud.get_historical_performance(db, user_id=s["user"].id, period="3M")),
+    ("get_historical_performance_6M",
+     lambda db, s: crud.get_historical_performance(db, user_id=s["user"].id, period="6M")),
+    ("get_historical_performance_1Y",
+     lambda db, s: crud.get_historical_performance(db, user_id=s["user"].id, period="1Y")),
+    ("get_historical_performance_3Y",
+     lambda db, s: crud.get_historical_performance(db, user_id=s["user"].id, period="3Y")),
+    ("get_historical_performance_MAX",
+     lambda db, s: crud.get_historical_performance(db, user_id=s["user"].id, period="MAX")),
+    ("get_portfolio_sector_allocation",
+     lambda db, s: crud.get_portfolio_sector_allocation(db, user_id=s["user"].id)),
+    ("get_fund_overlap",
+     lambda db, s: crud.get_fund_overlap(db, fund1_id=s["funds"][2].id, fund2_id=s["funds"][0].id)),
+    ("get_all_fund_overlaps", lambda db, s: crud.get_all_fund_overlaps(db, user_id=s["user"].id)),
+    ("get_portfolio_overlaps", lambda db, s: crud.get_portfolio_overlaps(db, user_id=s["user"].id)),
+]
+
+
+@pytest.mark.parametrize("name,query", HOT_QUERIES, ids=[name for name, _ in HOT_QUERIES])
+def test_hot_queries_use_indexes_on_sqlite(db, seeded, name, query):
+    statements = _capture_statements(engine, query, db, seeded)
+    assert statements, f"{name} issued no SELECT statements"
+
+    for statement, parameters in statements:
+        scans = _sqlite_full_scans(statement, parameters)
+        assert not scans, f"{name} falls back to a full scan ({scans}) for:\n{statement}"
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL not set")
+def test_hot_queries_use_indexes_on_postgres():
+    """Compile each hot query for PostgreSQL and check the plan has no Seq Scan on hot tables.
+
+    Seq scans are disabled so the planner only falls back to one when no index applies.
+    """
+    from sqlalchemy.orm import Session
+
+    from tests.conftest import seed_portfolio
+
+    pg_engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    Base.metadata.drop_all(bind=pg_engine)
+    Base.metadata.create_all(bind=pg_engine)
+    try:
+        with Session(pg_engine) as pg_db:
+            seeded = seed_portfolio(pg_db)
+            for name, query in HOT_QUERIES:
+                statements = _capture_statements(pg_engine, query, pg_db, seeded)
+                with pg_engine.connect() as conn:
+                    conn.execute(text("SET enable_seqscan = off"))
+                    for statement, parameters in statements:
+                        plan = conn.exec_driver_sql(f"EXPLAIN {statement}", parameters).fetchall()
+                        plan_text = "\n".join(row[0] for row in plan)
+                        for table in HOT_TABLES:
+                            assert f"Seq Scan on {table}" not in plan_text, (
+                                f"{name} falls back to a sequential scan on {table}:\n{plan_text}"
+                            )
+    finally:
+        Base.metadata.drop_all(bind=pg_engine)
+        pg_engine.dispose()
+
+
+def test_fund_cache_serves_names_and_tracks_writes(db, seeded):
+    first, second, _ = seeded["funds"]
+    fund_cache.load(db)
+
+    statements = _capture_statements(engine, crud.get_fund_overlap, db, fund1_id=first.id, fund2_id=second.id)
+    assert len(statements) == 1
+
+    crud.update_fund(db, fund_id=first.id, fund=MutualFundCreate(
+        name="Alpha Renamed Fund", fund_type=first.fund_type, isn=first.isn, nav=150.0
+    ))
+    assert fund_cache.get(db, first.id).nav == 150.0
+    assert fund_cache.get_by_isn(db, first.isn).name == "Alpha Renamed Fund"
+    assert crud.get_fund_overlap(db, fund1_id=second.id, fund2_id=first.id)["fund_name_1"] == "Alpha Renamed Fund"
+
+    created = crud.create_fund(db, MutualFundCreate(name="Delta Index Fund", fund_type="Index", isn="INF000A00009", nav=10.0))
+    assert fund_cache.get_by_isn(db, "INF000A00009").id == created.id
+    crud.delete_fund(db, fund_id=created.id)
+    assert fund_cache.get_by_isn(db, "INF000A00009") is None
+
+
+def test_fund_cache_follows_writes_from_other_workers(db, seeded):
+    first = seeded["funds"][0]
+    # Another worker's cache: the write hooks below only update the shared fund_cache
+    other = FundMetadataCache(version_check_seconds=0.0)
+    other.load(db)
+
+    crud.update_fund(db, fund_id=first.id, fund=MutualFundCreate(
+        name=first.name, fund_type=first.fund_type, isn=first.isn, nav=130.0
+    ))
+    assert other.get(db, first.id).nav == 130.0
+    crud.ingest_navs(db, [schemas.NavUpdate(fund_id=first.id, nav=131.0, nav_date=date.today())])
+    assert other.get(db, first.id).nav == 131.0
+
+    # Between version checks, a fund created elsewhere is still found by ISN
+    other.version_check_seconds = 3600.0
+    created = crud.create_fund(db, MutualFundCreate(name="Epsilon Fund", fund_type="Index", isn="INF000A00010", nav=10.0))
+    assert other.get_by_isn(db, "INF000A00010").id == created.id
+
+
+def test_read_sessions_route_to_replica_until_first_write(tmp_path):
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    for bind, name in ((primary, "Primary Fund"), (replica, "Replica Fund")):
+        Base.metadata.create_all(bind=bind)
+        with bind.begin() as conn:
+            conn.execute(MutualFund.__table__.insert(), {"name": name, "fund_type": "Index", "isn": "INF0", "nav": 1.0})
+
+    factory = sessionmaker(class_=RoutingSession, primary=primary, replicas=ReplicaSet([replica]))
+    with factory() as session:
+        assert session.query(MutualFund.name).scalar() == "Replica Fund"
+
+        session.add(MutualFund(name="New Fund", fund_type="Index", isn="INF1", nav=1.0))
+        session.commit()
+        # Read-after-write in the same session must see the primary
+        assert session.query(MutualFund.name).order_by(MutualFund.id).first().name == "Primary Fund"
+        assert session.query(MutualFund).count() == 2
+
+    lagging = ReplicaSet([replica], strategy="lag_aware", max_lag_seconds=5.0, lag_probe=lambda engine: 30.0)
+    with sessionmaker(class_=RoutingSession, primary=primary, replicas=lagging)() as session:
+        assert session.query(MutualFund.name).order_by(MutualFund.id).first().name == "Primary Fund"
+
+    primary.dispose()
+    replica.dispose()
+
+
+def test_replica_set_round_robin():
+    replicas = ReplicaSet(["a", "b", "c"], strategy="round_robin")
+    assert [replicas.choose() for _ in range(6)] == ["a", "b", "c", "a", "b", "c"]
+
+    lags = {"a": 0.5, "b": None, "c": 12.0}
+    aware = ReplicaSet(["a", "b", "c"], strategy="lag_aware", max_lag_seconds=5.0, lag_probe=lags.get)
+    assert {aware.choose() for _ in range(4)} == {"a"}
+
+
+def test_cron_schedule_parsing_and_next_run():
+    schedule = CronSchedule("*/15 2-3 * * 1,3")
+    assert schedule.minutes == {0, 15, 30, 45}
+    assert schedule.hours == {2, 3}
+    assert schedule.weekdays == {1, 3}
+    # 2026-10-19 is a Monday
+    assert schedule.matches(datetime(2026, 10, 19, 2, 30))
+    assert not schedule.matches(datetime(2026, 10, 20, 2, 30))
+    assert schedule.next_after(datetime(2026, 10, 19, 3, 50)) == datetime(2026, 10, 21, 2, 0)
+
+    with pytest.raises(ValueError):
+        CronSchedule("61 * * * *")
+
+
+def test_cron_schedule_ors_restricted_day_fields():
+    # Both day fields restricted: the 1st of the month or any Monday, as in cron
+    either = CronSchedule("0 6 1 * 1")
+    assert either.matches(datetime(2026, 10, 19, 6, 0))  # a Monday
+    assert either.matches(datetime(2026, 10, 1, 6, 0))  # a Thursday
+    assert not either.matches(datetime(2026, 10, 20, 6, 0))
+    assert either.next_after(datetime(2026, 10, 19, 7, 0)) == datetime(2026, 10, 26, 6, 0)
+    assert either.next_after(datetime(2026, 10, 27, 7, 0)) == datetime(2026, 11, 1, 6, 0)
+    # With either field "*" the other alone decides
+    assert not CronSchedule("0 6 1 * *").matches(datetime(2026, 10, 19, 6, 0))
+    assert not CronSchedule("0 6 * * 1").matches(datetime(2026, 10, 1, 6, 0))
+    # The next Monday on an odd day of the month
+    assert CronSchedule("0 6 */2 * 1").next_after(datetime(2026, 10, 19, 7, 0)) == datetime(2026, 11, 9, 6, 0)
+
+
+def test_job_lock_allows_one_run_at_a_time(db):
+    first, second = JobScheduler(), JobScheduler()
+    second.owner = "other-worker"
+    for scheduler in (first, second):
+        scheduler.job("exclusive")(lambda ctx: None)
+
+    job = first.jobs["exclusive"]
+    assert first._acquire_lock(job)
+    assert not second._acquire_lock(second.jobs["exclusive"])
+    first._release_lock(job)
+    assert second._acquire_lock(second.jobs["exclusive"])
+
+    # A scheduled tick that loses the lock records no run; a manual one is recorded as skipped
+    runs = db.query(JobRun).filter(JobRun.job_name == "exclusive")
+    assert first.trigger("exclusive", trigger="schedule") is None
+    assert runs.count() == 0
+    skipped = first.trigger("exclusive")
+    assert db.get(JobRun, skipped).status == "skipped"
+    second._release_lock(second.jobs["exclusive"])
+    ran = first.trigger("exclusive", trigger="schedule")
+    assert db.get(JobRun, ran).status == "succeeded"
+
+
+def test_compute_pool_offloads_with_timeout_and_backpressure():
+    pool = ComputePool(workers=1, max_pending=1, timeout_seconds=5.0, min_rows=10)
+    assert pool.run(sum, [1, 2, 3]) == 6  # not started: inline
+    pool.start()
+    try:
+        rows = [(1, "Financial", 60.0), (1, "Technology", 40.0)]
+        assert pool.run(weighted_sector_allocation, {1: 100.0}, rows, rows=100) == \
+            weighted_sector_allocation({1: 100.0}, rows)
+
+        with pytest.raises(ComputeTimeout):
+            pool.run(time.sleep, 1.0, rows=100, timeout=0.05)
+        # The timed-out task still occupies the only slot until it finishes
+        with pytest.raises(ComputePoolBusy):
+            pool.run(time.sleep, 0, rows=100)
+        # Small inputs bypass the pool (and its queue limit) entirely
+        assert pool.run(sum, [1, 2], rows=2) == 3
+    finally:
+        pool.shutdown()
+
+
+def test_sector_allocation_is_identical_through_the_pool(db, seeded, monkeypatch):
+    user_id = seeded["user"].id
+    inline = crud.get_portfolio_sector_allocation(db, user_id=user_id)
+    assert [row["sector"] for row in inline] == ["Financial", "Technology", "Healthcare", "Energy"]
+
+    monkeypatch.setattr(compute_pool, "workers", 1)
+    monkeypatch.setattr(compute_pool, "min_rows", 0)
+    compute_pool.start()
+    try:
+        assert crud.get_portfolio_sector_allocation(db, user_id=user_id) == inline
+    finally:
+        compute_pool.shutdown()
+
+
+def test_dashboard_hub_pushes_nav_and_investment_deltas(db, seeded, monkeypatch):
+    hub = DashboardHub()
+    monkeypatch.setattr("app.crud.fund.dashboard_hub", hub)
+    monkeypatch.setattr("app.crud.investment.dashboard_hub", hub)
+    user_id = seeded["user"].id
+    alpha, beta, gamma = seeded["funds"]
+
+    async def scenario():
+        subscriber = Subscriber(asyncio.get_running_loop())
+        hub.subscribe(db, user_id, subscriber)
+        snapshot = await subscriber.queue.get()
+        assert snapshot["current_investment_value"] == 100 * 120.0 + 50 * 90.0 + 20 * 110.0
+
+        crud.update_fund(db, alpha.id, MutualFundCreate(name=alpha.name, fund_type=alpha.fund_type,
+                                                        isn=alpha.isn, nav=125.0))
+        update = await asyncio.wait_for(subscriber.queue.get(), 1)
+        assert update["type"] == "nav"
+        assert update["current_investment_value"] == snapshot["current_investment_value"] + 100 * 5.0
+        # Alpha is 60% Financial, 40% Technology
+        assert {change["sector"] for change in update["sector_changes"]} == {"Financial", "Technology"}
+
+        crud.create_investment(db, InvestmentCreate(user_id=user_id, fund_id=beta.id, amount=900.0,
+                                                    investment_date=date.today(), nav_at_investment=90.0))
+        reloaded = await asyncio.wait_for(subscriber.queue.get(), 1)
+        assert reloaded["type"] == "snapshot"
+        assert reloaded["initial_investment_value"] == 17900.0
+
+        hub.unsubscribe(user_id, subscriber)
+        assert hub.subscriber_count() == 0 and not hub._fund_users
+
+    asyncio.run(scenario())
+
+
+def test_dashboard_hub_fan_out_is_limited_to_holders(db, seeded):
+    hub = DashboardHub()
+    alpha = seeded["funds"][0]
+    other = crud.create_user(db, UserCreate(name="Other", email="other@example.com"))
+
+    async def scenario():
+        subscriber = Subscriber(asyncio.get_running_loop())
+        hub.subscribe(db, other.id, subscriber)
+        await subscriber.queue.get()
+        assert alpha.id not in hub._fund_users
+        hub.fund_nav_changed(alpha.id, 130.0)
+        await asyncio.sleep(0)
+        assert subscriber.queue.empty()
+
+    asyncio.run(scenario())
+
+
+def test_portfolio_values_follow_nav_changes_for_holders_only(db, seeded, monkeypatch):
+    user_id = seeded["user"].id
+    alpha, beta, gamma = seeded["funds"]
+    other = crud.create_user(db, UserCreate(name="Other", email="other@example.com"))
+    crud.create_investment(db, InvestmentCreate(user_id=other.id, fund_id=beta.id, amount=900.0,
+                                                investment_date=date.today(), nav_at_investment=90.0))
+    assert crud.get_investment_summary(db, user_id) == (100 * 120.0 + 50 * 90.0 + 20 * 110.0, 17000.0)
+
+    crud.update_fund(db, alpha.id, MutualFundCreate(name=alpha.name, fund_type=alpha.fund_type,
+                                                    isn=alpha.isn, nav=125.0))
+    assert crud.get_investment_summary(db, user_id)[0] == pytest.approx(100 * 125.0 + 50 * 90.0 + 20 * 110.0)
+    assert crud.get_investment_summary(db, other.id) == pytest.approx((900.0, 900.0))
+
+    result = crud.ingest_navs(db, [
+        schemas.NavUpdate(fund_id=beta.id, nav=95.0, nav_date=date.today()),
+        schemas.NavUpdate(fund_id=gamma.id, nav=100.0, nav_date=date.today()),
+        schemas.NavUpdate(fund_id=999999, nav=1.0, nav_date=date.today()),
+    ])
+    assert result == {"navs_recorded": 2, "funds_updated": 2, "portfolios_updated": 2, "unknown_funds": 1}
+    expected = 100 * 125.0 + 50 * 95.0 + 20 * 100.0
+    assert crud.get_investment_summary(db, user_id)[0] == pytest.approx(expected)
+    assert crud.get_investment_summary(db, other.id)[0] == pytest.approx(10 * 95.0)
+
+    assert crud.rebuild_portfolio_values(db) == 2
+    assert crud.get_investment_summary(db, user_id)[0] == pytest.approx(expected)
+
+    # Without a row the summary is totalled from positions, and the read does not create one
+    db.query(UserPortfolioValue).filter(UserPortfolioValue.user_id == user_id).delete()
+    db.commit()
+    assert crud.get_investment_summary(db, user_id)[0] == pytest.approx(expected)
+    assert db.get(UserPortfolioValue, user_id) is None
+
+    # The nightly rebuild reconciles in place, a batch of users at a time: missing
+    # rows are inserted, drifted ones corrected and rows without positions removed
+    idle = crud.create_user(db, UserCreate(name="Idle", email="idle@example.com")).id
+    db.add(UserPortfolioValue(user_id=idle, current_value=1.0, cost=1.0))
+    db.get(UserPortfolioValue, other.id).current_value = 1.0
+    db.commit()
+    monkeypatch.setattr(investment_crud, "PORTFOLIO_BATCH_USERS", 1)
+    assert crud.rebuild_portfolio_values(db) == 2
+    values = {row.user_id: row.current_value for row in db.query(UserPortfolioValue).populate_existing()}
+    assert values == {user_id: pytest.approx(expected), other.id: pytest.approx(10 * 95.0)}
+
+
+def test_nav_rollups_follow_ingested_navs(db, seeded):
+    alpha, beta, gamma = seeded["funds"]
+    today = date.today()
+    monday = today - timedelta(days=today.weekday())
+    weekly = db.query(WeeklyNAV).filter(WeeklyNAV.fund_id == alpha.id, WeeklyNAV.period_start == monday).one()
+    assert (weekly.date, weekly.nav) == (today, pytest.approx(112.0))
+    # 120 daily NAVs per fund fold into at most 19 weeks and 5 months
+    assert db.query(WeeklyNAV).count() <= 3 * 19 and db.query(MonthlyNAV).count() <= 3 * 5
+
+    crud.ingest_navs(db, [
+        schemas.NavUpdate(fund_id=beta.id, nav=95.0, nav_date=today),
+        # A late NAV for an earlier day keeps the period's latest one
+        schemas.NavUpdate(fund_id=gamma.id, nav=50.0, nav_date=today - timedelta(days=1)),
+        schemas.NavUpdate(fund_id=alpha.id, nav=80.0, nav_date=today - timedelta(days=400)),
+    ])
+
+    def rollups():
+        return [(model.__tablename__, row.fund_id, row.period_start, row.date, row.nav)
+                for model in (WeeklyNAV, MonthlyNAV)
+                for row in db.query(model).order_by(model.fund_id, model.period_start)]
+
+    incremental = rollups()
+    assert ("nav_weekly", beta.id, monday, today, 95.0) in incremental
+    assert ("nav_weekly", gamma.id, monday, today, pytest.approx(112.0)) in incremental
+    assert any(row[1] == alpha.id and row[3] == today - timedelta(days=400) for row in incremental)
+    crud.rebuild_nav_rollups(db)
+    assert rollups() == incremental
+
+    # Long periods read the rollups; the last point values each lot at today's NAV
+    yearly = crud.get_historical_performance(db, seeded["user"].id, period="1Y")
+    assert 14 <= len(yearly) <= 16
+    assert yearly[-1] == {"date": today.strftime("%d %b"), "value": pytest.approx(100 * 112.0 + 50 * 95.0 + 20 * 112.0)}
+    monthly = crud.get_historical_performance(db, seeded["user"].id, period="MAX")
+    assert len(monthly) <= 5 and monthly[-1] == yearly[-1]
+
+
+def test_positions_follow_investment_writes(db, seeded):
+    user_id = seeded["user"].id
+    alpha, beta, gamma = seeded["funds"]
+    today = date.today()
+
+    def position(fund_id):
+        return {p.fund_id: p for p in crud.get_user_positions(db, user_id)}.get(fund_id)
+
+    lot = crud.create_investment(db, InvestmentCreate(user_id=user_id, fund_id=beta.id, amount=1000.0,
+                                                      investment_date=today, nav_at_investment=80.0))
+    assert position(beta.id).units == pytest.approx(50 + 12.5)
+    assert position(beta.id).cost == 6000.0
+    assert position(beta.id).avg_nav == pytest.approx(6000.0 / 62.5)
+    assert (position(beta.id).min_nav, position(beta.id).last_investment_date) == (80.0, today)
+
+    # Moving the lot to another fund rebuilds both positions
+    crud.update_investment(db, lot.id, InvestmentCreate(user_id=user_id, fund_id=gamma.id, amount=1000.0,
+                                                        investment_date=today, nav_at_investment=80.0))
+    assert position(beta.id).units == pytest.approx(50) and position(beta.id).min_nav == 100.0
+    assert position(gamma.id).units == pytest.approx(20 + 12.5)
+
+    crud.delete_investment(db, lot.id)
+    alpha_lot = crud.get_user_investments(db, user_id)[0]
+    crud.delete_investment(db, alpha_lot.id)
+    assert position(alpha_lot.fund_id) is None
+    assert crud.verify_positions(db) == []
+
+    position(beta.id).units = 1.0
+    db.commit()
+    assert crud.verify_positions(db) == [{"user_id": user_id, "fund_id": beta.id, "problem": "stale"}]
+    assert crud.rebuild_positions(db) == 2
+    assert crud.verify_positions(db) == []
+
+
+def test_first_lot_folds_into_a_position_created_concurrently(db, seeded, monkeypatch):
+    user_id = seeded["user"].id
+    beta = seeded["funds"][1]
+    # The position lookup misses, as it does when another worker inserts the
+    # fund's first lot after it; the position insert then hits the primary key
+    get = Session.get
+    misses = []
+
+    def racing_get(session, entity, ident, **kwargs):
+        if entity is UserPosition and not misses:
+            misses.append(ident)
+            return None
+        return get(session, entity, ident, **kwargs)
+
+    monkeypatch.setattr(Session, "get", racing_get)
+    crud.create_investment(db, InvestmentCreate(user_id=user_id, fund_id=beta.id, amount=1000.0,
+                                                investment_date=date.today(), nav_at_investment=80.0))
+    monkeypatch.undo()
+
+    assert misses == [(user_id, beta.id)]
+    position = {p.fund_id: p for p in crud.get_user_positions(db, user_id)}[beta.id]
+    db.refresh(position)
+    assert position.units == pytest.approx(50 + 12.5)
+    assert position.cost == 6000.0
+    assert crud.verify_positions(db) == []
+
+
+def test_bulk_lots_fold_into_positions_created_concurrently(db, seeded, monkeypatch):
+    user_id = seeded["user"].id
+    alpha, beta, _ = seeded["funds"]
+    other = crud.create_user(db, UserCreate(name="Other", email="other@example.com")).id
+    # The position lookup misses the seeded alpha position, as it does when a
+    # concurrent first lot creates it after the lookup: the bulk insert then fails
+    with_for_update = Query.with_for_update
+    misses = []
+
+    def racing_lookup(query, *args, **kwargs):
+        if not misses:
+            misses.append(query)
+            query = query.filter(false())
+        return with_for_update(query, *args, **kwargs)
+
+    monkeypatch.setattr(Query, "with_for_update", racing_lookup)
+    today = np.array([date.today()], dtype="datetime64[D]")
+    crud.add_lots_in_bulk(db, np.array([user_id, other]), np.array([alpha.id, beta.id]),
+                          np.repeat(today, 2), np.array([1200.0, 900.0]), np.array([120.0, 90.0]))
+    db.commit()
+    monkeypatch.undo()
+
+    assert len(misses) == 1
+    positions = {(p.user_id, p.fund_id): p for p in db.query(UserPosition).populate_existing()}
+    assert positions[(user_id, alpha.id)].units == pytest.approx(100 + 10)
+    assert positions[(user_id, alpha.id)].cost == 11200.0
+    assert positions[(other, beta.id)].units == pytest.approx(10)
+    assert crud.verify_positions(db) == []
+
+
+def test_portfolio_values_are_refreshed_in_place(db, seeded, monkeypatch):
+    user_id = seeded["user"].id
+    alpha, beta, _ = seeded["funds"]
+    other = crud.create_user(db, UserCreate(name="Other", email="other@example.com")).id
+    idle = crud.create_user(db, UserCreate(name="Idle", email="idle@example.com")).id
+    db.add(UserPortfolioValue(user_id=idle, current_value=5.0, cost=5.0))
+    db.commit()
+
+    # The existing-row lookup misses the seeded user's row, as it does when a
+    # concurrent write inserts it after the lookup: the bulk insert then fails
+    # and every missing row is taken one at a time
+    scalars = Session.scalars
+    misses = []
+
+    def racing_scalars(session, statement, *args, **kwargs):
+        if not misses:
+            misses.append(statement)
+            return iter([])
+        return scalars(session, statement, *args, **kwargs)
+
+    monkeypatch.setattr(Session, "scalars", racing_scalars)
+    today = np.array([date.today()], dtype="datetime64[D]")
+    crud.add_lots_in_bulk(db, np.array([user_id, other]), np.array([alpha.id, beta.id]),
+                          np.repeat(today, 2), np.array([1200.0, 900.0]), np.array([120.0, 90.0]))
+    db.commit()
+    monkeypatch.undo()
+    # Rows of users without positions are dropped
+    assert crud.refresh_portfolio_values(db, [idle]) == 0
+    db.commit()
+
+    assert len(misses) == 1 and "user_portfolio_values" in str(misses[0])
+    values = {row.user_id: row for row in db.query(UserPortfolioValue).populate_existing()}
+    assert set(values) == {user_id, other}
+    assert (values[user_id].current_value, values[user_id].cost) == pytest.approx(
+        (110 * 120.0 + 50 * 90.0 + 20 * 110.0, 18200.0))
+    assert (values[other].current_value, values[other].cost) == pytest.approx((900.0, 900.0))
+
+
+def test_xlsx_writes_non_finite_floats_as_blank_cells():
+    workbook = io.BytesIO(b"".join(stream_xlsx([
+        ("returns", ["fund", "xirr", "ratio", "units"], [["Alpha", float("nan"), float("inf"), 12.5]]),
+    ])))
+    with zipfile.ZipFile(workbook) as archive:
+        sheet = archive.read("xl/worksheets/sheet1.xml").decode()
+    assert "nan" not in sheet and "inf" not in sheet
+    assert "<row><c t=\"inlineStr\"><is><t>Alpha</t></is></c><c/><c/><c><v>12.5</v></c></row>" in sheet
+
+
+def test_sip_schedule_clamps_to_month_end():
+    plans, dates = sip_schedule(
+        np.array(["2024-01-31", "2024-03-15", "2024-05-01"], dtype="datetime64[D]"),
+        np.array(["2024-06-30", "2024-09-14", "2024-04-01"], dtype="datetime64[D]"),
+        np.array([1, 3, 1])
+    )
+    assert plans.tolist() == [0, 0, 0, 0, 0, 0, 1, 1]
+    assert dates.astype(str).tolist() == [
+        "2024-01-31", "2024-02-29", "2024-03-31", "2024-04-30", "2024-05-31", "2024-06-30",
+        "2024-03-15", "2024-06-15"
+    ]
+
+
+def test_sip_plans_materialize_lots_in_bulk(db, seeded):
+    user_id = seeded["user"].id
+    alpha, beta, _ = seeded["funds"]
+    today = date.today()
+    nav_on = lambda day: 100.0 + (120 - (today - day).days) * 0.1  # seeded NAV history
+
+    plan = crud.create_sip_plan(db, SipPlanCreate(user_id=user_id, fund_id=beta.id, amount=500.0,
+                                                  start_date=today - timedelta(days=100)))
+    # Starts before alpha's first NAV, so nothing is materialized until its NAV history reaches back
+    early = crud.create_sip_plan(db, SipPlanCreate(user_id=user_id, fund_id=alpha.id, amount=1000.0,
+                                                   frequency="quarterly", start_date=today - timedelta(days=300)))
+    assert plan.materialized_through == today
+    assert early.materialized_through == today - timedelta(days=301)
+
+    lots = [lot for lot in crud.get_user_investments(db, user_id) if lot.sip_plan_id == plan.id]
+    assert len(lots) >= 3
+    for lot in lots:
+        assert lot.nav_at_investment == pytest.approx(nav_on(lot.investment_date))
+        assert lot.units == pytest.approx(500.0 / lot.nav_at_investment)
+    assert not [lot for lot in crud.get_user_investments(db, user_id) if lot.sip_plan_id == early.id]
+
+    assert crud.verify_positions(db) == []
+    summary = crud.get_investment_summary(db, user_id)
+    assert summary[1] == pytest.approx(17000.0 + 500.0 * len(lots))
+    assert crud.materialize_sip_plans(db)["lots_created"] == 0
+
+    # Backfilled history prices the held-back instalments on the next run
+    db.add_all(HistoricalNAV(fund_id=alpha.id, date=today - timedelta(days=days_ago), nav=90.0)
+               for days_ago in range(121, 301))
+    db.commit()
+    nav_asof.invalidate([alpha.id])
+    assert crud.materialize_sip_plans(db)["instalments_without_nav"] == 0
+    early_lots = [lot for lot in crud.get_user_investments(db, user_id) if lot.sip_plan_id == early.id]
+    assert early_lots[0].investment_date == today - timedelta(days=300)
+    assert len(early_lots) == 4
+    db.refresh(early)
+    assert early.materialized_through == today
+    assert crud.verify_positions(db) == []
+
+    with pytest.raises(ValueError):
+        crud.create_sip_plan(db, SipPlanCreate(user_id=user_id, fund_id=beta.id, amount=500.0,
+                                               frequency="fortnightly", start_date=today))
+    assert crud.delete_sip_plan(db, plan.id)
+    assert len(crud.get_user_investments(db, user_id)) == 3 + len(lots) + len(early_lots)
+
+
+def test_route_class_limiter_queues_then_sheds():
+    async def scenario():
+        limiter = RouteClassLimiter("test", concurrency=1, max_queue=1, queue_timeout=0.05)
+        assert await limiter.acquire() is None
+        queued = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.queued == 1
+        # Queue full: rejected without waiting
+        assert await limiter.acquire() == "queue_full"
+
+        limiter.release()
+        assert await queued is None
+        assert limiter.active == 1
+        # Nobody releases, so the next waiter times out
+        assert await limiter.acquire() == "timeout"
+        limiter.release()
+        assert limiter.active == 0 and limiter.queued == 0
+
+    asyncio.run(scenario())
+    assert route_class("/api/analysis/sector-allocation/1") == "analytics"
+    assert route_class("/api/investments/dashboard/1") == "analytics"
+    assert route_class("/api/investments/dashboard/1/stream") is None
+    assert route_class("/api/users/1/exports/7") == "exports"
+    assert route_class("/api/funds/1") == "crud"
+    assert route_class("/healthz") is None
+
+
+def test_single_flight_shares_one_call_between_concurrent_callers():
+    flight = SingleFlight(enabled=True)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute(user_id):
+        calls.append(user_id)
+        started.set()
+        release.wait(5)
+        return {"user_id": user_id}
+
+    def followers_joined():
+        return REGISTRY.get_sample_value("single_flight_requests_total", {"route": "test", "role": "follower"}) or 0
+
+    joined_before = followers_joined()
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("test", 1, compute, 1)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("test", 1, compute, 1)))
+                 for _ in range(4)]
+    for thread in followers:
+        thread.start()
+    # A different key is not coalesced
+    assert flight.do("test", 2, lambda user_id: user_id, 2) == 2
+    while followers_joined() < joined_before + 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert calls == [1]
+    assert len(results) == 5 and all(result is results[0] for result in results)
+    assert flight.in_flight() == 0
+
+    # Errors reach the leader, and nothing is remembered once the call completes
+    def fail(_):
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flight.do("test", 1, fail, 1)
+    assert flight.do("test", 1, compute, 1) == {"user_id": 1}
+    assert calls == [1, 1]
+
+
+def test_group_commit_shares_one_commit_and_isolates_failed_writes(db, seeded, monkeypatch):
+    user_id = seeded["user"].id
+    beta = seeded["funds"][1]
+    writes = [
+        lambda session, index=index: crud.create_investment(session, InvestmentCreate(
+            user_id=user_id, fund_id=beta.id, amount=900.0 * (index + 1), investment_date=date.today(),
+            nav_at_investment=90.0))
+        for index in range(4)
+    ] + [
+        # No NAV to price the lot at: a ValueError before any SQL is written
+        lambda session: crud.create_investment(session, InvestmentCreate(
+            user_id=user_id, fund_id=999999, amount=100.0, investment_date=date.today())),
+        # Duplicate email: the database rejects the INSERT itself
+        lambda session: crud.create_user(session, UserCreate(name="Copy", email="test@example.com")),
+        lambda session: crud.create_user(session, UserCreate(name="New", email="new@example.com")),
+    ]
+    monkeypatch.setattr(group_commit, "enabled", True)
+    # The batch closes once every write has arrived, however slowly the threads start
+    monkeypatch.setattr(group_commit, "max_batch", len(writes))
+    monkeypatch.setattr(group_commit, "window_seconds", 5.0)
+    commits = []
+    count_commit = lambda conn: commits.append(conn)
+    event.listen(engine, "commit", count_commit)
+
+    results = [None] * len(writes)
+
+    def submit(index):
+        session = SessionLocal()
+        try:
+            results[index] = writes[index](session)
+        except Exception as exc:
+            results[index] = exc
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=submit, args=(index,)) for index in range(len(writes))]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+    finally:
+        event.remove(engine, "commit", count_commit)
+
+    assert len(commits) == 1
+    lots, (no_nav, duplicate, created) = results[:4], results[4:]
+    assert len({lot.id for lot in lots}) == 4 and all(lot.created_at is not None for lot in lots)
+    assert isinstance(no_nav, ValueError)
+    assert isinstance(duplicate, IntegrityError)
+    assert created.email == "new@example.com" and created.id
+
+    db.expire_all()
+    assert crud.get_user_by_email(db, "new@example.com").id == created.id
+    beta_position = {p.fund_id: p for p in crud.get_user_positions(db, user_id)}[beta.id]
+    assert beta_position.units == pytest.approx(50 + 10 * (1 + 2 + 3 + 4))
+    assert crud.verify_positions(db) == []
+
+
+def test_fund_overlaps_are_upserted_per_batch_in_one_commit(db, seeded):
+    alpha, beta, gamma = seeded["funds"]
+    commits = []
+    count_commit = lambda conn: commits.append(conn)
+    event.listen(engine, "commit", count_commit)
+    try:
+        # Alpha-beta is stored in that order, alpha-gamma too; beta-gamma is new
+        statements = _capture_statements(engine, crud.upsert_fund_overlaps, db, [
+            (beta.id, alpha.id, 45.0, 3), (alpha.id, gamma.id, 75.0, 5), (beta.id, gamma.id, 10.0, 1),
+        ])
+    finally:
+        event.remove(engine, "commit", count_commit)
+
+    assert len(statements) == 1 and len(commits) == 1
+    assert crud.get_fund_overlap(db, fund1_id=alpha.id, fund2_id=beta.id)["overlap_percentage"] == 45.0
+    assert crud.get_fund_overlap(db, fund1_id=gamma.id, fund2_id=alpha.id)["overlapping_stocks"] == 5
+    assert crud.get_fund_overlap(db, fund1_id=gamma.id, fund2_id=beta.id)["overlap_percentage"] == 10.0
+    assert db.query(FundOverlap).count() == 3